@@ -0,0 +1,159 @@
+import asyncio
+from socket import socket
+from struct import error as StructError
+from typing import List, Optional, Tuple
+
+import routerbase
+from input_processing import process_packet
+from output_processing import deletion_process, update_processing
+from packet import read_packet
+from routerbase import logger
+from routingtable import RoutingTable
+from sendengine import NullOutput, Output
+from timers import clock, to_seconds
+
+
+class RouterProtocol(asyncio.DatagramProtocol):
+    """
+    Receives the Response packets arriving on a single input port, and
+    processes them on the event loop.
+
+    Instance variables:
+
+    table -- The routing table that the packets update.
+
+    port -- The input port that this endpoint is bound to.
+
+    timers -- Re-armed after every packet, as processing a packet can schedule
+    new timers.
+    """
+
+    def __init__(self, table: RoutingTable, port: int, timers: "LoopTimers"):
+        self.table = table
+        self.port = port
+        self.timers = timers
+
+    def datagram_received(self, data: bytes, addr: Tuple[str, int]):
+        try:
+            packet = read_packet(data)
+        except StructError:
+            logger(
+                "Ignored a truncated packet on port ", self.port, is_debug=True
+            )
+            return
+        logger(
+            "Received packet from router_id: ",
+            packet.sender_router_id,
+            " | input port ",
+            self.port,
+            is_debug=True,
+        )
+        clock.tick()
+        process_packet(self.table, packet, self.port, self.timers.output)
+        self.table.actor.drain()
+        self.timers.rearm()
+        self.table.metrics.loop_latency.observe(clock.elapsed())
+
+    def error_received(self, exc: Exception):
+        logger(f"Error on input port {self.port}: {exc}", is_debug=True)
+
+
+class LoopTimers:
+    """
+    Drives the routing table's `TimerQueue` with event loop callbacks. A single
+    callback is kept scheduled for the earliest pending deadline, which
+    processes the route timeout, garbage collection, scheduled update and
+    triggered update timers that are due.
+
+    Instance variables:
+
+    output -- Sends the table's packets. It drops them until it's set to a
+    transport by `open_endpoints`.
+    """
+
+    output: Output
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, table: RoutingTable):
+        self.loop = loop
+        self.table = table
+        self.output = NullOutput()
+        self._handle: Optional[asyncio.TimerHandle] = None
+
+    def rearm(self) -> None:
+        """
+        Schedules the callback for the earliest pending deadline, unless a
+        callback at or before that deadline is already scheduled.
+        """
+        deadline = self.table.timers.next_deadline()
+        if deadline is None:
+            return
+
+        delay = max(to_seconds(deadline - clock.now()), 0.0)
+        when = self.loop.time() + delay
+        if self._handle is not None:
+            if self._handle.when() <= when:
+                return
+            self._handle.cancel()
+
+        self._handle = self.loop.call_at(when, self._fire)
+
+    def _fire(self) -> None:
+        self._handle = None
+        clock.tick()
+        self.table.actor.drain()
+        deletion_process(self.table, self.output)
+        update_processing(self.table, self.output)
+        self.rearm()
+        self.table.metrics.loop_latency.observe(clock.elapsed())
+
+    def cancel(self) -> None:
+        """Cancels the scheduled callback."""
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+
+async def open_endpoints(
+    table: RoutingTable, sockets: List[socket]
+) -> Tuple[List[asyncio.DatagramTransport], LoopTimers]:
+    """
+    Creates a datagram endpoint for each of the already bound input sockets.
+    The transport of the first socket is used as the output socket, just like
+    the first socket is in the `select` based daemon.
+
+    Returns the transports and the `LoopTimers` which drive the table's
+    timers.
+    """
+    loop = asyncio.get_running_loop()
+    timers = LoopTimers(loop, table)
+    transports: List[asyncio.DatagramTransport] = []
+
+    for sock in sockets:
+        _, port = sock.getsockname()
+        transport, _ = await loop.create_datagram_endpoint(
+            lambda: RouterProtocol(table, port, timers), sock=sock
+        )
+        transports.append(transport)
+
+    # Transports have the same `sendto(data, addr)` method as sockets, so they
+    # can be used wherever the output socket is.
+    timers.output = transports[0]
+    return transports, timers
+
+
+async def async_daemon(table: RoutingTable, timers: LoopTimers):
+    """
+    Main body of the router, when it runs on an asyncio event loop. Packets are
+    processed by the `RouterProtocol` endpoints as they arrive, and the timers
+    by the `LoopTimers` callbacks, so this only has to wait forever.
+    """
+    # Background jobs run on the loop's thread, instead of on worker threads,
+    # until the daemon stops.
+    inline = routerbase.pool.inline
+    routerbase.pool.inline = True
+    timers.rearm()
+    try:
+        await asyncio.get_running_loop().create_future()
+    finally:
+        timers.cancel()
+        routerbase.pool.inline = inline
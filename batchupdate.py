@@ -0,0 +1,103 @@
+from socket import AF_INET
+from typing import List, Sequence, Tuple
+
+from packet import ResponseEntry, ResponsePacket
+from routingtable import RoutingTable
+from timers import seconds
+from validate_data import INFINITY, MAX_ID, MAX_METRIC, MIN_ID, MIN_METRIC
+
+
+def _is_valid(table: RoutingTable, entry: ResponseEntry) -> bool:
+    return (
+        entry.afi == AF_INET
+        and entry.router_id != table.router_id
+        and MIN_ID <= entry.router_id <= MAX_ID
+        and MIN_METRIC <= entry.metric <= MAX_METRIC
+    )
+
+
+def _is_unchanged(
+    new_metric: int,
+    same_hop: bool,
+    metric: int,
+    timeout_time: int,
+    switch_after: int,
+) -> bool:
+    """
+    Checks to see if `update_table` would leave a route as it is, given the
+    route's current `metric` and `timeout_time`.
+    """
+    if new_metric == INFINITY:
+        return not same_hop or metric == INFINITY
+    if same_hop:
+        return False
+    return new_metric > metric or (
+        new_metric == metric and timeout_time < switch_after
+    )
+
+
+def _classify(
+    table: RoutingTable, packet: ResponsePacket, now: int
+) -> Tuple[List[int], List[ResponseEntry]]:
+    # The routes are read straight from the table, rather than a snapshot,
+    # as this runs on the thread which owns the table. Taking a snapshot
+    # would copy the whole table whenever a route had been replaced.
+    routes = table.table
+    next_hop = packet.sender_router_id
+    cost = routes[next_hop].metric
+    # Routes which time out before this are switched to an equal cost route.
+    switch_after = now + seconds(table.timeout_delta / 2)
+
+    refreshed: List[int] = []
+    remaining: List[ResponseEntry] = []
+    for entry in packet.entries:
+        route = routes.get(entry.router_id)
+        if route is None or not _is_valid(table, entry):
+            remaining.append(entry)
+            continue
+
+        new_metric = min(entry.metric + cost, INFINITY)
+        same_hop = route.next_hop == next_hop
+        metric = route.metric
+        if same_hop and new_metric == metric and new_metric != INFINITY:
+            refreshed.append(entry.router_id)
+        elif not _is_unchanged(
+            new_metric, same_hop, metric, route.timeout_time, switch_after
+        ):
+            remaining.append(entry)
+
+    return refreshed, remaining
+
+
+def classify_entries(
+    table: RoutingTable, packet: ResponsePacket, now: int
+) -> Tuple[List[int], List[ResponseEntry]]:
+    """
+    Works out what each entry of a valid Response packet does to the routing
+    table, in a single pass over the packet.
+
+    Returns the `router_id`s of the routes whose timeouts are only refreshed,
+    and the entries which have to go through `process_entry`. Entries which
+    don't change their routes are in neither. Invalid entries, new routes and
+    changed routes are all left for `process_entry`, so that they're handled
+    (and logged) exactly as they would be one at a time.
+    """
+    entries = packet.entries
+    router_ids = [entry.router_id for entry in entries]
+    if (
+        packet.sender_router_id not in table
+        or packet.sender_router_id in router_ids
+        or len(set(router_ids)) != len(router_ids)
+    ):
+        # Each entry could change how a later one is processed.
+        return [], list(entries)
+
+    return _classify(table, packet, now)
+
+
+def refresh_routes(
+    table: RoutingTable, router_ids: Sequence[int], now: int
+) -> None:
+    """Restarts the timeouts of the given routes at `now`."""
+    for router_id in router_ids:
+        table[router_id].update_timeout_time(table.timeout_delta, now)
@@ -0,0 +1,147 @@
+from random import Random
+from types import MappingProxyType
+from socket import AF_INET
+from unittest import TestCase, main
+from unittest.mock import Mock, patch
+
+from batchupdate import classify_entries
+from input_processing import process_entries, process_entry, process_packet
+from packet import ResponseEntry, ResponsePacket
+from routeentry import RouteEntry
+from routestore import RouteStore
+from routingtable import RoutingTable
+from timers import clock, seconds
+from validate_data import INFINITY
+
+
+def create_table(rng: Random, store=None) -> RoutingTable:
+    table = RoutingTable(1, 30, 180, 120, store)
+    for neighbour in (2, 3):
+        table.add_config_data(neighbour, 5000 + neighbour, neighbour)
+        table.add_route(neighbour, RouteEntry(5000 + neighbour, neighbour, 180))
+    for router_id in range(4, 40):
+        entry = RouteEntry(
+            5002, rng.choice([1, 4, 7, INFINITY]), rng.choice([10, 170]), 2
+        )
+        entry.next_hop = rng.choice([2, 3])
+        table.add_route(router_id, entry)
+    return table
+
+
+def create_packet(rng: Random) -> ResponsePacket:
+    router_ids = rng.sample(range(0, 50), 25)
+    entries = [
+        ResponseEntry(
+            rng.choice([AF_INET] * 9 + [1]), router_id, rng.randint(0, 17)
+        )
+        for router_id in router_ids
+    ]
+    return ResponsePacket(2, 2, 2, entries)
+
+
+def routes(table: RoutingTable):
+    return {
+        router_id: (
+            entry.port,
+            entry.metric,
+            entry.next_hop,
+            entry.timeout_time,
+            entry.gc_time,
+            entry.flag,
+        )
+        for router_id, entry in table.snapshot().items()
+    }
+
+
+@patch("input_processing.logger")
+class TestProcessEntries(TestCase):
+    def setUp(self):
+        clock.tick()
+
+    def _check_matches_process_entry(self, store_type):
+        for seed in range(20):
+            rng = Random(seed)
+            packet = create_packet(rng)
+            one_at_a_time = create_table(Random(seed), store_type())
+            batched = create_table(Random(seed), store_type())
+
+            for entry in packet.entries:
+                process_entry(one_at_a_time, entry, packet, 5001, Mock())
+            process_entries(batched, packet, 5001, Mock())
+
+            self.assertEqual(routes(batched), routes(one_at_a_time))
+            self.assertEqual(batched.flagged, one_at_a_time.flagged)
+            self.assertEqual(len(batched.actor), len(one_at_a_time.actor))
+
+    def test_matches_process_entry(self, logger):
+        self._check_matches_process_entry(dict)
+
+    def test_matches_process_entry_with_store(self, logger):
+        self._check_matches_process_entry(RouteStore)
+
+    def test_refreshes_are_batched(self, logger):
+        table = create_table(Random(0))
+        table.add_route(40, RouteEntry(5002, 3, 10, 2))
+        table.add_route(41, RouteEntry(5002, 2, 10, 2))
+        packet = ResponsePacket(
+            2,
+            2,
+            2,
+            [ResponseEntry(AF_INET, 40, 1), ResponseEntry(AF_INET, 41, 1)],
+        )
+
+        refreshed, remaining = classify_entries(table, packet, clock.now())
+        process_entries(table, packet, 5001, Mock())
+
+        self.assertEqual(refreshed, [40])
+        self.assertEqual(remaining, [ResponseEntry(AF_INET, 41, 1)])
+        self.assertEqual(
+            table[40].timeout_time, clock.now() + seconds(table.timeout_delta)
+        )
+        self.assertEqual(table[41].metric, 3)
+
+    def test_duplicate_entries_are_not_batched(self, logger):
+        table = create_table(Random(0))
+        entry = ResponseEntry(AF_INET, 4, 1)
+        packet = ResponsePacket(2, 2, 2, [entry, entry])
+
+        self.assertEqual(
+            classify_entries(table, packet, clock.now()), ([], [entry, entry])
+        )
+
+    def test_unreachable_routes(self, logger):
+        table = create_table(Random(0))
+        table.add_route(40, RouteEntry(5002, 3, 180, 2))
+        table.add_route(41, RouteEntry(5003, 4, 180, 3))
+        # Only the route to 40 is through router 2.
+        entries = [
+            ResponseEntry(AF_INET, 40, INFINITY),
+            ResponseEntry(AF_INET, 41, INFINITY),
+        ]
+        packet = ResponsePacket(2, 2, 2, entries)
+
+        refreshed, remaining = classify_entries(table, packet, clock.now())
+        process_entries(table, packet, 5002, Mock())
+
+        self.assertEqual((refreshed, remaining), ([], entries[:1]))
+        self.assertEqual(table[40].metric, INFINITY)
+        self.assertEqual((table[41].metric, table[41].next_hop), (4, 3))
+        self.assertNotIn(41, table.flagged)
+
+    def test_packets_do_not_copy_the_table(self, logger):
+        for store_type in (dict, RouteStore):
+            table = create_table(Random(0), store_type())
+            table.snapshot()
+            with patch(
+                "routingtable.MappingProxyType", wraps=MappingProxyType
+            ) as snapshot:
+                for seed in range(10):
+                    packet = create_packet(Random(seed))
+                    process_packet(table, packet, 5002, Mock())
+                    table.actor.drain()
+
+            self.assertEqual(snapshot.call_count, 0)
+
+
+if __name__ == "__main__":
+    main()
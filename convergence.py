@@ -0,0 +1,546 @@
+#########################################################
+#
+# Convergence benchmark.
+#
+# Runs a topology of routers in a discrete event
+# simulation, injects link and router failures, and
+# measures how long the network takes to converge after
+# each one. Time is simulated, so runs take seconds of
+# real time however long the protocol's timers are, and
+# are repeatable for the same seed.
+#
+#########################################################
+
+import heapq
+import json
+import random
+import sys
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import routerbase
+from input_processing import process_packet
+from output_processing import deletion_process, update_processing
+from packet import read_packet
+from router import create_table, get_option, normalise_option, startup
+from routerhost import Config, load_configs
+from routingtable import RoutingTable
+from tablerenderer import TableRenderer
+from timers import clock, seconds, to_seconds
+from validate_data import INFINITY
+
+# The version of the results format.
+RESULTS_VERSION = 1
+
+# The time taken for a packet to cross a link, in seconds.
+LINK_DELAY = 0.001
+
+# The timers of generated topologies, in seconds.
+UPDATE_TIME = 5
+TIMEOUT_TIME = 30
+GC_TIME = 20
+
+# The first input port of generated topologies.
+FIRST_PORT = 10000
+
+MAX_TIME = 600.0
+
+Link = Tuple[int, int]
+
+
+def topology_from_links(
+    links: List[Tuple[int, int, int]], timers: Optional[List[int]] = None
+) -> List[Config]:
+    """
+    Creates the configs of a topology from its `(router_id, router_id, cost)`
+    links. Each router has an input port for each of its links.
+    """
+    timers = timers if timers is not None else [UPDATE_TIME, TIMEOUT_TIME]
+    timers = list(timers)
+    if len(timers) == 2:
+        timers.append(GC_TIME)
+
+    router_ids = sorted({router_id for link in links for router_id in link[:2]})
+    input_ports: Dict[int, List[int]] = {
+        router_id: [] for router_id in router_ids
+    }
+    output_ports: Dict[int, List[Tuple[int, int, int]]] = {
+        router_id: [] for router_id in router_ids
+    }
+    port = FIRST_PORT
+    for a, b, cost in links:
+        for source, dest in ((a, b), (b, a)):
+            input_ports[dest].append(port)
+            output_ports[source].append((port, cost, dest))
+            port += 1
+
+    return [
+        (router_id, input_ports[router_id], output_ports[router_id], timers)
+        for router_id in router_ids
+    ]
+
+
+def ring_topology(count: int, rng: random.Random) -> List[Config]:
+    links = [
+        (i + 1, (i + 1) % count + 1, rng.randint(1, 3)) for i in range(count)
+    ]
+    return topology_from_links(links)
+
+
+def star_topology(count: int, rng: random.Random) -> List[Config]:
+    links = [(1, i, rng.randint(1, 3)) for i in range(2, count + 1)]
+    return topology_from_links(links)
+
+
+def grid_topology(
+    width: int, height: int, rng: random.Random
+) -> List[Config]:
+    links = []
+    for y in range(height):
+        for x in range(width):
+            router_id = y * width + x + 1
+            if x + 1 < width:
+                links.append((router_id, router_id + 1, rng.randint(1, 3)))
+            if y + 1 < height:
+                links.append((router_id, router_id + width, rng.randint(1, 3)))
+    return topology_from_links(links)
+
+
+def random_topology(count: int, rng: random.Random) -> List[Config]:
+    """
+    Creates a connected random topology, from a random spanning tree with
+    about as many extra links again.
+    """
+    links: Dict[Link, int] = {}
+    for router_id in range(2, count + 1):
+        links[(rng.randint(1, router_id - 1), router_id)] = rng.randint(1, 3)
+    for _ in range(count):
+        a, b = sorted(rng.sample(range(1, count + 1), 2))
+        links.setdefault((a, b), rng.randint(1, 3))
+    return topology_from_links([(a, b, cost) for (a, b), cost in links.items()])
+
+
+def expected_routes(
+    configs: List[Config], down_routers: Set[int], down_links: Set[Link]
+) -> Dict[int, Dict[int, int]]:
+    """
+    Returns the metric of the shortest route from each live router to every
+    router it can reach, in the form of `{[key: router_id]: {[key:
+    router_id]: metric}}`. Routes of `INFINITY` or more are unreachable.
+    """
+    input_owners = {
+        port: router_id
+        for router_id, input_ports, _, _ in configs
+        for port in input_ports
+    }
+    # The links which carry packets, as `(sender, receiver)` pairs.
+    carried = {
+        (router_id, neighbour)
+        for router_id, _, output_ports, _ in configs
+        for port, _, neighbour in output_ports
+        if input_owners.get(port) == neighbour
+    }
+    # A router only uses a neighbour which it has a cost for, and which
+    # sends packets to it.
+    costs: Dict[int, Dict[int, int]] = {}
+    for router_id, _, output_ports, _ in configs:
+        costs[router_id] = {
+            neighbour: cost
+            for _, cost, neighbour in output_ports
+            if (neighbour, router_id) in carried
+            and _is_up(router_id, neighbour, down_routers, down_links)
+        }
+
+    routes: Dict[int, Dict[int, int]] = {}
+    for source in costs:
+        if source in down_routers:
+            continue
+        metrics: Dict[int, int] = {}
+        queue = [(0, source)]
+        while queue:
+            metric, router_id = heapq.heappop(queue)
+            if router_id in metrics:
+                continue
+            metrics[router_id] = metric
+            for neighbour, cost in costs[router_id].items():
+                if neighbour not in metrics and metric + cost < INFINITY:
+                    heapq.heappush(queue, (metric + cost, neighbour))
+        del metrics[source]
+        routes[source] = metrics
+    return routes
+
+
+def _is_up(
+    a: int, b: int, down_routers: Set[int], down_links: Set[Link]
+) -> bool:
+    return (
+        a not in down_routers
+        and b not in down_routers
+        and (min(a, b), max(a, b)) not in down_links
+    )
+
+
+class SimulatedOutput:
+    """
+    The output of a simulated router. Packets are delivered to the router
+    which owns the destination port after `LINK_DELAY`, unless the link or
+    either router is down.
+    """
+
+    def __init__(self, simulation: "Simulation", router_id: int):
+        self.simulation = simulation
+        self.router_id = router_id
+        self.packets = 0
+        self.bytes = 0
+
+    def sendto(self, data: Any, addr: Tuple[str, int]) -> None:
+        self.packets += 1
+        self.bytes += len(data)
+        self.simulation.deliver(self.router_id, addr[1], bytes(data))
+
+
+class SimulatedRouter:
+    """A router inside a `Simulation`, and what it has cost."""
+
+    def __init__(self, table: RoutingTable, output: SimulatedOutput):
+        self.table = table
+        self.output = output
+        self.cpu = 0.0
+        self.peak_routes = 0
+
+
+class Simulation:
+    """
+    Runs every router of a topology against a simulated clock. Each step
+    either delivers the next packet, or processes the timers of the router
+    whose next timer is due first.
+    """
+
+    def __init__(self, configs: List[Config]):
+        self.configs = configs
+        self.now = seconds(1)
+        self.routers: Dict[int, SimulatedRouter] = {}
+        self.down_routers: Set[int] = set()
+        self.down_links: Set[Link] = set()
+        self._ports: Dict[int, Tuple[int, int]] = {}
+        self._events: List[Tuple[int, int, int, int, bytes]] = []
+        self._seq = 0
+
+        clock.set(self.now)
+        for router_id, input_ports, output_ports, timers in configs:
+            table = create_table(router_id, [], output_ports, timers)
+            # The table is never printed, so it isn't worth rendering.
+            table.renderer = TableRenderer(interval=float("inf"))
+            output = SimulatedOutput(self, router_id)
+            self.routers[router_id] = SimulatedRouter(table, output)
+            for port in input_ports:
+                self._ports[port] = (router_id, port)
+
+    def deliver(self, source: int, port: int, data: bytes) -> None:
+        """Queues a packet from the `source` router for the port's owner."""
+        owner = self._ports.get(port)
+        if owner is None or not _is_up(
+            source, owner[0], self.down_routers, self.down_links
+        ):
+            return
+        self._seq += 1
+        heapq.heappush(
+            self._events,
+            (self.now + seconds(LINK_DELAY), self._seq, owner[0], port, data),
+        )
+
+    def fail_link(self, a: int, b: int) -> None:
+        self.down_links.add((min(a, b), max(a, b)))
+
+    def fail_router(self, router_id: int) -> None:
+        self.down_routers.add(router_id)
+
+    def expected(self) -> Dict[int, Dict[int, int]]:
+        return expected_routes(self.configs, self.down_routers, self.down_links)
+
+    def routes(self) -> Dict[int, Dict[int, int]]:
+        """Returns the reachable routes in each live router's table."""
+        return {
+            router_id: {
+                dest: entry.metric
+                for dest, entry in router.table.snapshot().items()
+                if entry.metric < INFINITY
+            }
+            for router_id, router in self.routers.items()
+            if router_id not in self.down_routers
+        }
+
+    def _next_timer(self) -> Tuple[Optional[int], Optional[int]]:
+        deadline: Optional[int] = None
+        due: Optional[int] = None
+        for router_id, router in self.routers.items():
+            if router_id in self.down_routers:
+                continue
+            next_deadline = router.table.timers.next_deadline()
+            if next_deadline is not None and (
+                deadline is None or next_deadline < deadline
+            ):
+                deadline, due = next_deadline, router_id
+        return deadline, due
+
+    def _run(self, router: SimulatedRouter, fn, *args) -> None:
+        start = time.process_time()
+        fn(router.table, *args)
+        router.table.actor.drain()
+        router.cpu += time.process_time() - start
+        router.peak_routes = max(router.peak_routes, len(router.table))
+
+    def _timers(self, table: RoutingTable, output: SimulatedOutput) -> None:
+        table.actor.drain()
+        deletion_process(table, output)
+        update_processing(table, output)
+
+    def _receive(
+        self, table: RoutingTable, data: bytes, port: int, output: Any
+    ) -> None:
+        process_packet(table, read_packet(data), port, output)
+
+    def step(self) -> None:
+        """Processes the next packet delivery or timer."""
+        deadline, router_id = self._next_timer()
+        if self._events and (
+            deadline is None or self._events[0][0] <= deadline
+        ):
+            self.now, _, router_id, port, data = heapq.heappop(self._events)
+            clock.set(self.now)
+            if router_id not in self.down_routers:
+                router = self.routers[router_id]
+                self._run(router, self._receive, data, port, router.output)
+        elif deadline is not None and router_id is not None:
+            self.now = max(self.now, deadline)
+            clock.set(self.now)
+            router = self.routers[router_id]
+            self._run(router, self._timers, router.output)
+
+    def start(self) -> None:
+        """Sends the startup packets of every router."""
+        for router in self.routers.values():
+            self._run(router, startup, router.output)
+
+    def run_until_converged(
+        self, max_time: float = MAX_TIME
+    ) -> Optional[float]:
+        """
+        Runs the simulation until every router's table has the shortest
+        routes.
+
+        Returns the number of simulated seconds this took, or `None` if the
+        network didn't converge within `max_time` seconds.
+        """
+        start = self.now
+        end = start + seconds(max_time)
+        expected = self.expected()
+        generation = None
+        while self.now <= end:
+            current = sum(
+                router.table.generation for router in self.routers.values()
+            )
+            if current != generation:
+                generation = current
+                if self.routes() == expected:
+                    return to_seconds(self.now - start)
+            self.step()
+        return None
+
+    def totals(self) -> Tuple[int, int]:
+        """Returns the number of packets and bytes sent by every router."""
+        return (
+            sum(router.output.packets for router in self.routers.values()),
+            sum(router.output.bytes for router in self.routers.values()),
+        )
+
+
+def run_benchmark(
+    name: str,
+    configs: List[Config],
+    failures: List[Tuple[str, Tuple[int, ...]]],
+    max_time: float = MAX_TIME,
+) -> Dict[str, Any]:
+    """
+    Starts the topology, waits for it to converge, and then injects each
+    failure in turn, waiting for the network to converge after each one.
+
+    Keyword arguments:
+
+    failures -- Each failure, as `("link", (a, b))` or `("router", (id,))`.
+
+    Returns the results.
+    """
+    level = routerbase.LOG_LEVEL
+    routerbase.configure_logging(level=routerbase.WARNING)
+    # Packets are sent straight away, instead of from worker threads.
+    inline = routerbase.pool.inline
+    routerbase.pool.inline = True
+    simulation = Simulation(configs)
+    phases: List[Dict[str, Any]] = []
+    try:
+        events = [("start", ())] + failures
+        for kind, args in events:
+            if kind == "link":
+                simulation.fail_link(*args)
+            elif kind == "router":
+                simulation.fail_router(*args)
+            else:
+                simulation.start()
+
+            packets, sent_bytes = simulation.totals()
+            started = time.process_time()
+            converged = simulation.run_until_converged(max_time)
+            total_packets, total_bytes = simulation.totals()
+            phases.append(
+                {
+                    "event": kind,
+                    "target": list(args),
+                    "converged": converged is not None,
+                    "time": converged,
+                    "packets": total_packets - packets,
+                    "bytes": total_bytes - sent_bytes,
+                    "cpu": time.process_time() - started,
+                }
+            )
+    finally:
+        # The simulated time is replaced by the real time again.
+        clock.tick()
+        routerbase.pool.inline = inline
+        routerbase.configure_logging(level=level)
+
+    return {
+        "version": RESULTS_VERSION,
+        "topology": name,
+        "routers": len(configs),
+        "timestamp": time.time(),
+        "phases": phases,
+        "per_router": {
+            str(router_id): {
+                "cpu": router.cpu,
+                "peak_routes": router.peak_routes,
+                "packets": router.output.packets,
+                "bytes": router.output.bytes,
+            }
+            for router_id, router in simulation.routers.items()
+        },
+    }
+
+
+def create_topology(spec: str, rng: random.Random) -> List[Config]:
+    """Creates the topology described by the first command line argument."""
+    kind, _, size = spec.partition("=")
+    if kind == "ring":
+        return ring_topology(int(size), rng)
+    if kind == "star":
+        return star_topology(int(size), rng)
+    if kind == "grid":
+        width, _, height = size.partition("x")
+        return grid_topology(int(width), int(height), rng)
+    if kind == "random":
+        return random_topology(int(size), rng)
+    return without_clashes(load_configs(spec))
+
+
+def without_clashes(configs: List[Config]) -> List[Config]:
+    """
+    Drops the configs whose `router_id` or input ports clash with an earlier
+    config, such as the variants of a router in `Config_files`.
+    """
+    router_ids: Set[int] = set()
+    ports: Set[int] = set()
+    kept: List[Config] = []
+    for config in configs:
+        router_id, input_ports, _, _ = config
+        if router_id in router_ids or ports.intersection(input_ports):
+            routerbase.logger(
+                f"Skipped router {router_id}, which clashes with another",
+                level=routerbase.WARNING,
+            )
+            continue
+        router_ids.add(router_id)
+        ports.update(input_ports)
+        kept.append(config)
+    return kept
+
+
+def main():
+    """
+    Runs the benchmark given by the command line arguments, and writes its
+    results as JSON. The names of the options aren't case sensitive, but
+    their values are.
+
+    Usage: python convergence.py <topology> [options]
+
+    The topology is one of:
+
+    ring=<n>, star=<n>, grid=<width>x<height>, random=<n> -- A generated
+    topology of `n` routers.
+
+    <path> -- The config files in a directory, or a comma separated list of
+    config files, as in host mode.
+
+    The options are any of:
+
+    seed=<n> -- Seeds the random topology, costs and timer jitter.
+
+    fail-link=<a>-<b> -- Fails the link between routers `a` and `b`, after
+    the network has converged.
+
+    fail-router=<id> -- Fails the router, after the network has converged.
+
+    max-time=<seconds> -- How long to wait for each convergence, in
+    simulated seconds. Defaults to 600.
+
+    out=<filename> -- Writes the results to the file, instead of to stdout.
+    """
+    if len(sys.argv) < 2:
+        routerbase.logger(
+            "Please give a topology. Correct usage: python convergence.py "
+            "<topology> [options]",
+            level=routerbase.ERROR,
+        )
+        return
+    spec = sys.argv[1]
+    args = [normalise_option(arg) for arg in sys.argv[2:]]
+    options = set(args)
+    # The results are written to stdout, so the log is written to stderr.
+    routerbase.configure_logging(
+        level=routerbase.WARNING, background=True, stream=sys.stderr
+    )
+
+    seed = get_option(options, "seed")
+    rng = random.Random(int(seed) if seed is not None else 0)
+    # The timer jitter uses the global generator.
+    random.seed(rng.random())
+
+    # The failures are injected in the order they're given.
+    failures: List[Tuple[str, Tuple[int, ...]]] = []
+    for option in args:
+        name, _, value = option.partition("=")
+        if name == "fail-link":
+            a, _, b = value.partition("-")
+            failures.append(("link", (int(a), int(b))))
+        elif name == "fail-router":
+            failures.append(("router", (int(value),)))
+
+    max_time = get_option(options, "max-time")
+    results = run_benchmark(
+        spec,
+        create_topology(spec, rng),
+        failures,
+        float(max_time) if max_time is not None else MAX_TIME,
+    )
+
+    routerbase.shutdown_logging()
+    output = json.dumps(results, indent=2)
+    filename = get_option(options, "out")
+    if filename is None:
+        print(output)
+    else:
+        with open(filename, "w") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
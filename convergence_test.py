@@ -0,0 +1,154 @@
+import os
+import random
+import tempfile
+from unittest import TestCase, main
+from unittest.mock import patch
+
+import routerbase
+from convergence import (
+    UPDATE_TIME,
+    Simulation,
+    expected_routes,
+    main as convergence_main,
+    ring_topology,
+    run_benchmark,
+    topology_from_links,
+    without_clashes,
+)
+from timers import clock, seconds
+
+
+@patch("routerbase.LOG_LEVEL", routerbase.ERROR)
+class TestConvergence(TestCase):
+    def setUp(self):
+        inline = routerbase.pool.inline
+        routerbase.pool.inline = True
+        self.addCleanup(setattr, routerbase.pool, "inline", inline)
+        self.addCleanup(clock.tick)
+
+    def test_expected_routes(self):
+        configs = topology_from_links([(1, 2, 1), (2, 3, 2), (1, 3, 5)])
+
+        self.assertEqual(
+            expected_routes(configs, set(), set()),
+            {1: {2: 1, 3: 3}, 2: {1: 1, 3: 2}, 3: {1: 3, 2: 2}},
+        )
+        self.assertEqual(
+            expected_routes(configs, set(), {(2, 3)}),
+            {1: {2: 1, 3: 5}, 2: {1: 1, 3: 6}, 3: {1: 5, 2: 6}},
+        )
+        self.assertEqual(
+            expected_routes(configs, {2}, set()), {1: {3: 5}, 3: {1: 5}}
+        )
+
+    def test_ring_converges(self):
+        simulation = Simulation(ring_topology(6, random.Random(0)))
+        simulation.start()
+
+        self.assertIsNotNone(simulation.run_until_converged())
+        self.assertEqual(simulation.routes(), simulation.expected())
+
+    def test_link_failure(self):
+        simulation = Simulation(ring_topology(6, random.Random(0)))
+        simulation.start()
+        simulation.run_until_converged()
+
+        simulation.fail_link(1, 2)
+
+        # The routes through the link have to time out first.
+        time = simulation.run_until_converged()
+        self.assertIsNotNone(time)
+        self.assertEqual(simulation.routes(), simulation.expected())
+
+    def test_poisoned_reverse_keeps_routes(self):
+        # Router 2 is the next hop of router 1 towards 3, so it poisons the
+        # route back to router 1, which must keep its own route to 3.
+        simulation = Simulation(topology_from_links([(1, 2, 1), (2, 3, 1)]))
+        simulation.start()
+        simulation.run_until_converged()
+
+        for _ in range(200):
+            simulation.step()
+
+        self.assertEqual(simulation.routes(), simulation.expected())
+
+    def test_steady_state_uses_cached_responses(self):
+        simulation = Simulation(topology_from_links([(1, 2, 1), (2, 3, 1)]))
+        simulation.start()
+        simulation.run_until_converged()
+        tables = [router.table for router in simulation.routers.values()]
+        hits = [table.response_cache.hits for table in tables]
+        generations = [table.generation for table in tables]
+
+        # At least three update cycles, which are jittered by up to 5 seconds.
+        # Every router keeps the same routes throughout.
+        end = simulation.now + seconds(3 * (UPDATE_TIME + 5))
+        while simulation.now < end:
+            simulation.step()
+
+        self.assertEqual([table.generation for table in tables], generations)
+        for table, before in zip(tables, hits):
+            self.assertGreater(table.response_cache.hits, before)
+
+    def test_run_benchmark(self):
+        results = run_benchmark(
+            "ring=4",
+            ring_topology(4, random.Random(0)),
+            [("router", (2,))],
+        )
+
+        self.assertEqual(
+            [phase["event"] for phase in results["phases"]],
+            ["start", "router"],
+        )
+        self.assertTrue(
+            all(phase["converged"] for phase in results["phases"])
+        )
+        self.assertEqual(len(results["per_router"]), 4)
+        # The log level is put back afterwards.
+        self.assertEqual(routerbase.LOG_LEVEL, routerbase.ERROR)
+
+    @patch("convergence.print", create=True)
+    @patch("routerbase.shutdown_logging")
+    @patch("routerbase.configure_logging")
+    def test_failures_are_in_order(self, *mocks):
+        argv = ["convergence.py", "ring=4", "fail-router=3", "fail-link=1-2"]
+        with patch("sys.argv", argv), patch(
+            "convergence.run_benchmark", return_value={}
+        ) as run:
+            convergence_main()
+
+        self.assertEqual(
+            run.call_args[0][2], [("router", (3,)), ("link", (1, 2))]
+        )
+
+    @patch("routerbase.shutdown_logging")
+    @patch("routerbase.configure_logging")
+    def test_mixed_case_output(self, *mocks):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "Ring-4.json")
+            argv = ["convergence.py", "ring=4", f"Out={path}"]
+            with patch("sys.argv", argv), patch(
+                "convergence.run_benchmark", return_value={}
+            ):
+                convergence_main()
+
+            self.assertEqual(os.listdir(directory), ["Ring-4.json"])
+
+    @patch("routerbase.logger")
+    def test_usage(self, logger):
+        with patch("sys.argv", ["convergence.py"]):
+            convergence_main()
+
+        self.assertIn("Correct usage", logger.call_args[0][0])
+        self.assertEqual(logger.call_args[1]["level"], routerbase.ERROR)
+
+    def test_clashes_are_dropped(self):
+        configs = ring_topology(3, random.Random(0))
+        clash = (1, [20000], [], configs[0][3])
+
+        self.assertEqual(without_clashes(configs + [clash]), configs)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,25 @@
-from datetime import datetime, timedelta
+import selectors
 from select import select
 from socket import AF_INET, socket
-from typing import List, Tuple
+from struct import error as StructError
+from typing import Dict, Iterable, List, Optional, Tuple
 
-from output_processing import deletion_process, pool
+from batchupdate import classify_entries, refresh_routes
+from output_processing import deletion_process
 from packet import ResponseEntry, ResponsePacket, read_packet, validate_packet
-from routeentry import RouteEntry
+from routeentry import Route, RouteEntry
 from routerbase import logger
 from routingtable import RoutingTable
+from sendengine import Output
+from timers import MAX_WAIT_TIME, clock, seconds
 from validate_data import INFINITY, MAX_ID, MAX_METRIC, MIN_ID, MIN_METRIC
 
+# The buffer size is bigger than the maximum packet size.
+RECV_BUFFER_SIZE = 1024
+
+# The maximum number of datagrams received from a socket on each wakeup.
+MAX_BATCH = 64
+
 
 def validate_entry(table: RoutingTable, packet_entry: ResponseEntry) -> bool:
     """Validates an individual router entry."""
@@ -54,7 +64,7 @@ def add_route(
     packet_entry: ResponseEntry,
     new_metric: int,
     next_hop: int,
-    sock: socket,
+    sock: Output,
 ):
     """Adds a newly learned route to the routing table."""
     if new_metric == INFINITY:
@@ -62,7 +72,7 @@ def add_route(
         # no point adding routes that you cannot reach.
         return
 
-    logger(f"Adding route with cost of {new_metric}", is_debug=True)
+    logger("Adding route with cost of ", new_metric, is_debug=True)
 
     actual_port = table.config_table[next_hop].port
     entry = RouteEntry(actual_port, new_metric, table.timeout_delta, next_hop)
@@ -80,10 +90,10 @@ def add_route(
 
 def adopt_route(
     table: RoutingTable,
-    table_entry: RouteEntry,
+    table_entry: Route,
     new_metric: int,
     next_hop: int,
-    sock: socket,
+    sock: Output,
     router_id: int,
 ):
     """
@@ -91,15 +101,18 @@ def adopt_route(
     entry.
     """
     logger(
-        f"Adopting route with metric of {new_metric}, router_id {router_id}",
+        "Adopting route with metric of ",
+        new_metric,
+        ", router_id ",
+        router_id,
         is_debug=True,
     )
 
     table_entry.metric = new_metric
     table_entry.next_hop = next_hop
-    table_entry.flag = True
-    table_entry.next_hop = next_hop
-    table_entry.triggered_update_time = None
+    table.metrics.routes_adopted.inc()
+    table.flag_route(router_id)
+    table.mark_changed()
 
     # NOTE: As per the assignment spec, "implement triggered updates when
     # routes become invalid  (i.e. when a router sets the routes metric to
@@ -111,7 +124,7 @@ def adopt_route(
     if new_metric == INFINITY:
         # The following will eventually cause a triggered update.
         logger("About to go into deletion process", is_debug=True)
-        pool.submit(deletion_process, table, sock, router_id)
+        table.actor.submit(deletion_process, sock, router_id)
     else:
         table_entry.update_timeout_time(table.timeout_delta)
 
@@ -121,17 +134,18 @@ def update_table(
     packet_entry: ResponseEntry,
     new_metric: int,
     next_hop: int,
-    sock: socket,
+    sock: Output,
 ):
     """
     Goes through the process of updating the routing table with the new route,
     if applicable.
     """
     logger(
-        f"Updating the table with router_id {packet_entry.router_id}",
+        "Updating the table with router_id ",
+        packet_entry.router_id,
         is_debug=True,
     )
-    table_entry: RouteEntry = table[packet_entry.router_id]
+    table_entry: Route = table[packet_entry.router_id]
 
     if next_hop == table_entry.next_hop and new_metric != INFINITY:
         table_entry.update_timeout_time(table.timeout_delta)
@@ -148,18 +162,20 @@ def update_table(
             packet_entry.router_id,
         )
     elif new_metric == INFINITY:
-        # nothing happens if the entry's existing metric is `INFINITY`
-        if table_entry.metric != INFINITY:
-            pool.submit(deletion_process, table, packet_entry.router_id)
+        # An unreachable route from a router other than the next hop is no
+        # better than the current route. This includes the poisoned reverse
+        # routes of the routers whose next hop is this router. Unreachable
+        # routes from the next hop were adopted above.
+        pass
     elif new_metric == table_entry.metric and next_hop != table_entry.next_hop:
         # Adding a check for `next_hop` means that the entry will not be
         # updated if its the same as the old entry.
 
         # If the timeout for the existing route is at least halfway to the
         # expiration point, switch to the new route.
-        time_diff: timedelta = table_entry.timeout_time - datetime.now()
-        half_time = table.timeout_delta / 2
-        if time_diff.seconds >= half_time:
+        time_diff = table_entry.timeout_time - clock.now()
+        half_time = seconds(table.timeout_delta / 2)
+        if time_diff >= half_time:
             adopt_route(
                 table,
                 table_entry,
@@ -178,12 +194,13 @@ def process_entry(
     packet_entry: ResponseEntry,
     packet: ResponsePacket,
     port: int,
-    sock: socket,
+    sock: Output,
 ):
     """Processes a single entry from a received packet."""
     logger("Processing an entry", is_debug=True)
     if not validate_entry(table, packet_entry):
         # Ignores invalid entries
+        table.metrics.invalid_entries.inc()
         return
 
     # Update the metric
@@ -201,36 +218,164 @@ def process_entry(
         )
 
 
+def process_entries(
+    table: RoutingTable, packet: ResponsePacket, port: int, sock: Output
+):
+    """
+    Processes every entry from a received packet. The entries are classified
+    in one pass, and the routes which are only refreshed are refreshed
+    together. Only the entries which change the table go through
+    `process_entry`.
+    """
+    now = clock.now()
+    refreshed, remaining = classify_entries(table, packet, now)
+    refresh_routes(table, refreshed, now)
+    logger(
+        "Refreshed ",
+        len(refreshed),
+        " routes, processing ",
+        len(remaining),
+        " entries",
+        is_debug=True,
+    )
+    for entry in remaining:
+        process_entry(table, entry, packet, port, sock)
+
+
+class ReceiveBuffers:
+    """
+    Preallocated buffers which received datagrams are written into. The same
+    buffers are reused on every wakeup, so receiving doesn't allocate.
+    """
+
+    def __init__(self, size: int = RECV_BUFFER_SIZE):
+        self.size = size
+        self._buffers: List[bytearray] = []
+
+    def __len__(self):
+        """Returns the number of buffers which have been allocated."""
+        return len(self._buffers)
+
+    def __getitem__(self, index: int) -> bytearray:
+        """Returns the buffer at `index`, allocating it if necessary."""
+        while len(self._buffers) <= index:
+            self._buffers.append(bytearray(self.size))
+        return self._buffers[index]
+
+
+receive_buffers = ReceiveBuffers()
+
+
+class SocketSelector:
+    """
+    Waits for packets on the input sockets with the platform's most efficient
+    mechanism, which is `epoll` on Linux. Unlike `select`, each socket is
+    registered once instead of on every wakeup, the cost of a wakeup doesn't
+    grow with the number of sockets, and there's no `FD_SETSIZE` limit.
+
+    Each socket's port is also looked up once, when it's registered.
+    """
+
+    def __init__(self, sockets: Iterable[socket] = ()):
+        self._selector = selectors.DefaultSelector()
+        self._ports: Dict[socket, int] = {}
+        self.update(sockets)
+
+    def __len__(self):
+        return len(self._ports)
+
+    def update(self, sockets: Iterable[socket]) -> None:
+        """
+        Registers the sockets which aren't registered yet, and unregisters
+        those which aren't given, such as after the config is reloaded.
+        """
+        sockets = list(sockets)
+        for sock in set(self._ports) - set(sockets):
+            self._selector.unregister(sock)
+            del self._ports[sock]
+        for sock in sockets:
+            if sock not in self._ports:
+                _, port = sock.getsockname()
+                self._selector.register(sock, selectors.EVENT_READ, port)
+                self._ports[sock] = port
+
+    def select(self, timeout: float) -> List[Tuple[socket, int]]:
+        """Returns the readable sockets, and their ports."""
+        return [
+            (key.fileobj, key.data)  # type: ignore
+            for key, _ in self._selector.select(timeout)
+        ]
+
+    def close(self) -> None:
+        self._selector.close()
+        self._ports = {}
+
+
 def get_packets(
-    sockets: List[socket]
+    sockets: List[socket],
+    timeout: float = MAX_WAIT_TIME,
+    max_batch: int = MAX_BATCH,
+    selector: Optional[SocketSelector] = None,
 ) -> List[Tuple[ResponsePacket, int, socket]]:
     """
     Gets a tuple of the received packets from the input sockets, and their
     associated port numbers and sockets.
 
+    Every readable socket is drained until it would block, or until
+    `max_batch` datagrams have been received from it, so that one busy socket
+    can't starve the others. The datagrams are received into the reused
+    `receive_buffers`, and are then decoded together.
+
     Returns a list of tuples, where each tuple is (ResponsePacket, port, sock).
+
+    Keyword arguments:
+
+    timeout -- The number of seconds to block for, waiting for packets.
+
+    max_batch -- The maximum number of datagrams received from each socket.
+
+    selector -- Waits for the sockets registered with it, instead of calling
+    `select` on `sockets`.
     """
-    read: List[socket]
-    read, _, _ = select(sockets, [], [], 1)
+    ready: List[Tuple[socket, int]]
+    if selector is not None:
+        ready = selector.select(timeout)
+    else:
+        read, _, _ = select(sockets, [], [], timeout)
+        ready = [(sock, sock.getsockname()[1]) for sock in read]
+
+    received: List[Tuple[bytearray, int, int, socket]] = []
+    for sock, port in ready:
+        # A blocking socket can only be read once without blocking.
+        limit = max_batch if sock.gettimeout() == 0.0 else 1
+        for _ in range(limit):
+            buffer = receive_buffers[len(received)]
+            try:
+                nbytes, _ = sock.recvfrom_into(buffer)
+            except BlockingIOError:
+                break
+            received.append((buffer, nbytes, port, sock))
 
     packets = []
-
-    for sock in read:
-        _, port = sock.getsockname()
-        # The buffer size is bigger than the maximum packet size.
-        raw_packet, client_address = sock.recvfrom(1024)
-        packet = read_packet(raw_packet)
+    for buffer, nbytes, port, sock in received:
+        try:
+            packet = read_packet(memoryview(buffer)[:nbytes])
+        except StructError:
+            logger("Ignored a truncated packet on port ", port, is_debug=True)
+            continue
         packets.append((packet, port, sock))
         logger(
-            f"Received packet from router_id: {packet.sender_router_id} | "
-            f"input port {port}",
+            "Received packet from router_id: ",
+            packet.sender_router_id,
+            " | input port ",
+            port,
             is_debug=True,
         )
 
     return packets
 
 
-def add_discovered(table: RoutingTable, packet: ResponsePacket, sock: socket):
+def add_discovered(table: RoutingTable, packet: ResponsePacket, sock: Output):
     """
     Adds entries discovered implicitly from the packet itself into the routing
     table.
@@ -243,45 +388,86 @@ def add_discovered(table: RoutingTable, packet: ResponsePacket, sock: socket):
         )
         return
 
-    metric = table.config_table[packet.sender_router_id].cost
-    # The idea is generally the same as adding a new route into the table, even
-    # if updating an entry, because we'll want to completely wipe the entry and
-    # timers.
+    port, metric = table.config_table[packet.sender_router_id]
+    if packet.sender_router_id in table:
+        # The existing entry is updated in place. Nearly every packet from a
+        # neighbour only refreshes its route, which mustn't invalidate the
+        # `response_cache`.
+        table.update_route(
+            packet.sender_router_id, port, metric, packet.sender_router_id
+        )
+        return
+
     fake_packet_entry = ResponseEntry(AF_INET, packet.sender_router_id, metric)
     add_route(table, fake_packet_entry, metric, packet.sender_router_id, sock)
 
 
-def input_processing(table: RoutingTable, sockets: List[socket]):
+def process_packet(
+    table: RoutingTable, packet: ResponsePacket, port: int, sock: Output
+):
+    """
+    Processes a single received Response packet.
+
+    Keyword arguments:
+
+    port -- The input port that the packet was received on.
+
+    sock -- The output used to send any resulting updates.
+    """
+    router_id = packet.sender_router_id
+    table.metrics.packets_received.inc()
+    if validate_packet(table, packet):
+        process_entries(table, packet, port, sock)
+    else:
+        table.metrics.invalid_packets.inc()
+
+    # The following adds entries if the packet sender's `router_id` is
+    # inside the config file.
+    if router_id in table.config_table:
+        if router_id not in table:
+            # If the sender's `router_id` isn't in the routing table, add
+            # it.
+            add_discovered(table, packet, sock)
+        elif table.config_table[router_id].cost <= table[router_id].metric:
+            # Actually updates the entry. The underlying idea is the same
+            # as adding a newly discovered route.
+            add_discovered(table, packet, sock)
+        elif (
+            table[router_id].next_hop not in table
+            or table[table[router_id].next_hop].metric == INFINITY
+        ):
+            # Let the next_hop for the router be R. If R isn't in the
+            # routing table, or if R has a metric of infinity, update
+            # the entry with the information inferred from the packet.
+            add_discovered(table, packet, sock)
+        else:
+            # There's no changes here, thus update the timeout timer.
+            table[router_id].update_timeout_time(table.timeout_delta)
+
+
+def input_processing(
+    table: RoutingTable,
+    sockets: List[socket],
+    timeout: float = MAX_WAIT_TIME,
+    selector: Optional[SocketSelector] = None,
+):
     """
     The processing is the same, no matter why the Response was generated.
+
+    Keyword arguments:
+
+    timeout -- The number of seconds to block for, waiting for packets. This
+    is normally the time until the next timer is due.
+
+    selector -- Waits for the sockets registered with it, instead of calling
+    `select` on `sockets`.
+
+    The clock is read once the wait is over, and the packets are processed at
+    that time.
     """
-    for packet, port, sock in get_packets(sockets):
-        router_id = packet.sender_router_id
-        if validate_packet(table, packet):
-            for entry in packet.entries:
-                process_entry(table, entry, packet, port, sock)
-
-        # The following adds entries if the packet sender's `router_id` is
-        # inside the config file.
-        if router_id in table.config_table:
-            if router_id not in table:
-                # If the sender's `router_id` isn't in the routing table, add
-                # it.
-                add_discovered(table, packet, sock)
-            elif table.config_table[router_id].cost <= table[router_id].metric:
-                # Actually updates the entry. The underlying idea is the same
-                # as adding a newly discovered route.
-                add_discovered(table, packet, sock)
-            elif (
-                table[router_id].next_hop not in table
-                or table[table[router_id].next_hop].metric == INFINITY
-            ):
-                # Let the next_hop for the router be R. If R isn't in the
-                # routing table, or if R has a metric of infinity, update
-                # the entry with the information inferred from the packet.
-                add_discovered(table, packet, sock)
-            else:
-                # There's no changes here, thus update the timeout timer.
-                table[router_id].update_timeout_time(table.timeout_delta)
-
-    logger(str(table))
+    packets = get_packets(sockets, timeout, selector=selector)
+    clock.tick()
+    for packet, port, sock in packets:
+        process_packet(table, packet, port, sock)
+
+    table.renderer.log(table)
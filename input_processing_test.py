@@ -1,11 +1,19 @@
-from socket import AF_INET
+from socket import AF_INET, SOCK_DGRAM, socket
 from unittest import TestCase, main
 from unittest.mock import Mock, patch
 
-from input_processing import validate_entry
-from packet import ResponseEntry
+from input_processing import (
+    SocketSelector,
+    get_packets,
+    process_entry,
+    process_packet,
+    receive_buffers,
+    validate_entry,
+)
+from packet import ResponseEntry, ResponsePacket, construct_packets
+from routeentry import RouteEntry
 from routingtable import RoutingTable
-from validate_data import MAX_ID, MAX_METRIC, MIN_ID, MIN_METRIC
+from validate_data import INFINITY, MAX_ID, MAX_METRIC, MIN_ID, MIN_METRIC
 
 
 class TestValidateEntry(TestCase):
@@ -83,5 +91,168 @@ class TestValidateEntry(TestCase):
         )
 
 
+@patch("input_processing.logger")
+class TestUnreachableUpdate(TestCase):
+    def setUp(self):
+        self.table = RoutingTable(1, 30, 180, 120)
+        for neighbour in (2, 3):
+            self.table.add_config_data(neighbour, 5000 + neighbour, 1)
+            self.table.add_route(
+                neighbour, RouteEntry(5000 + neighbour, 1, 180)
+            )
+        self.table.add_route(4, RouteEntry(5002, 2, 180, 2))
+        self.table.take_flagged()
+
+    def receive(self, sender: int):
+        entry = ResponseEntry(AF_INET, 4, INFINITY)
+        packet = ResponsePacket(2, 2, sender, [entry])
+        process_entry(self.table, entry, packet, 5000 + sender, Mock())
+
+    def test_from_another_router(self, logger):
+        self.receive(3)
+
+        route = self.table[4]
+        self.assertEqual((route.metric, route.next_hop), (2, 2))
+        self.assertEqual(self.table.take_flagged(), [])
+        self.assertEqual(len(self.table.actor), 0)
+
+    def test_from_next_hop(self, logger):
+        self.receive(2)
+
+        self.assertEqual(self.table[4].metric, INFINITY)
+        self.assertEqual(self.table.take_flagged(), [4])
+        # The deletion process is started.
+        self.assertEqual(len(self.table.actor), 1)
+
+
+@patch("input_processing.logger")
+class TestDiscoveredRoutes(TestCase):
+    def setUp(self):
+        self.table = RoutingTable(1, 30, 180, 120)
+        self.table.add_config_data(2, 5002, 1)
+        self.packet = ResponsePacket(2, 2, 2, [])
+
+    def test_refresh_keeps_snapshot(self, logger):
+        process_packet(self.table, self.packet, 5001, Mock())
+        route = self.table[2]
+        snapshot = self.table.snapshot()
+
+        process_packet(self.table, self.packet, 5001, Mock())
+
+        self.assertIs(self.table[2], route)
+        self.assertIs(self.table.snapshot(), snapshot)
+
+
+class SocketTestCase(TestCase):
+    def setUp(self):
+        self.inputs = []
+        for _ in range(2):
+            sock = socket(AF_INET, SOCK_DGRAM)
+            sock.setblocking(False)
+            sock.bind(("localhost", 0))
+            self.inputs.append(sock)
+        self.output = socket(AF_INET, SOCK_DGRAM)
+
+    def tearDown(self):
+        for sock in self.inputs + [self.output]:
+            sock.close()
+
+    def _send(self, sock: socket, sender_router_id: int, count: int):
+        table = RoutingTable(sender_router_id, 1, 1, 1)
+        table.add_route(7, RouteEntry(0, 1, 0, 0))
+        packet = construct_packets(table, 1)[0]
+        for _ in range(count):
+            self.output.sendto(packet, sock.getsockname())
+
+
+class TestGetPackets(SocketTestCase):
+    def test_sockets_are_drained(self):
+        self._send(self.inputs[0], 2, 5)
+        self._send(self.inputs[1], 3, 2)
+
+        packets = get_packets(self.inputs, 1)
+
+        self.assertEqual(
+            [packet.sender_router_id for packet, _, _ in packets],
+            [2] * 5 + [3] * 2,
+        )
+        self.assertEqual(packets[0][0].entries, [ResponseEntry(AF_INET, 7, 1)])
+        self.assertEqual(get_packets(self.inputs, 0), [])
+
+    def test_batch_cap(self):
+        self._send(self.inputs[0], 2, 5)
+        self._send(self.inputs[1], 3, 1)
+
+        packets = get_packets(self.inputs, 1, max_batch=2)
+        self.assertEqual(
+            [packet.sender_router_id for packet, _, _ in packets], [2, 2, 3]
+        )
+
+        packets = get_packets(self.inputs, 1, max_batch=2)
+        self.assertEqual(len(packets), 2)
+
+    @patch("input_processing.logger")
+    def test_truncated_packets_are_ignored(self, logger):
+        self.output.sendto(b"\x02", self.inputs[0].getsockname())
+        self._send(self.inputs[0], 2, 1)
+
+        packets = get_packets(self.inputs, 1)
+
+        self.assertEqual(len(packets), 1)
+
+    def test_buffers_are_reused(self):
+        self._send(self.inputs[0], 2, 3)
+        get_packets(self.inputs, 1)
+        allocated = len(receive_buffers)
+
+        self._send(self.inputs[0], 2, 3)
+        get_packets(self.inputs, 1)
+
+        self.assertEqual(len(receive_buffers), allocated)
+
+
+class TestSocketSelector(SocketTestCase):
+    def setUp(self):
+        super().setUp()
+        self.selector = SocketSelector(self.inputs)
+
+    def tearDown(self):
+        self.selector.close()
+        super().tearDown()
+
+    def test_sockets_are_drained(self):
+        self._send(self.inputs[0], 2, 5)
+        self._send(self.inputs[1], 3, 2)
+
+        packets = get_packets([], 1, selector=self.selector)
+
+        self.assertEqual(
+            sorted(packet.sender_router_id for packet, _, _ in packets),
+            [2] * 5 + [3] * 2,
+        )
+        ports = {sock.getsockname()[1] for sock in self.inputs}
+        self.assertEqual({port for _, port, _ in packets}, ports)
+        self.assertEqual(get_packets([], 0, selector=self.selector), [])
+
+    def test_update(self):
+        self.selector.update(self.inputs[1:])
+        self._send(self.inputs[0], 2, 1)
+        self._send(self.inputs[1], 3, 1)
+
+        packets = get_packets([], 1, selector=self.selector)
+
+        self.assertEqual(len(self.selector), 1)
+        self.assertEqual(
+            [packet.sender_router_id for packet, _, _ in packets], [3]
+        )
+
+    def test_closed_sockets_are_unregistered(self):
+        self.inputs[0].close()
+
+        self.selector.update(self.inputs[1:])
+
+        self.assertEqual(len(self.selector), 1)
+
+
 if __name__ == "__main__":
     main()
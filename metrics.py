@@ -0,0 +1,351 @@
+import os
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Event, Thread
+from typing import Any, Callable, List, NamedTuple, Optional, Sequence, Union
+from weakref import WeakSet
+
+import routerbase
+from routerbase import logger
+
+# The prefix of every metric's name.
+PREFIX = "rip_"
+
+# The upper bounds of the loop latency histogram's buckets, in seconds.
+LATENCY_BUCKETS = (
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    1.0,
+)
+
+# The default number of seconds between writes of the metrics file.
+WRITE_INTERVAL = 15.0
+
+# The content type of the Prometheus text format.
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+COUNTER = "counter"
+GAUGE = "gauge"
+
+
+class Counter:
+    """A count which only goes up."""
+
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: int = 1) -> None:
+        self.value += amount
+
+
+class Histogram:
+    """
+    Counts observed values into buckets, in the same way as a Prometheus
+    histogram.
+
+    Instance variables:
+
+    bounds -- The upper bound of each bucket, in ascending order.
+
+    counts -- The number of values which fell into each bucket, with a final
+    bucket for the values above every bound. Unlike the exported buckets,
+    these aren't cumulative.
+
+    sum -- The sum of every observed value.
+
+    count -- The number of observed values.
+    """
+
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Sequence[float] = LATENCY_BUCKETS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class RouterMetrics:
+    """
+    The metrics of a single router, which aren't already counted by one of the
+    routing table's other parts. Everything is only changed by the thread
+    which owns the table.
+    """
+
+    def __init__(self):
+        self.packets_received = Counter()
+        self.invalid_packets = Counter()
+        self.invalid_entries = Counter()
+        self.routes_added = Counter()
+        self.routes_adopted = Counter()
+        self.routes_timed_out = Counter()
+        self.routes_collected = Counter()
+        self.loop_latency = Histogram()
+
+
+class Family(NamedTuple):
+    name: str
+    kind: str
+    help: str
+    read: Callable[[Any], float]
+
+
+# Every metric that's exported for each routing table.
+FAMILIES = (
+    Family(
+        "packets_received_total",
+        COUNTER,
+        "Response packets received.",
+        lambda table: table.metrics.packets_received.value,
+    ),
+    Family(
+        "invalid_packets_total",
+        COUNTER,
+        "Response packets rejected by validate_packet.",
+        lambda table: table.metrics.invalid_packets.value,
+    ),
+    Family(
+        "invalid_entries_total",
+        COUNTER,
+        "Packet entries rejected by validate_entry.",
+        lambda table: table.metrics.invalid_entries.value,
+    ),
+    Family(
+        "packets_sent_total",
+        COUNTER,
+        "Response packets sent.",
+        lambda table: table.sender.packets,
+    ),
+    Family(
+        "packets_dropped_total",
+        COUNTER,
+        "Response packets which couldn't be sent.",
+        lambda table: table.sender.dropped,
+    ),
+    Family(
+        "routes_added_total",
+        COUNTER,
+        "Routes added to the routing table.",
+        lambda table: table.metrics.routes_added.value,
+    ),
+    Family(
+        "routes_adopted_total",
+        COUNTER,
+        "Routes whose metric or next hop was changed by a received packet.",
+        lambda table: table.metrics.routes_adopted.value,
+    ),
+    Family(
+        "routes_timed_out_total",
+        COUNTER,
+        "Routes whose timeout expired.",
+        lambda table: table.metrics.routes_timed_out.value,
+    ),
+    Family(
+        "routes_collected_total",
+        COUNTER,
+        "Routes removed by garbage collection.",
+        lambda table: table.metrics.routes_collected.value,
+    ),
+    Family(
+        "triggered_updates_sent_total",
+        COUNTER,
+        "Triggered updates sent.",
+        lambda table: table.triggered_updates.sent,
+    ),
+    Family(
+        "triggered_updates_suppressed_total",
+        COUNTER,
+        "Triggered updates dropped, as a regular update was sent first.",
+        lambda table: table.triggered_updates.suppressed,
+    ),
+    Family(
+        "routes",
+        GAUGE,
+        "Routes inside the routing table.",
+        lambda table: len(table),
+    ),
+)
+
+LOOP_LATENCY = "loop_latency_seconds"
+LOOP_LATENCY_HELP = "Time taken to process each wakeup of the router."
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and not value.is_integer():
+        return repr(value)
+    return str(int(value))
+
+
+class Registry:
+    """
+    Collects the metrics of every registered routing table, and renders them
+    in the Prometheus text format. Each table's metrics are labelled with its
+    `router_id`, so a host of many routers exports them all together.
+
+    Tables are held weakly, so they don't have to be unregistered.
+    """
+
+    def __init__(self):
+        self.tables: "WeakSet[Any]" = WeakSet()
+
+    def register(self, table: Any) -> None:
+        self.tables.add(table)
+
+    def unregister(self, table: Any) -> None:
+        self.tables.discard(table)
+
+    def render(self) -> str:
+        """Returns every metric, in the Prometheus text format."""
+        tables = sorted(self.tables, key=lambda table: table.router_id)
+        lines: List[str] = []
+        for family in FAMILIES:
+            name = PREFIX + family.name
+            lines.append(f"# HELP {name} {family.help}")
+            lines.append(f"# TYPE {name} {family.kind}")
+            for table in tables:
+                label = f'router_id="{table.router_id}"'
+                value = _format_value(family.read(table))
+                lines.append(f"{name}{{{label}}} {value}")
+
+        name = PREFIX + LOOP_LATENCY
+        lines.append(f"# HELP {name} {LOOP_LATENCY_HELP}")
+        lines.append(f"# TYPE {name} histogram")
+        for table in tables:
+            label = f'router_id="{table.router_id}"'
+            histogram = table.metrics.loop_latency
+            total = 0
+            bounds = list(histogram.bounds) + [float("inf")]
+            for bound, count in zip(bounds, histogram.counts):
+                total += count
+                lines.append(
+                    f'{name}_bucket{{{label},le="{_format_value(bound)}"}} '
+                    f"{total}"
+                )
+            lines.append(f"{name}_sum{{{label}}} {repr(histogram.sum)}")
+            lines.append(f"{name}_count{{{label}}} {histogram.count}")
+
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+def write_metrics(path: str) -> None:
+    """
+    Writes every metric to the file. The file is replaced in one step, so a
+    scraper never reads a partly written file.
+    """
+    temporary = path + ".tmp"
+    with open(temporary, "w") as f:
+        f.write(registry.render())
+    os.replace(temporary, path)
+
+
+class FileExporter:
+    """
+    Writes every metric to a file from a background thread, every `interval`
+    seconds, for a scraper such as the node exporter's textfile collector.
+    """
+
+    def __init__(self, path: str, interval: float = WRITE_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self._stopped = Event()
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            try:
+                write_metrics(self.path)
+            except OSError as ex:
+                logger(
+                    f"Couldn't write the metrics to {self.path}: {ex}",
+                    level=routerbase.WARNING,
+                )
+            if self._stopped.wait(self.interval):
+                return
+
+    def close(self) -> None:
+        """Stops the thread, once it has written the metrics one last time."""
+        self._stopped.set()
+        self._thread.join()
+        try:
+            write_metrics(self.path)
+        except OSError:
+            pass
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logger("Metrics request: ", format % args, is_debug=True)
+
+
+class HttpExporter:
+    """
+    Serves every metric at `/metrics` over HTTP, from a background thread.
+    It only listens on the loopback interface by default.
+
+    Instance variables:
+
+    port -- The port that the server is listening on.
+    """
+
+    def __init__(self, port: int, host: str = "127.0.0.1"):
+        self._server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        self._server.daemon_threads = True
+        self.port: int = self._server.server_address[1]
+        self._thread = Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def close(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+
+Exporter = Union[FileExporter, HttpExporter]
+
+
+def create_exporters(
+    path: Optional[str], port: Optional[int], interval: float = WRITE_INTERVAL
+) -> List[Exporter]:
+    """
+    Starts the exporters which were asked for. Raises an `OSError` if the
+    HTTP server couldn't listen on the port.
+    """
+    exporters: List[Exporter] = []
+    if path is not None:
+        exporters.append(FileExporter(path, interval))
+    if port is not None:
+        exporters.append(HttpExporter(port))
+    return exporters
@@ -0,0 +1,135 @@
+import os
+import tempfile
+from socket import AF_INET
+from unittest import TestCase, main
+from unittest.mock import Mock, patch
+from urllib.request import urlopen
+
+from input_processing import process_packet
+from metrics import FileExporter, Histogram, HttpExporter, Registry, registry
+from packet import ResponseEntry, ResponsePacket
+from routeentry import RouteEntry
+from router import get_params, start_metrics
+from routingtable import RoutingTable
+from timers import clock
+
+
+def create_table(router_id: int = 1) -> RoutingTable:
+    table = RoutingTable(router_id, 30, 180, 120)
+    table.add_config_data(2, 5002, 1)
+    table.add_route(2, RouteEntry(5002, 1, 180))
+    return table
+
+
+class TestHistogram(TestCase):
+    def test_observe(self):
+        histogram = Histogram([0.1, 1.0])
+
+        histogram.observe(0.05)
+        histogram.observe(0.1)
+        histogram.observe(0.5)
+        histogram.observe(5.0)
+
+        self.assertEqual(histogram.counts, [2, 1, 1])
+        self.assertEqual(histogram.count, 4)
+        self.assertAlmostEqual(histogram.sum, 5.65)
+
+
+@patch("input_processing.logger")
+class TestRouterMetrics(TestCase):
+    def setUp(self):
+        clock.tick()
+
+    def test_tables_are_registered(self, logger):
+        table = create_table()
+
+        self.assertIn(table, registry.tables)
+
+    def test_packets_are_counted(self, logger):
+        table = create_table()
+        entries = [
+            ResponseEntry(AF_INET, 3, 1),
+            ResponseEntry(AF_INET, 4, 1),
+            ResponseEntry(AF_INET, 1, 1),
+            ResponseEntry(99, 5, 1),
+        ]
+
+        process_packet(table, ResponsePacket(2, 2, 2, entries), 5001, Mock())
+        process_packet(table, ResponsePacket(2, 2, 9, []), 5001, Mock())
+
+        metrics = table.metrics
+        self.assertEqual(metrics.packets_received.value, 2)
+        self.assertEqual(metrics.invalid_packets.value, 1)
+        # The entry for this router, and the entry with the wrong AFI.
+        self.assertEqual(metrics.invalid_entries.value, 2)
+        # Router 2 was added before the packets arrived.
+        self.assertEqual(metrics.routes_added.value, 3)
+
+    def test_render(self, logger):
+        local = Registry()
+        table = create_table(7)
+        table.metrics.packets_received.inc(3)
+        table.metrics.loop_latency.observe(0.002)
+        local.register(table)
+
+        text = local.render()
+
+        self.assertIn("# TYPE rip_packets_received_total counter\n", text)
+        self.assertIn('rip_packets_received_total{router_id="7"} 3\n', text)
+        self.assertIn('rip_routes{router_id="7"} 1\n', text)
+        self.assertIn(
+            'rip_loop_latency_seconds_bucket{router_id="7",le="0.001"} 0\n',
+            text,
+        )
+        self.assertIn(
+            'rip_loop_latency_seconds_bucket{router_id="7",le="0.0025"} 1\n',
+            text,
+        )
+        self.assertIn(
+            'rip_loop_latency_seconds_bucket{router_id="7",le="+Inf"} 1\n',
+            text,
+        )
+        self.assertIn('rip_loop_latency_seconds_count{router_id="7"} 1\n', text)
+
+
+class TestExporters(TestCase):
+    def test_file(self):
+        table = create_table(11)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "rip.prom")
+            exporter = FileExporter(path, 60)
+            table.metrics.packets_received.inc()
+            exporter.close()
+
+            with open(path) as f:
+                text = f.read()
+            self.assertIn('rip_packets_received_total{router_id="11"} 1', text)
+            self.assertEqual(os.listdir(directory), ["rip.prom"])
+
+    def test_mixed_case_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "Router-1.prom")
+            argv = ["router.py", "config.txt", f"Metrics-File={path}"]
+            with patch("sys.argv", argv):
+                _, options = get_params()
+
+            for exporter in start_metrics(options):
+                exporter.close()
+
+            self.assertEqual(os.listdir(directory), ["Router-1.prom"])
+
+    def test_http(self):
+        table = create_table(12)
+        exporter = HttpExporter(0)
+        try:
+            url = f"http://127.0.0.1:{exporter.port}/metrics"
+            with urlopen(url) as response:
+                text = response.read().decode()
+        finally:
+            exporter.close()
+
+        self.assertIn(f'rip_routes{{router_id="{table.router_id}"}} 1', text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,419 @@
+#########################################################
+#
+# Microbenchmarks of the packet, routing table and timer
+# hot paths.
+#
+# Times each path at a range of routing table sizes, and
+# reports the number of operations per second, the
+# latency percentiles of a single call, and the memory
+# allocated by a single call.
+#
+#########################################################
+
+import gc
+import json
+import sys
+import time
+import tracemalloc
+from contextlib import ExitStack
+from socket import AF_INET
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from unittest.mock import Mock, patch
+
+import routerbase
+from input_processing import input_processing, process_entry
+from output_processing import deletion_process
+from packet import (
+    ResponseEntry,
+    ResponsePacket,
+    construct_packets,
+    read_packet,
+    validate_packet,
+)
+from routeentry import RouteEntry
+from router import create_table, get_option, normalise_option
+from routestore import DICT_STORE, STORES
+from routingtable import RoutingTable
+from tablerenderer import TableRenderer
+from timers import clock, seconds
+from validate_data import MAX_ID
+
+# The version of the results format.
+RESULTS_VERSION = 1
+
+SIZES = [10, 100, 1000, 10000, 64000]
+
+# The default number of seconds each benchmark runs for, at each size.
+RUN_TIME = 0.5
+
+# Benchmarks are always run at least this many times.
+MIN_CALLS = 5
+
+# The number of calls which are traced to measure allocations.
+TRACED_CALLS = 3
+
+# Results which are slower than the baseline by more than this are reported.
+REGRESSION_THRESHOLD = 0.1
+
+# The neighbours which the benchmarked router receives packets from.
+NEIGHBOURS = (2, 3)
+
+# A benchmark creates a call for a routing table size, along with a function
+# which is run, untimed, before each call. Anything the calls need for the
+# whole run, such as a patch, is entered on the `ExitStack`.
+Call = Callable[[], Any]
+Benchmark = Callable[[int, str, ExitStack], Tuple[Call, Optional[Call]]]
+
+
+def create_benchmark_table(size: int, store: str = DICT_STORE) -> RoutingTable:
+    """
+    Creates the routing table of router 1, with routes to `size` routers
+    learned from its neighbours.
+    """
+    output_ports = [
+        (5000 + neighbour, 1, neighbour) for neighbour in NEIGHBOURS
+    ]
+    table = create_table(1, [], output_ports, [30, 180, 120], store)
+    # The table is never printed, so it isn't worth rendering.
+    table.renderer = TableRenderer(interval=float("inf"))
+    for neighbour in NEIGHBOURS:
+        table.add_route(neighbour, RouteEntry(5000 + neighbour, 1, 180))
+    last_id = min(size + 1, MAX_ID)
+    for router_id in range(NEIGHBOURS[-1] + 1, last_id + 1):
+        next_hop = NEIGHBOURS[router_id % len(NEIGHBOURS)]
+        entry = RouteEntry(5000 + next_hop, 2, 180, next_hop)
+        table.add_route(router_id, entry)
+    return table
+
+
+def create_packet(table: RoutingTable, sender: int) -> ResponsePacket:
+    """
+    Returns a full packet from the `sender`, which refreshes the routes it's
+    the next hop of.
+    """
+    entries = [
+        ResponseEntry(AF_INET, router_id, 1)
+        for router_id, entry in table.snapshot().items()
+        if entry.next_hop == sender and router_id != sender
+    ]
+    return ResponsePacket(2, 2, sender, entries[:25])
+
+
+def bench_construct_packets(size: int, store: str, stack: ExitStack):
+    table = create_benchmark_table(size, store)
+    return lambda: construct_packets(table, NEIGHBOURS[0]), None
+
+
+def bench_read_packet(size: int, store: str, stack: ExitStack):
+    table = create_benchmark_table(size, store)
+    data = bytes(construct_packets(table, NEIGHBOURS[0])[0])
+    return lambda: read_packet(data), None
+
+
+def bench_validate_packet(size: int, store: str, stack: ExitStack):
+    table = create_benchmark_table(size, store)
+    packet = create_packet(table, NEIGHBOURS[0])
+    return lambda: validate_packet(table, packet), None
+
+
+def bench_process_entry(size: int, store: str, stack: ExitStack):
+    table = create_benchmark_table(size, store)
+    packet = create_packet(table, NEIGHBOURS[0])
+    sock = Mock()
+
+    def call():
+        for entry in packet.entries:
+            process_entry(table, entry, packet, 5000, sock)
+
+    return call, None
+
+
+def bench_input_processing(size: int, store: str, stack: ExitStack):
+    table = create_benchmark_table(size, store)
+    sock = Mock()
+    received = [
+        (create_packet(table, neighbour), 5000, sock)
+        for neighbour in NEIGHBOURS
+    ]
+
+    stack.enter_context(
+        patch("input_processing.get_packets", return_value=received)
+    )
+
+    def call():
+        input_processing(table, [sock], 0)
+
+    return call, None
+
+
+def bench_deletion_process(size: int, store: str, stack: ExitStack):
+    """Times out every route in the table at once."""
+    tables: List[RoutingTable] = []
+    sock = Mock()
+
+    def prepare():
+        clock.tick()
+        tables[:] = [create_benchmark_table(size, store)]
+        clock.set(clock.now() + seconds(181))
+
+    def call():
+        deletion_process(tables[0], sock)
+
+    return call, prepare
+
+
+def bench_table_str(size: int, store: str, stack: ExitStack):
+    """Renders the whole table, without any cached rows."""
+    table = create_benchmark_table(size, store)
+
+    def prepare():
+        table.renderer = TableRenderer(interval=float("inf"))
+
+    return lambda: str(table), prepare
+
+
+BENCHMARKS: Dict[str, Benchmark] = {
+    "construct_packets": bench_construct_packets,
+    "read_packet": bench_read_packet,
+    "validate_packet": bench_validate_packet,
+    "process_entry": bench_process_entry,
+    "input_processing": bench_input_processing,
+    "deletion_process": bench_deletion_process,
+    "table_str": bench_table_str,
+}
+
+
+def percentile(latencies: List[float], fraction: float) -> float:
+    """Returns the given percentile of the sorted `latencies`."""
+    index = min(int(fraction * len(latencies)), len(latencies) - 1)
+    return latencies[index]
+
+
+def _time_calls(
+    call: Call, prepare: Optional[Call], run_time: float
+) -> List[float]:
+    latencies: List[float] = []
+    end = time.perf_counter() + run_time
+    while len(latencies) < MIN_CALLS or time.perf_counter() < end:
+        if prepare is not None:
+            prepare()
+        start = time.perf_counter()
+        call()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def _trace_calls(call: Call, prepare: Optional[Call]) -> Tuple[int, int]:
+    """
+    Returns the peak number of bytes allocated by a call, and the number of
+    blocks it leaves allocated, averaged over `TRACED_CALLS` calls.
+    """
+    peak = 0
+    retained = 0
+    for _ in range(TRACED_CALLS):
+        if prepare is not None:
+            prepare()
+        gc.collect()
+        tracemalloc.start()
+        try:
+            blocks = sys.getallocatedblocks()
+            start, _ = tracemalloc.get_traced_memory()
+            call()
+            _, call_peak = tracemalloc.get_traced_memory()
+            retained += sys.getallocatedblocks() - blocks
+        finally:
+            tracemalloc.stop()
+        peak += call_peak - start
+    return peak // TRACED_CALLS, retained // TRACED_CALLS
+
+
+def run_benchmark(
+    name: str, size: int, store: str = DICT_STORE, run_time: float = RUN_TIME
+) -> Dict[str, Any]:
+    """Runs a benchmark at a single table size, and returns its result."""
+    clock.tick()
+    with ExitStack() as stack:
+        call, prepare = BENCHMARKS[name](size, store, stack)
+        # The first call warms up any caches.
+        if prepare is not None:
+            prepare()
+        call()
+
+        latencies = sorted(_time_calls(call, prepare, run_time))
+        peak_bytes, retained_blocks = _trace_calls(call, prepare)
+    total = sum(latencies)
+    return {
+        "name": name,
+        "size": size,
+        "calls": len(latencies),
+        "ops_per_sec": len(latencies) / total if total > 0 else float("inf"),
+        "p50": percentile(latencies, 0.5),
+        "p90": percentile(latencies, 0.9),
+        "p99": percentile(latencies, 0.99),
+        "max": latencies[-1],
+        "peak_bytes": peak_bytes,
+        "retained_blocks": retained_blocks,
+    }
+
+
+def run_suite(
+    names: List[str],
+    sizes: List[int],
+    store: str = DICT_STORE,
+    run_time: float = RUN_TIME,
+) -> Dict[str, Any]:
+    """
+    Runs every named benchmark at every table size.
+
+    Returns the results.
+    """
+    level = routerbase.LOG_LEVEL
+    inline = routerbase.pool.inline
+    routerbase.configure_logging(level=routerbase.ERROR)
+    # Packets are sent straight away, instead of from worker threads.
+    routerbase.pool.inline = True
+    try:
+        results = [
+            run_benchmark(name, size, store, run_time)
+            for name in names
+            for size in sizes
+        ]
+    finally:
+        clock.tick()
+        routerbase.pool.inline = inline
+        routerbase.configure_logging(level=level)
+
+    return {
+        "version": RESULTS_VERSION,
+        "store": store,
+        "timestamp": time.time(),
+        "python": sys.version.split()[0],
+        "results": results,
+    }
+
+
+def find_regressions(
+    results: Dict[str, Any], baseline: Dict[str, Any]
+) -> List[Tuple[str, int, float]]:
+    """
+    Compares the median latencies to those of the `baseline`.
+
+    Returns the `(name, size, slowdown)` of each result which is slower by
+    more than `REGRESSION_THRESHOLD`.
+    """
+    before = {
+        (result["name"], result["size"]): result["p50"]
+        for result in baseline["results"]
+    }
+    regressions = []
+    for result in results["results"]:
+        p50 = before.get((result["name"], result["size"]))
+        if p50 is None or p50 == 0:
+            continue
+        slowdown = result["p50"] / p50 - 1
+        if slowdown > REGRESSION_THRESHOLD:
+            regressions.append((result["name"], result["size"], slowdown))
+    return regressions
+
+
+def format_results(results: Dict[str, Any]) -> str:
+    """Formats the results as a table."""
+    lines = [
+        f"{'benchmark':<18} | {'size':>6} | {'ops/sec':>10} | "
+        f"{'p50 us':>10} | {'p90 us':>10} | {'p99 us':>10} | "
+        f"{'peak B':>10} | {'blocks':>7}"
+    ]
+    for result in results["results"]:
+        lines.append(
+            f"{result['name']:<18} | {result['size']:>6} | "
+            f"{result['ops_per_sec']:>10.1f} | "
+            f"{result['p50'] * 1e6:>10.1f} | {result['p90'] * 1e6:>10.1f} | "
+            f"{result['p99'] * 1e6:>10.1f} | {result['peak_bytes']:>10} | "
+            f"{result['retained_blocks']:>7}"
+        )
+    return "\n".join(lines)
+
+
+def _split(value: Optional[str]) -> Optional[List[str]]:
+    if value is None:
+        return None
+    return [item for item in value.split(",") if item]
+
+
+def main():
+    """
+    Runs the benchmarks given by the command line arguments, and prints their
+    results. The names of the options aren't case sensitive, but their values
+    are.
+
+    Usage: python microbench.py [options]
+
+    The options are any of:
+
+    sizes=<n>,<n>,... -- The numbers of routes in the routing table.
+    Defaults to 10,100,1000,10000,64000.
+
+    only=<name>,<name>,... -- Only runs the named benchmarks.
+
+    store=dict|array -- The routing table's route storage. Defaults to dict.
+
+    time=<seconds> -- How long each benchmark runs for, at each size.
+    Defaults to 0.5.
+
+    baseline=<filename> -- Compares the results to the results of an earlier
+    run, and reports any which are slower by more than 10%.
+
+    out=<filename> -- Also writes the results as JSON to the file.
+    """
+    options = {normalise_option(arg) for arg in sys.argv[1:]}
+    if "help" in options or "-h" in options:
+        routerbase.logger(
+            "Usage: python microbench.py [sizes=<n>,...] [only=<name>,...] "
+            "[store=dict|array] [time=<seconds>] [baseline=<filename>] "
+            "[out=<filename>]"
+        )
+        return
+
+    sizes = _split(get_option(options, "sizes"))
+    names = _split(get_option(options, "only")) or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            routerbase.logger(
+                f"Unknown benchmark {name}", level=routerbase.ERROR
+            )
+            return
+    store = get_option(options, "store") or DICT_STORE
+    if store not in STORES:
+        routerbase.logger(f"Unknown store {store}", level=routerbase.ERROR)
+        return
+    run_time = get_option(options, "time")
+
+    results = run_suite(
+        names,
+        [int(size) for size in sizes] if sizes is not None else SIZES,
+        store,
+        float(run_time) if run_time is not None else RUN_TIME,
+    )
+    print(format_results(results))
+
+    filename = get_option(options, "out")
+    if filename is not None:
+        with open(filename, "w") as f:
+            f.write(json.dumps(results, indent=2) + "\n")
+
+    baseline_filename = get_option(options, "baseline")
+    if baseline_filename is not None:
+        with open(baseline_filename) as f:
+            regressions = find_regressions(results, json.load(f))
+        for name, size, slowdown in regressions:
+            routerbase.logger(
+                f"Regression: {name} at {size} routes is {slowdown:.0%} "
+                "slower",
+                level=routerbase.WARNING,
+            )
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import json
+import os
+import tempfile
+from unittest import TestCase, main
+from unittest.mock import patch
+
+import input_processing
+from microbench import (
+    BENCHMARKS,
+    create_benchmark_table,
+    find_regressions,
+    main as microbench_main,
+    percentile,
+    run_suite,
+)
+from routestore import ARRAY_STORE
+
+
+class TestMicrobench(TestCase):
+    def test_every_benchmark_runs(self):
+        results = run_suite(list(BENCHMARKS), [10], run_time=0)
+
+        self.assertEqual(
+            [result["name"] for result in results["results"]],
+            list(BENCHMARKS),
+        )
+        for result in results["results"]:
+            self.assertGreaterEqual(result["calls"], 5)
+            self.assertLessEqual(result["p50"], result["p99"])
+            self.assertGreater(result["peak_bytes"], 0)
+
+    def test_patches_are_undone(self):
+        get_packets = input_processing.get_packets
+
+        run_suite(["input_processing"], [10], run_time=0)
+
+        self.assertIs(input_processing.get_packets, get_packets)
+
+    def test_table_size(self):
+        table = create_benchmark_table(100, ARRAY_STORE)
+
+        self.assertEqual(len(table), 100)
+
+    def test_percentile(self):
+        latencies = [float(i) for i in range(100)]
+
+        self.assertEqual(percentile(latencies, 0.5), 50.0)
+        self.assertEqual(percentile(latencies, 0.99), 99.0)
+        self.assertEqual(percentile([1.0], 0.99), 1.0)
+
+    def test_find_regressions(self):
+        baseline = {"results": [{"name": "a", "size": 10, "p50": 1.0}]}
+        results = {
+            "results": [
+                {"name": "a", "size": 10, "p50": 1.5},
+                {"name": "b", "size": 10, "p50": 1.0},
+            ]
+        }
+
+        self.assertEqual(find_regressions(results, baseline), [("a", 10, 0.5)])
+        self.assertEqual(find_regressions(baseline, baseline), [])
+
+    @patch("microbench.print", create=True)
+    def test_mixed_case_paths(self, print):
+        results = {"results": [{"name": "a", "size": 10, "p50": 1.0}]}
+        with tempfile.TemporaryDirectory() as directory:
+            baseline = os.path.join(directory, "Baseline.json")
+            with open(baseline, "w") as f:
+                json.dump(results, f)
+            out = os.path.join(directory, "Results.json")
+            argv = ["microbench.py", f"Baseline={baseline}", f"Out={out}"]
+            with patch("sys.argv", argv), patch(
+                "microbench.run_suite", return_value=results
+            ), patch("microbench.format_results", return_value=""):
+                microbench_main()
+
+            self.assertEqual(
+                sorted(os.listdir(directory)), ["Baseline.json", "Results.json"]
+            )
+
+    @patch("routerbase.logger")
+    def test_unknown_benchmark(self, logger):
+        with patch("sys.argv", ["microbench.py", "only=nothing"]), patch(
+            "microbench.run_suite"
+        ) as run:
+            microbench_main()
+
+        run.assert_not_called()
+        self.assertEqual(logger.call_args[0][0], "Unknown benchmark nothing")
+
+
+if __name__ == "__main__":
+    main()
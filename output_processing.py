@@ -1,101 +1,205 @@
-from datetime import datetime
-from socket import socket
-from typing import Optional
+from typing import List, Optional, Tuple, cast
 
-from packet import construct_packets
-from routeentry import RouteEntry
+from packet import construct_cached_packets, construct_packets
+from routeentry import Route
 from routerbase import logger, pool
 from routingtable import RoutingTable
+from sendengine import Output
+from timers import (
+    GARBAGE_COLLECTION,
+    ROUTE_TIMEOUT,
+    ROUTE_TIMERS,
+    SCHEDULED_UPDATE,
+    TRIGGERED_UPDATE,
+    UPDATE_TIMERS,
+    clock,
+)
 from validate_data import INFINITY
 
 
-def send_response(sock: socket, port: int, packet: bytearray):
-    """
-    Sends a `Response` packet to the given `router_id`.
-    """
-    # Ignore the pyright error - it fails to resolve bytearray and bytes, when
-    # it really should.
-    sock.sendto(packet, ("localhost", port))
-
-
-def _send_responses(table: RoutingTable, sock: socket, clear_flags=False):
-    logger(str(table))
+def _build_responses(table: RoutingTable) -> List[Tuple[int, bytearray]]:
+    packets: List[Tuple[int, bytearray]] = []
     for router_id in table:
         if router_id in table.config_table:
-            packets = construct_packets(table, router_id)
             port = table.config_table[router_id].port
-            for packet in packets:
-                logger(
-                    f"Sending to router_id {router_id} port {port} ",
-                    is_debug=True,
-                )
-                send_response(sock, port, packet)
+            logger(
+                "Sending to router_id ",
+                router_id,
+                " port ",
+                port,
+                is_debug=True,
+            )
+            for packet in construct_cached_packets(table, router_id):
+                packets.append((port, packet))
 
-    if clear_flags:
-        for router_id in table:
-            entry: RouteEntry = table[router_id]
-            entry.flag = False
+    logger("Response cache: ", table.response_cache, is_debug=True)
+    return packets
 
 
-def send_responses(table: RoutingTable, sock: socket, clear_flags=False):
+def send_responses(table: RoutingTable, sock: Output):
     """
     Sends unsolicited `Response` messages containing the entire routing
-    table to every neighbouring router.
+    table to every neighbouring router. Every packet is queued, and then the
+    whole cycle is sent together by the table's `sender`.
+
+    The packets are constructed on the calling thread, which owns the table
+    and its `response_cache`, and only the sending is done in the background.
     """
-    pool.submit(_send_responses, table, sock, clear_flags)
+    table.renderer.log(table)
+    pool.submit(table.sender.send, sock, _build_responses(table))
 
 
-def timeout_processing(table: RoutingTable, entry: RouteEntry, sock: socket):
+def send_triggered_responses(table: RoutingTable, sock: Output):
+    """
+    Sends triggered `Response` messages to every neighbouring router, which
+    only contain the routes whose route change flag is set, as per RFC 2453
+    section 3.10.1.
+
+    The flagged routes are collected, encoded and have their flags cleared on
+    the calling thread, so a route which is flagged while the packets are
+    being sent is kept for the next triggered update.
+    """
+    changed = table.take_flagged()
+    if len(changed) == 0:
+        return
+
+    logger("Triggered update for router_ids ", changed, is_debug=True)
+    packets: List[Tuple[int, bytearray]] = []
+    for router_id in table:
+        if router_id in table.config_table:
+            port = table.config_table[router_id].port
+            for packet in construct_packets(table, router_id, changed):
+                packets.append((port, packet))
+
+    pool.submit(table.sender.send, sock, packets)
+
+
+def timeout_processing(table: RoutingTable, router_id: int, sock: Output):
     """Starts processing for the timeout timer."""
     logger("About to set gc time", is_debug=True)
-    entry.set_garbage_collection_time(table.gc_delta)
+    entry: Route = table[router_id]
+    now = table.start_garbage_collection(router_id)
     entry.metric = INFINITY
-    entry.flag = True
+    table.flag_route(router_id)
+    table.mark_changed()
 
-    now = datetime.now()
-    can_update = table.set_triggered_update_time(now)
+    # Suppresses the update if the next scheduled update will be sent first.
+    # Otherwise, the triggered update is sent when its timer fires.
+    table.set_triggered_update_time(now)
 
-    # Suppresses the update if another triggered update has been sent
-    if can_update:
-        # Send triggered updates
-        send_responses(table, sock, True)
 
+def gc_processing(table: RoutingTable, router_id: int, now: int) -> bool:
+    """
+    Starts processing for the garbage collection timer.
 
-def gc_processing(
-    table: RoutingTable, router_id: int, entry: RouteEntry, now: datetime
+    Returns a Boolean indicating whether the route has expired, and should be
+    removed from the table.
+    """
+    if router_id not in table:
+        return False
+
+    entry: Route = table[router_id]
+    if entry.gc_time is None:
+        # The route was refreshed after its timeout, so its timeout timer is
+        # armed again.
+        table.timers.schedule(ROUTE_TIMEOUT, entry.timeout_time, router_id)
+    elif entry.gc_time > now:
+        table.timers.schedule(GARBAGE_COLLECTION, entry.gc_time, router_id)
+    else:
+        logger("Deleting router id ", router_id, is_debug=True)
+        return True
+    return False
+
+
+def _route_timeout(
+    table: RoutingTable, router_id: int, sock: Output, now: int
 ):
-    """Starts processing for the garbage collection timer."""
-    if (
-        router_id in table
-        and entry.gc_time is not None
-        and entry.gc_time <= now
-    ):
-        logger(f"Deleting router id {router_id}", is_debug=True)
-        del table[router_id]
+    """Handles a route timeout timer which is due."""
+    if router_id not in table:
+        return
+
+    entry: Route = table[router_id]
+    if entry.gc_time is not None:
+        # The garbage collection timer has taken over from the timeout timer.
+        return
+
+    if entry.timeout_time > now:
+        # The route has been refreshed since the timer was scheduled. Refreshes
+        # don't touch the timers, so the timer is lazily moved here instead.
+        table.timers.schedule(ROUTE_TIMEOUT, entry.timeout_time, router_id)
+        return
+
+    logger(
+        "About to go into timeout processing for router ",
+        router_id,
+        is_debug=True,
+    )
+    table.metrics.routes_timed_out.inc()
+    timeout_processing(table, router_id, sock)
 
 
 def deletion_process(
-    table: RoutingTable, sock: socket, new_infinite_id: Optional[int] = None
+    table: RoutingTable, sock: Output, new_infinite_id: Optional[int] = None
 ):
     """
     Handles the timeout and garbage collection timer processing for the
-    routing table.
+    routing table. Only the timers which are due are processed, instead of
+    every entry inside the table.
+
+    Keyword arguments:
+
+    new_infinite_id -- The `router_id` of a route whose metric has just become
+    infinite. Only that route is processed, and it immediately goes into
+    timeout processing.
     """
     logger("In deletion process", is_debug=True)
-    logger(f"New infinite id is {new_infinite_id}", is_debug=True)
-    now = datetime.now()  # Only calling it once minimises system time
-    for router_id in table:
-        logger(f"Current router id is {router_id}", is_debug=True)
-        entry: RouteEntry = table[router_id]
-        if entry.gc_time is not None:
+    if new_infinite_id is not None:
+        logger("New infinite id is ", new_infinite_id, is_debug=True)
+        if (
+            new_infinite_id in table
+            and table[new_infinite_id].gc_time is None
+        ):
+            timeout_processing(table, new_infinite_id, sock)
+        return
+
+    # The time is read once per iteration of the daemon's loop.
+    now = clock.now()
+    expired: List[int] = []
+    for kind, key in table.timers.pop_due(now, ROUTE_TIMERS):
+        # The route timers are keyed by `router_id`.
+        router_id = cast(int, key)
+        if kind == ROUTE_TIMEOUT:
+            _route_timeout(table, router_id, sock, now)
+        else:
             logger(
-                f"About to go into GC processing for router {router_id}",
+                "About to go into GC processing for router ",
+                router_id,
                 is_debug=True,
             )
-            gc_processing(table, router_id, entry, now)
-        elif entry.timeout_time <= now or router_id == new_infinite_id:
+            if gc_processing(table, router_id, now):
+                expired.append(router_id)
+
+    # Every expired route is removed in one step.
+    if expired:
+        table.metrics.routes_collected.inc(table.remove_routes(expired))
+
+
+def update_processing(table: RoutingTable, sock: Output):
+    """
+    Sends the scheduled and triggered updates whose timers are due.
+    """
+    now = clock.now()
+    for kind, _ in table.timers.pop_due(now, UPDATE_TIMERS):
+        if kind == SCHEDULED_UPDATE:
+            # The regular update contains every route, so it makes any pending
+            # triggered update redundant.
+            table.triggered_updates.suppress()
+            table.take_flagged()
+            send_responses(table, sock)
+            table.update_sched_update_time(now)
+        elif kind == TRIGGERED_UPDATE:
+            table.triggered_updates.mark_sent(now)
+            send_triggered_responses(table, sock)
             logger(
-                f"About to go into timeout processing for router {router_id}",
-                is_debug=True,
+                "Triggered updates: ", table.triggered_updates, is_debug=True
             )
-            pool.submit(timeout_processing, table, entry, sock)
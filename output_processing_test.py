@@ -0,0 +1,124 @@
+from unittest import TestCase, main
+from unittest.mock import Mock, patch
+
+import routerbase
+from output_processing import (
+    deletion_process,
+    send_responses,
+    send_triggered_responses,
+)
+from packet import read_packet
+from routeentry import RouteEntry
+from routingtable import RoutingTable
+from timers import GARBAGE_COLLECTION, ROUTE_TIMEOUT, clock, seconds
+from validate_data import INFINITY
+
+
+@patch("output_processing.logger")
+class TestDeletionProcess(TestCase):
+    def setUp(self):
+        clock.tick()
+        self.table = RoutingTable(1, 30, 180, 120)
+        self.sock = Mock()
+
+    def test_only_expired_routes_time_out(self, logger):
+        self.table.add_route(2, RouteEntry(0, 1, -1, 2))
+        self.table.add_route(3, RouteEntry(0, 1, 180, 3))
+
+        deletion_process(self.table, self.sock)
+
+        self.assertEqual(self.table[2].metric, INFINITY)
+        self.assertIsNotNone(self.table[2].gc_time)
+        self.assertEqual(self.table[3].metric, 1)
+        self.assertIn((GARBAGE_COLLECTION, 2), self.table.timers)
+
+    def test_refreshed_route_is_rearmed(self, logger):
+        self.table.add_route(2, RouteEntry(0, 1, -1, 2))
+        self.table[2].update_timeout_time(self.table.timeout_delta)
+
+        deletion_process(self.table, self.sock)
+
+        self.assertEqual(self.table[2].metric, 1)
+        self.assertEqual(
+            self.table.timers.pending[(ROUTE_TIMEOUT, 2)],
+            self.table[2].timeout_time,
+        )
+
+    def test_garbage_collection(self, logger):
+        self.table.add_route(2, RouteEntry(0, 1, 180, 2))
+        self.table.start_garbage_collection(
+            2, clock.now() - seconds(121)
+        )
+
+        deletion_process(self.table, self.sock)
+
+        self.assertNotIn(2, self.table)
+        self.assertNotIn((ROUTE_TIMEOUT, 2), self.table.timers)
+
+
+@patch("output_processing.logger")
+class TestTriggeredResponses(TestCase):
+    def setUp(self):
+        routerbase.pool.inline = True
+        self.table = RoutingTable(1, 30, 180, 120)
+        self.table.add_config_data(2, 2001, 1)
+        self.table.add_config_data(3, 3001, 1)
+        for router_id in range(2, 10):
+            self.table.add_route(router_id, RouteEntry(0, 1, 180, router_id))
+        self.sock = Mock()
+
+    def tearDown(self):
+        routerbase.pool.inline = False
+
+    def _sent(self):
+        return [
+            (addr[1], read_packet(packet).entries)
+            for (packet, addr), _ in self.sock.sendto.call_args_list
+        ]
+
+    def test_only_flagged_routes_are_sent(self, logger):
+        self.table.flag_route(5)
+        self.table.flag_route(3)
+
+        send_triggered_responses(self.table, self.sock)
+
+        sent = self._sent()
+        self.assertEqual([port for port, _ in sent], [2001, 3001])
+        self.assertEqual([entry.router_id for entry in sent[0][1]], [3, 5])
+        # Poisoned reverse still applies to the changed routes.
+        self.assertEqual([entry.metric for entry in sent[1][1]], [16, 1])
+
+    def test_flags_are_cleared(self, logger):
+        self.table.flag_route(5)
+
+        send_triggered_responses(self.table, self.sock)
+
+        self.assertFalse(self.table[5].flag)
+        self.assertEqual(len(self.table.flagged), 0)
+
+        send_triggered_responses(self.table, self.sock)
+        self.assertEqual(len(self._sent()), 2)
+
+    def test_removed_route_is_not_sent(self, logger):
+        self.table.flag_route(5)
+        del self.table[5]
+
+        send_triggered_responses(self.table, self.sock)
+
+        self.sock.sendto.assert_not_called()
+
+    def test_responses_are_built_before_sending(self, logger):
+        with patch("output_processing.pool") as pool:
+            send_responses(self.table, self.sock)
+
+        # Only the sending is done in the background.
+        fn, sock, packets = pool.submit.call_args[0]
+        self.assertEqual((fn, sock), (self.table.sender.send, self.sock))
+        self.assertEqual([port for port, _ in packets], [2001, 3001])
+        self.assertIsNotNone(
+            self.table.response_cache.get(2, self.table.generation)
+        )
+
+
+if __name__ == "__main__":
+    main()
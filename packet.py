@@ -1,8 +1,8 @@
 from socket import AF_INET
-from typing import List, NamedTuple, Union
+from struct import Struct
+from typing import Iterable, List, NamedTuple, Optional, Union
 
-from routeentry import RouteEntry
-from routerbase import logger
+from routerbase import Lazy, logger
 from routingtable import RoutingTable
 from validate_data import INFINITY
 
@@ -12,6 +12,12 @@ HEADER_LEN = 4
 RIP_PACKET_COMMAND = 2
 RIP_VERSION_NUMBER = 2
 
+# Precompiled layouts of the RIP header, and of a single RIP entry. The padding
+# bytes of an entry are the route tag, subnet mask and next hop, which are all
+# unused and zero.
+HEADER_STRUCT = Struct("!BBH")  # command, version, router_id
+ENTRY_STRUCT = Struct("!H2xI8xI")  # afi, router_id, metric
+
 
 class ResponseEntry(NamedTuple):
     afi: int
@@ -26,7 +32,11 @@ class ResponsePacket(NamedTuple):
     entries: List[ResponseEntry]
 
 
-def get_next_packet_entries(table: RoutingTable, dest_router_id: int):
+def get_next_packet_entries(
+    table: RoutingTable,
+    dest_router_id: int,
+    router_ids: Optional[Iterable[int]] = None,
+):
     """
     Gets the entries from the routing table, which can be sent to the given
     `router_id`. Entries which have a metric of less than infinity, or have a
@@ -36,10 +46,15 @@ def get_next_packet_entries(table: RoutingTable, dest_router_id: int):
     Keyword arguments:
     table -- The routing table, containing all of the entries.
     router_id -- The router the packet is being sent to.
+    router_ids -- Only the entries for these `router_id`s are yielded, such as
+    the changed routes for a triggered update. Defaults to the entire table.
     """
     entries = []
-    for current_router_id in table:
-        route: RouteEntry = table[current_router_id]
+    snapshot = table.snapshot()
+    for current_router_id in snapshot if router_ids is None else router_ids:
+        route = snapshot.get(current_router_id)
+        if route is None:
+            continue
         if route.next_hop == dest_router_id:
             route = route.shallow_copy()
             route.metric = INFINITY
@@ -59,10 +74,9 @@ def _construct_packet_header(packet: bytearray, table) -> None:
     packet -- The packet who will have its header populated.
     table -- The table from whom the packet is going to be sent from.
     """
-    # the following are implicitly converted to bytes
-    packet[0] = RIP_PACKET_COMMAND
-    packet[1] = RIP_VERSION_NUMBER
-    packet[2:4] = table.router_id.to_bytes(2, "big")
+    HEADER_STRUCT.pack_into(
+        packet, 0, RIP_PACKET_COMMAND, RIP_VERSION_NUMBER, table.router_id
+    )
 
 
 def _construct_packet(table: RoutingTable, entries) -> bytearray:
@@ -72,61 +86,120 @@ def _construct_packet(table: RoutingTable, entries) -> bytearray:
     """
     packet = bytearray(HEADER_LEN + len(entries) * ENTRY_LEN)
     _construct_packet_header(packet, table)
-    current_index = 4
 
+    pack_into = ENTRY_STRUCT.pack_into
+    offset = HEADER_LEN
     for (destination_router_id, entry) in entries:
-        packet[current_index : current_index + 2] = AF_INET.to_bytes(2, "big")
-        packet[
-            current_index + 4 : current_index + 8
-        ] = destination_router_id.to_bytes(4, "big")
-        packet[
-            current_index + 16 : current_index + ENTRY_LEN
-        ] = entry.metric.to_bytes(4, "big")
-        current_index += ENTRY_LEN
+        pack_into(packet, offset, AF_INET, destination_router_id, entry.metric)
+        offset += ENTRY_LEN
 
     return packet
 
 
-def construct_packets(table: RoutingTable, router_id: int) -> List[bytearray]:
-    """Constructs packets to send to a `router_id`, from the routing table."""
+def construct_packets(
+    table: RoutingTable,
+    router_id: int,
+    router_ids: Optional[Iterable[int]] = None,
+) -> List[bytearray]:
+    """
+    Constructs packets to send to a `router_id`, from the routing table.
+
+    Keyword arguments:
+    router_ids -- Only the entries for these `router_id`s are included, and no
+    empty packet is constructed if there are none. Defaults to the entire
+    table.
+    """
     packets: List[bytearray] = []
 
-    for entries in get_next_packet_entries(table, router_id):
+    for entries in get_next_packet_entries(table, router_id, router_ids):
+        if router_ids is not None and len(entries) == 0:
+            continue
         packets.append(_construct_packet(table, entries))
 
     return packets
 
 
-def _read_packet_entry(packet: Union[bytearray, bytes], start_index: int) -> ResponseEntry:
+def construct_fragment(
+    table: RoutingTable, router_id: int, router_ids: Iterable[int]
+) -> bytes:
     """
-    Returns the properties of a single RIP entry inside a RIP response packet.
+    Encodes the entries for the given `router_id`s which would be sent to a
+    `router_id`, without any packet headers. Fragments are combined into
+    packets by `merge_fragments`.
     """
-    afi = int.from_bytes(packet[start_index : start_index + 2], byteorder="big")
-    router_id = int.from_bytes(
-        packet[start_index + 4 : start_index + 8], byteorder="big"
-    )
-    metric = int.from_bytes(
-        packet[start_index + 16 : start_index + 20], byteorder="big"
+    return b"".join(
+        bytes(memoryview(packet)[HEADER_LEN:])
+        for packet in construct_packets(table, router_id, router_ids)
     )
-    return ResponseEntry(afi, router_id, metric)
 
 
-def read_packet(packet: Union[bytearray, bytes]) -> ResponsePacket:
-    """Returns the properties of the received RIP response packet."""
-    command: int = packet[0]
-    version: int = packet[1]
-    sender_router_id: int = int.from_bytes(packet[2:4], byteorder="big")
+def merge_fragments(
+    sender_router_id: int, fragments: Iterable[bytes], empty: bool = True
+) -> List[bytearray]:
+    """
+    Combines fragments of encoded entries into as few packets as possible,
+    each with up to `MAX_ENTRIES` entries.
 
-    entries = []
-    start_index = HEADER_LEN
-
-    while start_index < len(packet):
-        end_index = start_index + ENTRY_LEN
-        if end_index <= len(packet) and len(entries) < MAX_ENTRIES:
-            entries.append(_read_packet_entry(packet, start_index))
-        else:
-            return ResponsePacket(command, version, sender_router_id, entries)
-        start_index = end_index
+    Keyword arguments:
+    empty -- Constructs an empty packet if there are no entries, as is sent
+    for an empty routing table.
+    """
+    data = b"".join(fragments)
+    size = MAX_ENTRIES * ENTRY_LEN
+    packets: List[bytearray] = []
+    for start in range(0, len(data), size):
+        chunk = data[start : start + size]
+        packet = bytearray(HEADER_LEN + len(chunk))
+        HEADER_STRUCT.pack_into(
+            packet, 0, RIP_PACKET_COMMAND, RIP_VERSION_NUMBER, sender_router_id
+        )
+        packet[HEADER_LEN:] = chunk
+        packets.append(packet)
+    if not packets and empty:
+        packet = bytearray(HEADER_LEN)
+        HEADER_STRUCT.pack_into(
+            packet, 0, RIP_PACKET_COMMAND, RIP_VERSION_NUMBER, sender_router_id
+        )
+        packets.append(packet)
+    return packets
+
+
+def construct_cached_packets(
+    table: RoutingTable, router_id: int
+) -> List[bytearray]:
+    """
+    Returns the packets to send to a `router_id`, from the routing table.
+    The packets are reused from the table's `response_cache` if the table
+    hasn't changed since they were constructed.
+    """
+    # The generation is read first, so that changes made while the packets are
+    # being constructed invalidate them.
+    generation = table.generation
+    packets = table.response_cache.get(router_id, generation)
+    if packets is None:
+        packets = construct_packets(table, router_id)
+        table.response_cache.put(router_id, generation, packets)
+    return packets
+
+
+def read_packet(
+    packet: Union[bytearray, bytes, memoryview]
+) -> ResponsePacket:
+    """
+    Returns the properties of the received RIP response packet.
+
+    Trailing bytes which don't make up a whole entry, and any entries after the
+    first `MAX_ENTRIES`, are ignored.
+    """
+    view = memoryview(packet)
+    command, version, sender_router_id = HEADER_STRUCT.unpack_from(view)
+
+    count = min((len(view) - HEADER_LEN) // ENTRY_LEN, MAX_ENTRIES)
+    end_index = HEADER_LEN + max(count, 0) * ENTRY_LEN
+    entries = [
+        ResponseEntry(*fields)
+        for fields in ENTRY_STRUCT.iter_unpack(view[HEADER_LEN:end_index])
+    ]
     return ResponsePacket(command, version, sender_router_id, entries)
 
 
@@ -151,8 +224,11 @@ def validate_packet(table: RoutingTable, packet: ResponsePacket):
             is_debug=True,
         )
         logger(
-            f"Current neighbours of this router {table.router_id} are "
-            f"{[i for i in table.neighbours()]}.",
+            "Current neighbours of this router ",
+            table.router_id,
+            " are ",
+            Lazy(list, table.neighbours()),
+            ".",
             is_debug=True,
         )
         return False
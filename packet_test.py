@@ -4,8 +4,12 @@ from unittest.mock import Mock, patch
 
 import routerbase
 from packet import (
+    ResponseEntry,
     ResponsePacket,
+    construct_cached_packets,
+    construct_fragment,
     construct_packets,
+    merge_fragments,
     read_packet,
     validate_packet,
 )
@@ -191,6 +195,48 @@ class TestPacketConstruction(TestCase):
             self._test_single_packet(packet, expected_packet, i)
 
 
+class TestCachedPackets(TestCase):
+    def setUp(self):
+        self.table = RoutingTable(1, 0, 0, 0)
+        self.table.add_route(2, RouteEntry(0, 1, 0, 2))
+
+    def test_unchanged_table_hits(self):
+        first = construct_cached_packets(self.table, 3)
+        second = construct_cached_packets(self.table, 3)
+
+        self.assertIs(first, second)
+        self.assertEqual(self.table.response_cache.hits, 1)
+        self.assertEqual(self.table.response_cache.misses, 1)
+
+    def test_changes_invalidate(self):
+        construct_cached_packets(self.table, 3)
+
+        self.table[2].metric = 5
+        self.table.mark_changed()
+        packets = construct_cached_packets(self.table, 3)
+        self.assertEqual(read_packet(packets[0]).entries[0].metric, 5)
+
+        self.table.add_route(4, RouteEntry(0, 1, 0, 2))
+        packets = construct_cached_packets(self.table, 3)
+        self.assertEqual(len(read_packet(packets[0]).entries), 2)
+
+        del self.table[4]
+        packets = construct_cached_packets(self.table, 3)
+        self.assertEqual(len(read_packet(packets[0]).entries), 1)
+
+        self.assertEqual(self.table.response_cache.hits, 0)
+        self.assertEqual(self.table.response_cache.misses, 4)
+
+    def test_per_neighbour(self):
+        """Split horizon makes the packets differ for each neighbour."""
+        to_2 = construct_cached_packets(self.table, 2)
+        to_3 = construct_cached_packets(self.table, 3)
+
+        self.assertEqual(read_packet(to_2[0]).entries[0].metric, 16)
+        self.assertEqual(read_packet(to_3[0]).entries[0].metric, 1)
+        self.assertEqual(len(self.table.response_cache), 2)
+
+
 class TestPacketReading(TestCase):
     def setUp(self):
         routerbase.DEBUG_MODE = True
@@ -228,6 +274,35 @@ class TestPacketReading(TestCase):
             self.assertEqual(router_id, expected_router_id)
             self.assertEqual(metric, 1)
 
+    def test_partial_entry_ignored(self):
+        """
+        Tests that trailing bytes which don't make up a whole entry are
+        ignored, and that a `memoryview` can be read.
+        """
+        packet = get_single_packet() + bytearray(10)
+        _, _, _, entries = read_packet(memoryview(packet))
+
+        self.assertEqual(entries, [ResponseEntry(AF_INET, 1, 1)])
+
+    def test_round_trip(self):
+        """Tests that constructed packets are read back unchanged."""
+        table = RoutingTable(7, 0, 0, 0)
+        for i in range(1, 40):
+            table.add_route(i, RouteEntry(0, i % 16 + 1, 0, 0))
+
+        entries = []
+        for packet in construct_packets(table, 3):
+            command, version, sender_router_id, packet_entries = read_packet(
+                packet
+            )
+            self.assertEqual((command, version, sender_router_id), (2, 2, 7))
+            entries.extend(packet_entries)
+
+        self.assertEqual(
+            entries,
+            [ResponseEntry(AF_INET, i, i % 16 + 1) for i in range(1, 40)],
+        )
+
 
 class TestValidatePacket(TestCase):
     table: RoutingTable
@@ -289,5 +364,33 @@ class TestValidatePacket(TestCase):
         )
 
 
+class TestMergeFragments(TestCase):
+    def create_table(self, start: int, stop: int):
+        table = RoutingTable(1, 1, 1, 1)
+        for router_id in range(start, stop):
+            table.add_route(router_id, RouteEntry(1, 1, 1, 2))
+        return table
+
+    def test_merged_like_whole_table(self):
+        tables = [self.create_table(2, 20), self.create_table(20, 40)]
+        fragments = [
+            construct_fragment(table, 3, list(table.snapshot()))
+            for table in tables
+        ]
+        merged = merge_fragments(1, fragments)
+
+        whole = construct_packets(self.create_table(2, 40), 3)
+        self.assertEqual(merged, whole)
+        self.assertEqual(
+            [len(read_packet(packet).entries) for packet in merged], [25, 13]
+        )
+
+    def test_empty(self):
+        self.assertEqual(
+            merge_fragments(1, [b""]), [bytearray(b"\x02\x02\x00\x01")]
+        )
+        self.assertEqual(merge_fragments(1, [b""], empty=False), [])
+
+
 if __name__ == "__main__":
     main()
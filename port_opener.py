@@ -26,6 +26,10 @@
 #   needed, as we send routing info to the input port of
 #   the destination router
 #
+# Version 06:
+#   Sockets are non-blocking, so that input processing
+#   can drain each one until it is empty
+#
 #########################################################
 
 import socket
@@ -44,7 +48,9 @@ def port_opener(input_ports):
         for a_port in input_ports:
 
             new_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            # new_socket.setblocking(0)
+            # Non-blocking, so that the sockets can be drained until they're
+            # empty.
+            new_socket.setblocking(False)
             new_socket.bind(("localhost", a_port))
 
             logger("Opened socket / port, ", new_socket, "/", a_port)
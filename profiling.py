@@ -0,0 +1,229 @@
+import cProfile
+import os
+import pstats
+import signal
+import sys
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+from threading import Event, Lock, Thread, get_ident
+from types import FrameType
+from typing import Any, Callable, Dict, List, Optional
+
+import routerbase
+from routerbase import logger
+
+# Profiling modes
+CPROFILE = "cprofile"  # Traces every call, on every thread that runs jobs
+SAMPLE = "sample"  # Samples the stack of every thread, with little overhead
+MODES = (CPROFILE, SAMPLE)
+
+# The number of seconds between the samples of the sampling profiler.
+SAMPLE_INTERVAL = 0.005
+
+# The number of frames kept by each `tracemalloc` traceback.
+TRACEMALLOC_FRAMES = 16
+
+
+def _frame_name(frame: FrameType) -> str:
+    code = frame.f_code
+    filename = os.path.basename(code.co_filename)
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+class Sampler:
+    """
+    A sampling profiler. A background thread records the stack of every other
+    thread every `interval` seconds, so the profiled threads aren't slowed
+    down by tracing.
+
+    Instance variables:
+
+    samples -- The number of times each stack was seen, keyed by its frames
+    from the outermost inwards, separated by semicolons.
+    """
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stopped = Event()
+        self._thread: Optional[Thread] = None
+
+    def start(self) -> None:
+        self._stopped.clear()
+        self._thread = Thread(target=self._run, name="Sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        ident = get_ident()
+        while not self._stopped.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == ident:
+                    continue
+                stack: List[str] = []
+                current: Optional[FrameType] = frame
+                while current is not None:
+                    stack.append(_frame_name(current))
+                    current = current.f_back
+                self.samples[";".join(reversed(stack))] += 1
+
+    def dump(self, filename: str) -> None:
+        """
+        Writes the samples in the collapsed stack format, which flame graph
+        tools read.
+        """
+        with open(filename, "w") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class Profiler:
+    """
+    Profiles a running router on demand, and writes each profile to its own
+    timestamped file, so that profiles can be compared.
+
+    In `CPROFILE` mode, the thread which starts the profiler is traced, along
+    with the jobs which the `pool` runs on its worker threads. The profile is
+    written in the `pstats` format. In `SAMPLE` mode, every thread is sampled
+    instead, and the profile is written as collapsed stacks.
+
+    If `memory` is set, a `tracemalloc` snapshot is also written when the
+    profiler stops, which can be loaded with `tracemalloc.Snapshot.load`.
+    Tracing is only stopped if the profiler started it.
+
+    Instance variables:
+
+    name -- Identifies the router in the filenames.
+
+    directory -- Where the files are written.
+
+    files -- The files which have been written.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        mode: str = CPROFILE,
+        memory: bool = False,
+        directory: str = ".",
+    ):
+        if mode not in MODES:
+            raise ValueError(f"Unknown profiling mode {mode}")
+        self.name = name
+        self.mode = mode
+        self.memory = memory
+        self.directory = directory
+        self.files: List[str] = []
+        self._profile: Optional[cProfile.Profile] = None
+        self._sampler: Optional[Sampler] = None
+        self._owner: Optional[int] = None
+        self._workers: Dict[int, cProfile.Profile] = {}
+        self._lock = Lock()
+        self._count = 0
+        self._tracing = False
+
+    @property
+    def running(self) -> bool:
+        return self._profile is not None or self._sampler is not None
+
+    def start(self) -> None:
+        """Starts profiling, unless the profiler is already running."""
+        if self.running:
+            return
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            self._tracing = True
+
+        if self.mode == SAMPLE:
+            self._sampler = Sampler()
+            self._sampler.start()
+        else:
+            self._owner = get_ident()
+            self._workers = {}
+            routerbase.pool.wrapper = self._run_job
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        logger("Profiling started.")
+
+    def _run_job(self, fn: Callable[..., Any], *args: Any, **kwargs: Any):
+        """Runs a pool job, profiling it if it's on a worker thread."""
+        ident = get_ident()
+        if ident == self._owner or self._profile is None:
+            return fn(*args, **kwargs)
+        with self._lock:
+            profile = self._workers.get(ident)
+            if profile is None:
+                profile = self._workers[ident] = cProfile.Profile()
+        return profile.runcall(fn, *args, **kwargs)
+
+    def stop(self) -> List[str]:
+        """
+        Stops profiling, and writes the profile.
+
+        Returns the files which were written.
+        """
+        if not self.running:
+            return []
+        # The count keeps the names of profiles written in the same second
+        # apart.
+        self._count += 1
+        timestamp = datetime.now().strftime("%Y%m%dT%H%M%S")
+        prefix = os.path.join(
+            self.directory, f"{self.name}-{timestamp}-{self._count}"
+        )
+        written: List[str] = []
+
+        if self._sampler is not None:
+            self._sampler.stop()
+            self._sampler.dump(prefix + ".folded")
+            written.append(prefix + ".folded")
+            self._sampler = None
+        if self._profile is not None:
+            self._profile.disable()
+            routerbase.pool.wrapper = None
+            stats = pstats.Stats(self._profile)
+            with self._lock:
+                for profile in self._workers.values():
+                    stats.add(profile)
+                self._workers = {}
+            stats.dump_stats(prefix + ".prof")
+            written.append(prefix + ".prof")
+            self._profile = None
+
+        if self.memory and tracemalloc.is_tracing():
+            tracemalloc.take_snapshot().dump(prefix + ".snapshot")
+            written.append(prefix + ".snapshot")
+        if self._tracing:
+            # Tracing which was started by someone else is left running.
+            tracemalloc.stop()
+            self._tracing = False
+
+        self.files.extend(written)
+        logger("Profiling stopped, and written to ", ", ".join(written))
+        return written
+
+    def toggle(self) -> None:
+        """Starts the profiler if it's stopped, or stops it if it's running."""
+        if self.running:
+            self.stop()
+        else:
+            self.start()
+
+    def install(self) -> bool:
+        """
+        Toggles the profiler whenever the process receives `SIGUSR1`. This
+        must be called from the main thread, which is also the thread the
+        signal handler runs on.
+
+        Returns `False` if the platform doesn't have `SIGUSR1`.
+        """
+        if not hasattr(signal, "SIGUSR1"):
+            return False
+        signal.signal(signal.SIGUSR1, lambda signum, frame: self.toggle())
+        return True
@@ -0,0 +1,131 @@
+import os
+import pstats
+import signal
+import tempfile
+import time
+import tracemalloc
+from unittest import TestCase, main, skipUnless
+from unittest.mock import patch
+
+import routerbase
+from profiling import SAMPLE, Profiler
+from router import get_params, start_profiler
+
+
+def busy_job():
+    return sum(i * i for i in range(20000))
+
+
+@patch("profiling.logger")
+class TestProfiler(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def test_cprofile_includes_pool_jobs(self, logger):
+        profiler = Profiler("router-1", directory=self.directory)
+
+        profiler.start()
+        routerbase.pool.submit(busy_job).result()
+        files = profiler.stop()
+
+        self.assertIsNone(routerbase.pool.wrapper)
+        self.assertEqual(len(files), 1)
+        self.assertTrue(files[0].endswith(".prof"))
+        self.assertTrue(os.path.basename(files[0]).startswith("router-1-"))
+        profile = pstats.Stats(files[0]).get_stats_profile()
+        self.assertIn("busy_job", profile.func_profiles)
+
+    def test_sample(self, logger):
+        profiler = Profiler("router-1", SAMPLE, directory=self.directory)
+
+        profiler.start()
+        end = time.monotonic() + 0.05
+        while time.monotonic() < end:
+            busy_job()
+        files = profiler.stop()
+
+        self.assertTrue(files[0].endswith(".folded"))
+        with open(files[0]) as f:
+            self.assertIn("busy_job", f.read())
+
+    def test_memory(self, logger):
+        profiler = Profiler("router-1", memory=True, directory=self.directory)
+
+        profiler.start()
+        self.assertTrue(tracemalloc.is_tracing())
+        files = profiler.stop()
+
+        self.assertFalse(tracemalloc.is_tracing())
+        self.assertTrue(files[1].endswith(".snapshot"))
+        tracemalloc.Snapshot.load(files[1])
+
+    def test_memory_tracing_started_elsewhere(self, logger):
+        tracemalloc.start()
+        self.addCleanup(tracemalloc.stop)
+        profiler = Profiler("router-1", memory=True, directory=self.directory)
+
+        profiler.start()
+        files = profiler.stop()
+
+        self.assertTrue(tracemalloc.is_tracing())
+        self.assertTrue(files[1].endswith(".snapshot"))
+
+    def test_profiles_in_the_same_second(self, logger):
+        profiler = Profiler("router-1", directory=self.directory)
+
+        with patch("profiling.datetime") as datetime:
+            datetime.now.return_value.strftime.return_value = "20190420T120000"
+            for _ in range(2):
+                profiler.start()
+                profiler.stop()
+
+        self.assertEqual(len(set(profiler.files)), 2)
+        self.assertEqual(len(os.listdir(self.directory)), 2)
+
+    def test_toggle(self, logger):
+        profiler = Profiler("router-1", directory=self.directory)
+
+        profiler.toggle()
+        self.assertTrue(profiler.running)
+        profiler.toggle()
+
+        self.assertFalse(profiler.running)
+        self.assertEqual(profiler.stop(), [])
+        self.assertEqual(len(profiler.files), 1)
+
+    @skipUnless(hasattr(signal, "SIGUSR1"), "SIGUSR1 isn't available")
+    def test_signal(self, logger):
+        previous = signal.getsignal(signal.SIGUSR1)
+        self.addCleanup(signal.signal, signal.SIGUSR1, previous)
+        profiler = Profiler("router-1", directory=self.directory)
+
+        self.assertTrue(profiler.install())
+        os.kill(os.getpid(), signal.SIGUSR1)
+        self.assertTrue(profiler.running)
+        os.kill(os.getpid(), signal.SIGUSR1)
+
+        self.assertFalse(profiler.running)
+        self.assertEqual(len(profiler.files), 1)
+
+    def test_unknown_mode(self, logger):
+        with self.assertRaises(ValueError):
+            Profiler("router-1", "perf")
+
+    def test_mixed_case_directory(self, logger):
+        if hasattr(signal, "SIGUSR1"):
+            previous = signal.getsignal(signal.SIGUSR1)
+            self.addCleanup(signal.signal, signal.SIGUSR1, previous)
+        argv = ["router.py", "config.txt", "Profile-Dir=/var/Prof"]
+        with patch("sys.argv", argv):
+            _, options = get_params()
+
+        profiler = start_profiler("router-1", options)
+
+        self.assertEqual(profiler.directory, "/var/Prof")
+        self.assertFalse(profiler.running)
+
+
+if __name__ == "__main__":
+    main()
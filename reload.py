@@ -0,0 +1,215 @@
+import signal
+from socket import socket
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import routerbase
+from output_processing import timeout_processing
+from packet import construct_cached_packets
+from port_closer import port_closer
+from port_opener import port_opener
+from routerbase import logger
+from routingtable import ConfigData, RoutingTable
+from sendengine import Output
+from topology import Config
+from validate_data import INFINITY
+
+
+class ConfigDiff(NamedTuple):
+    """
+    The differences between the running config and a reloaded one.
+
+    added_ports -- The input ports to open.
+
+    removed_ports -- The input ports to close.
+
+    added -- The new neighbours, in the form of
+    `{[key: router_id]: ConfigData}`.
+
+    removed -- The neighbours which are no longer in the config.
+
+    changed -- The neighbours whose port or cost has changed, with their new
+    `ConfigData`.
+
+    timers -- The new timers, or `None` if they haven't changed.
+    """
+
+    added_ports: List[int]
+    removed_ports: List[int]
+    added: Dict[int, ConfigData]
+    removed: List[int]
+    changed: Dict[int, ConfigData]
+    timers: Optional[List[int]]
+
+    def __bool__(self):
+        return any(
+            (
+                self.added_ports,
+                self.removed_ports,
+                self.added,
+                self.removed,
+                self.changed,
+                self.timers is not None,
+            )
+        )
+
+
+def diff_config(
+    table: RoutingTable, input_ports: List[int], config: Config
+) -> ConfigDiff:
+    """Compares the table's running config with a reloaded `config`."""
+    _, new_input_ports, output_ports, timers = config
+    neighbours = {
+        router_id: ConfigData(port, cost)
+        for port, cost, router_id in output_ports
+    }
+    current = table.config_table
+    running_timers = [table.update_delta, table.timeout_delta, table.gc_delta]
+    return ConfigDiff(
+        [port for port in new_input_ports if port not in input_ports],
+        [port for port in input_ports if port not in new_input_ports],
+        {
+            router_id: data
+            for router_id, data in neighbours.items()
+            if router_id not in current
+        },
+        [router_id for router_id in current if router_id not in neighbours],
+        {
+            router_id: data
+            for router_id, data in neighbours.items()
+            if router_id in current and current[router_id] != data
+        },
+        list(timers[:3]) if list(timers[:3]) != running_timers else None,
+    )
+
+
+def apply_config_diff(table: RoutingTable, diff: ConfigDiff, sock: Output):
+    """
+    Applies the changes to the neighbours to the routing table.
+
+    The routes through a removed neighbour become unreachable straight away.
+    The routes through a neighbour whose cost has changed have their metrics
+    adjusted by the difference. Either way, the changed routes are flagged,
+    so only they are sent in the triggered update. New neighbours are sent
+    the whole table, so they don't have to wait for the next regular update.
+    """
+    if diff.timers is not None:
+        table.update_delta, table.timeout_delta, table.gc_delta = diff.timers
+
+    snapshot = table.snapshot()
+    for neighbour in diff.removed:
+        del table.config_table[neighbour]
+        for router_id, entry in snapshot.items():
+            if entry.next_hop == neighbour and entry.gc_time is None:
+                timeout_processing(table, router_id, sock)
+
+    for neighbour, data in diff.changed.items():
+        old = table.config_table[neighbour]
+        table.add_config_data(neighbour, data.port, data.cost)
+        for router_id, entry in snapshot.items():
+            if entry.next_hop != neighbour or entry.gc_time is not None:
+                continue
+            entry.port = data.port
+            metric = min(entry.metric - old.cost + data.cost, INFINITY)
+            if metric == INFINITY:
+                timeout_processing(table, router_id, sock)
+            elif metric != entry.metric:
+                entry.metric = metric
+                table.flag_route(router_id)
+                table.mark_changed()
+                table.set_triggered_update_time()
+
+    packets: List[Tuple[int, bytearray]] = []
+    for neighbour, data in diff.added.items():
+        table.add_config_data(neighbour, data.port, data.cost)
+        for packet in construct_cached_packets(table, neighbour):
+            packets.append((data.port, packet))
+    if packets:
+        table.sender.send(sock, packets)
+
+
+class Reloader:
+    """
+    Reloads the router's config file on `SIGHUP`, without restarting it.
+
+    The signal only sets `pending`, and the config is reloaded by the daemon's
+    thread, between iterations of its loop, so the table is never changed
+    while a packet is being processed. Only the sockets of the input ports
+    which were added or removed are opened or closed.
+
+    Instance variables:
+
+    load -- Reads and validates the config file again. It raises a
+    `ValueError` if the config is invalid.
+
+    input_ports -- The input ports of the running config.
+
+    pending -- Whether a reload has been requested.
+    """
+
+    def __init__(
+        self,
+        table: RoutingTable,
+        load: Callable[[], Config],
+        input_ports: List[int],
+    ):
+        self.table = table
+        self.load = load
+        self.input_ports = list(input_ports)
+        self.pending = False
+
+    def request(self) -> None:
+        self.pending = True
+
+    def install(self) -> bool:
+        """
+        Requests a reload whenever the process receives `SIGHUP`.
+
+        Returns `False` if the platform doesn't have `SIGHUP`.
+        """
+        if not hasattr(signal, "SIGHUP"):
+            return False
+        signal.signal(signal.SIGHUP, lambda signum, frame: self.request())
+        return True
+
+    def reload(self, sockets: List[socket]) -> Optional[ConfigDiff]:
+        """
+        Reloads the config, and applies any changes. The sockets of removed
+        input ports are closed and removed from `sockets`, and the sockets of
+        new input ports are opened and added to it. If the new config is
+        invalid, or a new port couldn't be opened, nothing is changed.
+
+        Returns the changes, or `None` if the config wasn't reloaded.
+        """
+        self.pending = False
+        logger("Reloading the config file.")
+        try:
+            config = self.load()
+        except (OSError, ValueError) as ex:
+            logger(f"Couldn't reload the config: {ex}", level=routerbase.ERROR)
+            return None
+
+        router_id, input_ports, _, _ = config
+        if router_id != self.table.router_id:
+            logger(
+                "The router id can't be changed without a restart.",
+                level=routerbase.ERROR,
+            )
+            return None
+        if not input_ports:
+            logger("There must be an input port.", level=routerbase.ERROR)
+            return None
+
+        diff = diff_config(self.table, self.input_ports, config)
+        opened = port_opener(diff.added_ports) if diff.added_ports else []
+        if opened is None:
+            return None
+
+        removed = set(diff.removed_ports)
+        closed = [sock for sock in sockets if sock.getsockname()[1] in removed]
+        sockets[:] = [sock for sock in sockets if sock not in closed] + opened
+        self.input_ports = list(input_ports)
+        apply_config_diff(self.table, diff, sockets[0])
+        port_closer(closed)
+
+        logger("Reloaded the config: ", diff if diff else "no changes")
+        return diff
@@ -0,0 +1,168 @@
+import os
+from socket import socket
+from tempfile import TemporaryDirectory
+from unittest import TestCase, main
+from unittest.mock import Mock, patch
+
+from reload import Reloader, apply_config_diff, diff_config
+from routeentry import RouteEntry
+from router import create_table, load_config
+from routingtable import ConfigData
+from timers import clock
+from validate_data import INFINITY
+
+TIMERS = [5, 30, 20]
+# Timers whose scheduled updates are always after a triggered update.
+SLOW_TIMERS = [30, 180, 120]
+# The timers aren't in the ratio 1:6:4.
+INVALID_CONFIG = """router-id 1
+input-ports 5021
+output-ports 5012-1-2
+timers 5, 30, 30
+"""
+
+
+def create_socket(port: int) -> socket:
+    sock = Mock()
+    sock.getsockname.return_value = ("127.0.0.1", port)
+    return sock
+
+
+def create_router(timers=TIMERS):
+    table = create_table(1, [], [(5012, 1, 2), (5013, 3, 3)], timers)
+    table.add_route(2, RouteEntry(5012, 1, 30, 2))
+    table.add_route(3, RouteEntry(5013, 3, 30, 3))
+    table.add_route(4, RouteEntry(5012, 2, 30, 2))
+    table.add_route(5, RouteEntry(5013, 5, 30, 3))
+    table.take_flagged()
+    return table
+
+
+@patch("output_processing.logger")
+@patch("reload.logger")
+class TestReload(TestCase):
+    def setUp(self):
+        clock.tick()
+
+    def test_diff(self, *loggers):
+        table = create_router()
+        config = (1, [5021, 5031], [(5012, 1, 2), (5014, 2, 3), (5016, 1, 6)])
+
+        diff = diff_config(table, [5021, 5022], config + (TIMERS,))
+
+        self.assertEqual(diff.added_ports, [5031])
+        self.assertEqual(diff.removed_ports, [5022])
+        self.assertEqual(diff.added, {6: ConfigData(5016, 1)})
+        self.assertEqual(diff.removed, [])
+        self.assertEqual(diff.changed, {3: ConfigData(5014, 2)})
+        self.assertIsNone(diff.timers)
+
+    def test_unchanged(self, *loggers):
+        table = create_router()
+        config = (1, [5021], [(5012, 1, 2), (5013, 3, 3)], TIMERS)
+
+        self.assertFalse(diff_config(table, [5021], config))
+
+    def test_cost_change_adjusts_routes(self, *loggers):
+        # With `TIMERS`, the scheduled update can be due before the triggered
+        # update, which is then suppressed.
+        table = create_router(SLOW_TIMERS)
+        generation = table.generation
+        config = (1, [5021], [(5012, 4, 2), (5013, 3, 3)], SLOW_TIMERS)
+
+        apply_config_diff(table, diff_config(table, [5021], config), Mock())
+
+        self.assertEqual(table.config_table[2], ConfigData(5012, 4))
+        self.assertEqual(table[2].metric, 4)
+        self.assertEqual(table[4].metric, 5)
+        self.assertEqual(table[5].metric, 5)
+        self.assertEqual(sorted(table.flagged), [2, 4])
+        self.assertGreater(table.generation, generation)
+        self.assertIsNotNone(table.triggered_update_time)
+
+    def test_removed_neighbour(self, *loggers):
+        table = create_router()
+        config = (1, [5021], [(5012, 1, 2)], TIMERS)
+
+        apply_config_diff(table, diff_config(table, [5021], config), Mock())
+
+        self.assertNotIn(3, table.config_table)
+        self.assertEqual(table[3].metric, INFINITY)
+        self.assertEqual(table[5].metric, INFINITY)
+        self.assertIsNotNone(table[5].gc_time)
+        self.assertEqual(table[4].metric, 2)
+        self.assertEqual(sorted(table.flagged), [3, 5])
+
+    def test_added_neighbour_is_sent_the_table(self, *loggers):
+        table = create_router()
+        sock = Mock()
+        config = (1, [5021], [(5012, 1, 2), (5013, 3, 3), (5016, 1, 6)])
+
+        with patch.object(table.sender, "send") as send:
+            apply_config_diff(
+                table, diff_config(table, [5021], config + (TIMERS,)), sock
+            )
+
+        self.assertEqual(table.config_table[6], ConfigData(5016, 1))
+        (_, packets), _ = send.call_args
+        self.assertEqual([port for port, _ in packets], [5016])
+        self.assertEqual(table.flagged, set())
+
+    @patch("reload.port_closer")
+    @patch("reload.port_opener")
+    def test_reload_swaps_sockets(self, port_opener, port_closer, *loggers):
+        table = create_router()
+        old = [create_socket(5021), create_socket(5022)]
+        new = create_socket(5031)
+        port_opener.return_value = [new]
+        config = (1, [5022, 5031], [(5012, 1, 2), (5013, 3, 3)], TIMERS)
+        reloader = Reloader(table, lambda: config, [5021, 5022])
+        reloader.request()
+        sockets = list(old)
+
+        diff = reloader.reload(sockets)
+
+        self.assertFalse(reloader.pending)
+        self.assertIsNotNone(diff)
+        port_opener.assert_called_once_with([5031])
+        port_closer.assert_called_once_with([old[0]])
+        self.assertEqual(sockets, [old[1], new])
+        self.assertEqual(reloader.input_ports, [5022, 5031])
+
+    @patch("validate_data.logger")
+    @patch("reload.port_opener")
+    def test_invalid_config_is_ignored(
+        self, port_opener, validate_logger, *loggers
+    ):
+        table = create_router()
+        sockets = [create_socket(5021)]
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, "R1.cfg")
+            with open(path, "w") as f:
+                f.write(INVALID_CONFIG)
+            reloader = Reloader(
+                table, lambda: load_config(path, set()), [5021]
+            )
+
+            self.assertIsNone(reloader.reload(sockets))
+        # The error is only logged by `load_config`.
+        validate_logger.assert_called_once()
+
+        config = (7, [5021], [(5012, 1, 2)], TIMERS)
+        reloader = Reloader(table, lambda: config, [5021])
+        self.assertIsNone(reloader.reload(sockets))
+
+        port_opener.assert_not_called()
+        self.assertIn(3, table.config_table)
+
+    def test_unreadable_config_is_ignored(self, *loggers):
+        table = create_router()
+
+        def load():
+            raise FileNotFoundError("R1.cfg")
+
+        self.assertIsNone(Reloader(table, load, [5021]).reload([]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+from typing import Dict, List, Optional, Tuple
+
+
+class ResponseCache:
+    """
+    Contains the encoded Response packets last sent to each neighbour, along
+    with the routing table generation that they were encoded from. Cached
+    packets are only valid while the table is still at that generation.
+
+    Instance variables:
+
+    hits -- The number of lookups which returned cached packets.
+
+    misses -- The number of lookups which found no valid cached packets.
+    """
+
+    hits: int
+    misses: int
+
+    def __init__(self):
+        self._packets: Dict[int, Tuple[int, List[bytearray]]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        """Returns the number of neighbours with cached packets."""
+        return len(self._packets)
+
+    def __str__(self):
+        return (
+            f"{self.hits} hits, {self.misses} misses, "
+            f"{len(self)} neighbours cached"
+        )
+
+    def get(self, router_id: int, generation: int) -> Optional[List[bytearray]]:
+        """
+        Returns the cached packets for the neighbour `router_id`, if they were
+        encoded from the given table `generation`. Otherwise, returns `None`.
+        """
+        cached = self._packets.get(router_id)
+        if cached is not None and cached[0] == generation:
+            self.hits += 1
+            return cached[1]
+
+        self.misses += 1
+        return None
+
+    def put(
+        self, router_id: int, generation: int, packets: List[bytearray]
+    ) -> None:
+        """
+        Caches the packets encoded for the neighbour `router_id` from the given
+        table `generation`.
+        """
+        self._packets[router_id] = (generation, packets)
+
+    def clear(self) -> None:
+        """Removes every cached packet."""
+        self._packets.clear()
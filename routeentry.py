@@ -1,5 +1,75 @@
-from datetime import datetime, timedelta
-from typing import Optional, Union
+from typing import Optional, Protocol
+
+from timers import clock, seconds
+
+
+class Route(Protocol):
+    """
+    A route inside the routing table. It's implemented by `RouteEntry`, and by
+    the `StoredRoute` views of a `RouteStore`, whose fields are properties.
+    The fields are described by `RouteEntry`.
+    """
+
+    @property
+    def flag(self) -> bool:
+        ...
+
+    @flag.setter
+    def flag(self, value: bool) -> None:
+        ...
+
+    @property
+    def port(self) -> int:
+        ...
+
+    @port.setter
+    def port(self, value: int) -> None:
+        ...
+
+    @property
+    def metric(self) -> int:
+        ...
+
+    @metric.setter
+    def metric(self, value: int) -> None:
+        ...
+
+    @property
+    def next_hop(self) -> int:
+        ...
+
+    @next_hop.setter
+    def next_hop(self, value: int) -> None:
+        ...
+
+    @property
+    def timeout_time(self) -> int:
+        ...
+
+    @timeout_time.setter
+    def timeout_time(self, value: int) -> None:
+        ...
+
+    @property
+    def gc_time(self) -> Optional[int]:
+        ...
+
+    @gc_time.setter
+    def gc_time(self, value: Optional[int]) -> None:
+        ...
+
+    def shallow_copy(self) -> "RouteEntry":
+        ...
+
+    def update_timeout_time(
+        self, timeout_time: int, initial_time_arg: Optional[int] = None
+    ) -> int:
+        ...
+
+    def set_garbage_collection_time(
+        self, gc_delta: int, initial_time_arg: Optional[int] = None
+    ) -> int:
+        ...
 
 
 class RouteEntry:
@@ -18,47 +88,61 @@ class RouteEntry:
     learned from. `-1` if the router wasn't learned from anyone (i.e. learned
     from the config file on startup).
 
-    timeout_time -- The delta for the time at which the timeout occurs, and the
-    deletion process for this `RouteEntry` starts. This is not stored.
+    timeout_time -- The time at which the timeout occurs, and the deletion
+    process for this `RouteEntry` starts. It's given to the constructor as a
+    number of seconds from now.
 
     gc_time --- The time after which this `RouteEntry` should be deleted from
     `RoutingTable`.
+
+    Both times are `time.monotonic_ns()` timestamps.
     """
 
-    flag = False
+    __slots__ = (
+        "flag",
+        "port",
+        "metric",
+        "next_hop",
+        "timeout_time",
+        "gc_time",
+    )
+
+    flag: bool
     port: int
     metric: int
     next_hop: int
 
-    timeout_time: datetime
-    gc_time: Optional[datetime] = None
+    timeout_time: int
+    gc_time: Optional[int]
 
     def __init__(
         self,
         port: int,
         metric: int,
-        timeout_time: Union[int, datetime],
+        timeout_time: int,
         next_hop=-1,
+        initial_time_arg: Optional[int] = None,
     ):
+        self.flag = False
         self.port = port
         self.metric = metric
-        if isinstance(timeout_time, int):
-            self.timeout_time = datetime.now() + timedelta(seconds=timeout_time)
-        else:
-            self.timeout_time = timeout_time
+        initial_time = (
+            initial_time_arg if initial_time_arg is not None else clock.now()
+        )
+        self.timeout_time = initial_time + seconds(timeout_time)
         self.next_hop = next_hop
+        self.gc_time = None
 
-    def shallow_copy(self):
-        copy = RouteEntry(
-            self.port, self.metric, self.timeout_time, self.next_hop
-        )
+    def shallow_copy(self) -> "RouteEntry":
+        copy = RouteEntry(self.port, self.metric, 0, self.next_hop)
+        copy.timeout_time = self.timeout_time
         copy.flag = self.flag
         copy.gc_time = self.gc_time
         return copy
 
     def update_timeout_time(
-        self, timeout_time: int, initial_time_arg: Optional[datetime] = None
-    ) -> datetime:
+        self, timeout_time: int, initial_time_arg: Optional[int] = None
+    ) -> int:
         """
         Updates the timeout time, at which point this `RouteEntry` enter the
         deletion process.
@@ -71,18 +155,18 @@ class RouteEntry:
         timeout_time -- The delta for between the `initial_time` and the new
         `timeout_time`.
 
-        initial_time -- The initial time, defaults to `datetime.now()`
+        initial_time -- The initial time, defaults to `clock.now()`
         """
         initial_time = (
-            initial_time_arg if initial_time_arg is not None else datetime.now()
+            initial_time_arg if initial_time_arg is not None else clock.now()
         )
-        self.timeout_time = initial_time + timedelta(seconds=timeout_time)
+        self.timeout_time = initial_time + seconds(timeout_time)
         self.gc_time = None
         return initial_time
 
     def set_garbage_collection_time(
-        self, gc_delta: int, initial_time_arg: Optional[datetime] = None
-    ) -> datetime:
+        self, gc_delta: int, initial_time_arg: Optional[int] = None
+    ) -> int:
         """
         Updates the garbage collection time, at which point this `RouteEntry`
         will be removed from the table.
@@ -94,10 +178,10 @@ class RouteEntry:
         `gc_time`.
 
         initial_time -- The initial time, as specified. Defaults to
-        `datetime.now()`
+        `clock.now()`
         """
         initial_time = (
-            initial_time_arg if initial_time_arg is not None else datetime.now()
+            initial_time_arg if initial_time_arg is not None else clock.now()
         )
-        self.gc_time = initial_time + timedelta(seconds=gc_delta)
+        self.gc_time = initial_time + seconds(gc_delta)
         return initial_time
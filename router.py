@@ -1,28 +1,89 @@
+import asyncio
 import sys
-from datetime import datetime
-from socket import socket
-from typing import List, Tuple
+from socket import SO_RCVBUF, SOL_SOCKET, socket
+from typing import List, Optional, Set, Tuple, cast
 
 import routerbase
-from input_processing import input_processing
-from output_processing import deletion_process, send_response, send_responses
-from packet import construct_packets
+from asyncrouter import async_daemon, open_endpoints
+from input_processing import SocketSelector, input_processing
+from metrics import WRITE_INTERVAL, Exporter, create_exporters
+from output_processing import deletion_process, update_processing
+from packet import construct_cached_packets
 from poc_parser_v03 import read_config
 from port_closer import port_closer
 from port_opener import port_opener
+from profiling import CPROFILE, Profiler
+from reload import Reloader
+from routestore import ARRAY_STORE, DICT_STORE, STORES, RouteStore
+from routerhost import RouterHost, load_configs
 from routingtable import RoutingTable
+from sharding import ShardError, run_sharded
+from sendengine import Output
+from snapshot import SNAPSHOT_INTERVAL, SnapshotWriter
+from tablerenderer import ALWAYS, TableRenderer
+from timers import clock
+from topology import (
+    TOPOLOGY_EXTENSION,
+    Config,
+    TopologyError,
+    find_router,
+    read_topology,
+    single_socket,
+)
 from validate_data import validate_data
 
 
-def daemon(table: RoutingTable, sockets: List[socket], output_sock: socket):
-    """Main body of the router."""
-    while True:
-        while table.sched_update_time > datetime.now():
-            input_processing(table, sockets)
-            deletion_process(table, output_sock)
+# I/O backends of the `select` based daemon
+SELECTORS_IO = "selectors"
+SELECT_IO = "select"
+
+# The receive buffer of the socket in single socket mode, which every
+# neighbour's updates arrive at.
+SINGLE_SOCKET_RCVBUF = 4 * 1024 * 1024
+
+
+def daemon(
+    table: RoutingTable,
+    sockets: List[socket],
+    output_sock: socket,
+    reloader: Optional[Reloader] = None,
+    selector: Optional[SocketSelector] = None,
+    snapshots: Optional[SnapshotWriter] = None,
+):
+    """
+    Main body of the router. It blocks waiting for packets until the next
+    timer is due, and then processes only the timers which are due.
+
+    This thread is the only one which changes the table. Other threads submit
+    their changes to `table.actor`, which are applied here.
+
+    Keyword arguments:
+
+    reloader -- Reloads the config file when it's asked to, between
+    iterations. The first socket is the output socket again afterwards.
 
-        send_responses(table, output_sock)
-        table.update_sched_update_time()
+    selector -- Waits for packets on the sockets, instead of `select`.
+
+    snapshots -- Saves the table to a file when a snapshot is due.
+    """
+    clock.tick()
+    while True:
+        # `input_processing` reads the clock once it stops waiting, and that
+        # time is shared by everything else in this iteration.
+        timeout = table.timers.wait_time(clock.now())
+        input_processing(table, sockets, timeout, selector)
+        # Applies the changes deferred while processing the packets.
+        table.actor.drain()
+        deletion_process(table, output_sock)
+        update_processing(table, output_sock)
+        if snapshots is not None:
+            snapshots.process(table)
+        table.metrics.loop_latency.observe(clock.elapsed())
+        if reloader is not None and reloader.pending:
+            reloader.reload(sockets)
+            output_sock = sockets[0]
+            if selector is not None:
+                selector.update(sockets)
 
 
 def create_table(
@@ -30,13 +91,26 @@ def create_table(
     sockets: List[socket],
     output_ports: List[Tuple[int, int, int]],
     timers: List[int],
+    store: str = DICT_STORE,
 ):
     """
     Creates the routing table, and saves the information from the config file,
     so that it can be easily be accessed later from a single place.
+
+    Keyword arguments:
+
+    store -- How the routes are stored. One of `dict` or `array`.
     """
+    if store not in STORES:
+        raise ValueError(f"Unknown route store {store}")
     update_time, timeout_time, gc_time, *extra = timers
-    table = RoutingTable(router_id, update_time, timeout_time, gc_time)
+    table = RoutingTable(
+        router_id,
+        update_time,
+        timeout_time,
+        gc_time,
+        RouteStore() if store == ARRAY_STORE else None,
+    )
 
     for port, cost, neighbour_router_id in output_ports:
         table.add_config_data(neighbour_router_id, port, cost)
@@ -44,37 +118,297 @@ def create_table(
     return table
 
 
-def startup(table: RoutingTable, output_sock: socket):
+def startup(table: RoutingTable, output_sock: Output):
     """Upon startup, it immediately sends out packets to neighbours."""
     routerbase.logger("Starting up...")
+    packets: List[Tuple[int, bytearray]] = []
     for router_id in table.config_table:
-        packets = construct_packets(table, router_id)
-        for packet in packets:
-            port = table.config_table[router_id].port
-            send_response(output_sock, port, packet)
+        port = table.config_table[router_id].port
+        for packet in construct_cached_packets(table, router_id):
+            packets.append((port, packet))
+    table.sender.send(output_sock, packets)
+
+
+async def run_async(table: RoutingTable, sockets: List[socket]):
+    """Runs the router on an asyncio event loop."""
+    transports, timers = await open_endpoints(table, sockets)
+    startup(table, transports[0])
+    await async_daemon(table, timers)
+
+
+async def run_host(host: RouterHost):
+    """Runs every router in the host on a single asyncio event loop."""
+    await host.open()
+    for router in host.routers:
+        startup(router.table, router.output)
+    await host.serve()
+
+
+def create_host(path: str, options: Set[str]) -> RouterHost:
+    """
+    Creates a host for the routers in the config files given by `path`, which
+    is either a directory or a comma separated list of filenames. Routers
+    whose `router_id` or input ports clash with an earlier one are skipped.
+    """
+    store = get_option(options, "store")
+    host = RouterHost()
+    for router_id, input_ports, output_ports, timers in load_configs(path):
+        table = create_table(
+            router_id,
+            [],
+            output_ports,
+            timers,
+            store if store is not None else DICT_STORE,
+        )
+        table.renderer = create_renderer(options)
+        try:
+            host.add(table, input_ports)
+        except ValueError as ex:
+            routerbase.logger(
+                f"Skipped router {router_id}: {ex}", level=routerbase.WARNING
+            )
+    return host
+
+
+def get_params() -> Tuple[str, Set[str]]:
+    """
+    Gets the filename and options from the command line arguments. The names
+    of the options aren't case sensitive, but their values are.
+
+    The options follow the filename, and are any of:
+
+    debug -- Enables debug logging.
+
+    async -- Runs the router on an asyncio event loop.
+
+    host -- Runs every router in the config files given instead of the
+    filename, in a single process. This is either a directory, a comma
+    separated list of filenames, or a topology file. Packets between these
+    routers are passed in memory.
+
+    router=<id> -- The router to run, when the filename is a topology file.
+
+    io=<backend> -- How the daemon waits for packets. One of `selectors` (the
+    default), which uses `epoll` where it's available, or `select`.
+
+    single-socket -- Binds only the first input port, and receives the
+    packets of every neighbour on it. The neighbours must all send to that
+    port, as in a topology converted with `single-socket`.
+
+    print=<mode> -- How the routing table is printed. One of `always` (the
+    default), `change` or `diff`.
+
+    print-interval=<seconds> -- The minimum time between printing the routing
+    table.
+
+    log-level=<level> -- The minimum level of the messages which are logged.
+    One of `debug`, `info` (the default), `warning` or `error`.
+
+    log-json -- Logs each message as a JSON object on its own line.
+
+    log-async -- Writes the log from a background thread.
+
+    store=<kind> -- How the routes are stored. One of `dict` (the default) or
+    `array`, which takes far less memory for large tables.
+
+    sendmmsg -- Sends each cycle's packets with a single `sendmmsg` call, where
+    the platform supports it.
 
+    metrics-file=<filename> -- Periodically writes the metrics to the file, in
+    the Prometheus text format.
 
-def get_params():
-    """Gets the filename and logging level from the command line arguments."""
+    metrics-interval=<seconds> -- The time between writes of the metrics
+    file. Defaults to 15 seconds.
+
+    metrics-port=<port> -- Serves the metrics at `/metrics` over HTTP, on the
+    loopback interface.
+
+    profile -- Profiles the router from startup. Whether or not this is given,
+    the profiler is started and stopped by sending the process `SIGUSR1`, and
+    each profile is written to its own timestamped file.
+
+    profile-mode=<mode> -- One of `cprofile` (the default), or `sample`,
+    which samples every thread's stack with far less overhead.
+
+    profile-memory -- Also writes a `tracemalloc` snapshot with each profile.
+
+    profile-dir=<directory> -- Where the profiles are written. Defaults to the
+    current directory.
+
+    shards=<n> -- Spreads the routes across `n` worker processes, by their
+    destination router id, so that a large routing table is processed on more
+    than one core. The config isn't reloaded, and the table isn't printed, in
+    this mode.
+
+    snapshot=<filename> -- Restores the routing table from the file on
+    startup, keeping the routes whose timeouts haven't expired, and saves the
+    table to it periodically and on shutdown. Not supported with `host` or
+    `shards`, where it's ignored with a warning.
+
+    snapshot-interval=<seconds> -- The time between periodic snapshots.
+    Defaults to 30 seconds. Only the `select` based daemon saves periodic
+    snapshots. The `async` mode only saves one on shutdown.
+
+    Sending the process `SIGHUP` reloads its config file. Only the changes are
+    applied, so the routes which are unaffected are kept. This isn't
+    supported by the `async` or `host` modes.
+    """
     if len(sys.argv) < 2:
         raise IndexError
     filename = sys.argv[1]
-    is_debug = False
-    if len(sys.argv) >= 3 and sys.argv[2].lower() == "debug":
-        is_debug = True
-    return filename, is_debug
+    options = {normalise_option(arg) for arg in sys.argv[2:]}
+    return filename, options
+
+
+def normalise_option(arg: str) -> str:
+    """
+    Lowercases the name of a command line option. The value of a
+    `name=value` option is kept as it was given, as it may be a filename.
+    """
+    name, equals, value = arg.partition("=")
+    return name.lower() + equals + value
+
+
+def get_option(options: Set[str], name: str) -> Optional[str]:
+    """Returns the value of the `name=value` option, if it was given."""
+    prefix = name + "="
+    for option in options:
+        if option.startswith(prefix):
+            return option[len(prefix) :]
+    return None
+
+
+def create_renderer(options: Set[str]) -> TableRenderer:
+    """Creates the routing table's renderer from the command line options."""
+    mode = get_option(options, "print")
+    interval = get_option(options, "print-interval")
+    return TableRenderer(
+        mode if mode is not None else ALWAYS,
+        float(interval) if interval is not None else 0.0,
+    )
+
+
+def configure_logging(options: Set[str]):
+    """Configures the logger from the command line options."""
+    levels = {
+        name.lower(): level for level, name in routerbase.LEVEL_NAMES.items()
+    }
+    level_name = get_option(options, "log-level")
+    if level_name is not None and level_name not in levels:
+        raise ValueError(f"Unknown log level {level_name}")
+
+    level = levels[level_name] if level_name is not None else None
+    routerbase.DEBUG_MODE = "debug" in options or level == routerbase.DEBUG
+    routerbase.configure_logging(
+        level=level,
+        json_lines="log-json" in options,
+        background="log-async" in options,
+    )
+
+
+def load_config(filename: str, options: Set[str]) -> Config:
+    """
+    Reads and validates the router's config file. If the file is a topology
+    file, the router given by the `router=<id>` option is read from it
+    instead. With the `single-socket` option, only the first input port is
+    kept.
+
+    Raises a `ValueError` if the config is invalid.
+    """
+    if not filename.endswith(TOPOLOGY_EXTENSION):
+        fields = read_config(filename)
+        if not validate_data(*fields):
+            raise ValueError(f"{filename} is invalid")
+        # None of the fields of a valid config are `None`.
+        config = cast(Config, fields)
+    else:
+        router_id = get_option(options, "router")
+        if router_id is None:
+            raise ValueError("A router must be chosen from the topology")
+        config = find_router(read_topology(filename), int(router_id))
+    if "single-socket" in options:
+        return single_socket(config)
+    return config
+
+
+def start_metrics(options: Set[str]) -> List[Exporter]:
+    """Starts the metrics exporters given by the command line options."""
+    port = get_option(options, "metrics-port")
+    interval = get_option(options, "metrics-interval")
+    return create_exporters(
+        get_option(options, "metrics-file"),
+        int(port) if port is not None else None,
+        float(interval) if interval is not None else WRITE_INTERVAL,
+    )
+
+
+def start_profiler(name: str, options: Set[str]) -> Profiler:
+    """
+    Creates the profiler from the command line options, and starts it when
+    `SIGUSR1` is received, or straight away if `profile` was given.
+    """
+    mode = get_option(options, "profile-mode")
+    directory = get_option(options, "profile-dir")
+    profiler = Profiler(
+        name,
+        mode if mode is not None else CPROFILE,
+        "profile-memory" in options,
+        directory if directory is not None else ".",
+    )
+    profiler.install()
+    if "profile" in options:
+        profiler.start()
+    return profiler
+
+
+def create_snapshot_writer(options: Set[str]) -> Optional[SnapshotWriter]:
+    """
+    Creates the snapshot writer, if a snapshot file was given. The `host` and
+    `shards` modes don't support snapshots, so a warning is logged instead.
+    """
+    path = get_option(options, "snapshot")
+    if path is None:
+        return None
+    # The routes of a sharded router are held by its workers.
+    for mode in ("host", "shards"):
+        if mode in options or get_option(options, mode) is not None:
+            routerbase.logger(
+                f"Snapshots aren't supported with {mode}, so the snapshot "
+                f"{path} is ignored.",
+                level=routerbase.WARNING,
+            )
+            return None
+    interval = get_option(options, "snapshot-interval")
+    return SnapshotWriter(
+        path, float(interval) if interval is not None else SNAPSHOT_INTERVAL
+    )
 
 
 def main():
     sockets: List[socket] = []
+    exporters: List[Exporter] = []
+    profiler: Optional[Profiler] = None
+    table: Optional[RoutingTable] = None
+    snapshots: Optional[SnapshotWriter] = None
     try:
-        filename, is_debug = get_params()
-        routerbase.DEBUG_MODE = is_debug
+        filename, options = get_params()
+        configure_logging(options)
+        exporters = start_metrics(options)
+        snapshots = create_snapshot_writer(options)
 
-        (router_id, input_ports, output_ports, timers) = read_config(filename)
-        if not validate_data(router_id, input_ports, output_ports, timers):
+        if "host" in options:
+            host = create_host(filename, options)
+            if len(host.routers) == 0:
+                routerbase.logger("No routers were loaded.")
+                return
+            profiler = start_profiler("host", options)
+            asyncio.run(run_host(host))
             return
 
+        (router_id, input_ports, output_ports, timers) = load_config(
+            filename, options
+        )
+
         result = port_opener(input_ports)
 
         if result is None:
@@ -88,26 +422,78 @@ def main():
 
         # first open socket is chosen to be the output socket
         output_sock: socket = sockets[0]
+        if "single-socket" in options:
+            # The kernel caps this at its own maximum.
+            output_sock.setsockopt(SOL_SOCKET, SO_RCVBUF, SINGLE_SOCKET_RCVBUF)
+
+        store = get_option(options, "store")
+        table = create_table(
+            router_id,
+            sockets,
+            output_ports,
+            timers,
+            store if store is not None else DICT_STORE,
+        )
+        table.renderer = create_renderer(options)
+        table.sender.use_sendmmsg = "sendmmsg" in options
+        profiler = start_profiler(f"router-{router_id}", options)
+        shards = get_option(options, "shards")
+        if snapshots is not None:
+            snapshots.restore(table)
+        if "async" in options:
+            asyncio.run(run_async(table, sockets))
+            return
+        if shards is not None:
+            run_sharded(
+                table,
+                sockets,
+                int(shards),
+                (router_id, input_ports, output_ports, timers),
+                store if store is not None else DICT_STORE,
+            )
+            return
 
-        table = create_table(router_id, sockets, output_ports, timers)
+        # Reloading is only done by the `select` based daemon, which owns its
+        # sockets.
+        reloader = Reloader(
+            table, lambda: load_config(filename, options), input_ports
+        )
+        reloader.install()
+        io = get_option(options, "io")
+        if io not in (None, SELECTORS_IO, SELECT_IO):
+            raise ValueError(f"Unknown I/O backend {io}")
+        selector = SocketSelector(sockets) if io != SELECT_IO else None
         startup(table, output_sock)
-        daemon(table, sockets, output_sock)
+        daemon(table, sockets, output_sock, reloader, selector, snapshots)
 
     except IndexError:
-        routerbase.logger("Please give a filename. Correct")
+        routerbase.logger(
+            "Please give a filename. Correct", level=routerbase.ERROR
+        )
     except FileNotFoundError:
-        routerbase.logger("Please give a valid filename")
+        routerbase.logger(
+            "Please give a valid filename", level=routerbase.ERROR
+        )
     except KeyboardInterrupt:
         routerbase.logger("\nKeyboard interrupt detected.")
+    except (TopologyError, ShardError) as ex:
+        routerbase.logger(ex, level=routerbase.ERROR)
     except ValueError:
-        routerbase.logger("Invalid configuration file.")
+        routerbase.logger("Invalid configuration file.", level=routerbase.ERROR)
     except Exception as ex:
-        routerbase.logger("Something bad happened.")
+        routerbase.logger("Something bad happened.", level=routerbase.ERROR)
         routerbase.logger(ex, is_debug=True)
     finally:
         routerbase.logger("Router shutting down.")
+        if profiler is not None:
+            profiler.stop()
+        if snapshots is not None and table is not None:
+            snapshots.save(table)
+        for exporter in exporters:
+            exporter.close()
         port_closer(sockets)
         routerbase.logger("Bye!")
+        routerbase.shutdown_logging()
 
 
 if __name__ == "__main__":
@@ -1,20 +1,206 @@
-from concurrent.futures import ThreadPoolExecutor
+import json
+import sys
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
-from typing import Any
+from queue import SimpleQueue
+from threading import Thread
+from typing import Any, Callable, List, Optional, TextIO
 
 DEBUG_MODE = False
 
-pool = ThreadPoolExecutor()
+# Logging levels
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+LEVEL_NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR"}
 
+# The minimum level of the messages which are logged. Debug messages are
+# logged whenever `DEBUG_MODE` is set, regardless of this.
+LOG_LEVEL = INFO
+
+# Writes each message as a JSON object on its own line, instead of as text.
+JSON_LINES = False
+
+
+class WorkerPool:
+    """
+    Runs background jobs for the router.
+
+    Jobs are run on a thread pool, unless `inline` is set, in which case they
+    are run immediately on the calling thread. The asyncio daemon sets
+    `inline`, so that every job runs on the event loop's thread.
+
+    If `wrapper` is set, jobs on the thread pool are run as
+    `wrapper(fn, *args, **kwargs)` instead, such as to profile them.
+    """
+
+    inline = False
+    wrapper: Optional[Callable[..., Any]] = None
+
+    def __init__(self):
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def submit(self, fn: Callable[..., Any], *args: Any, **kwargs: Any):
+        """Schedules `fn(*args, **kwargs)`, and returns its `Future`."""
+        if not self.inline:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor()
+            if self.wrapper is not None:
+                return self._executor.submit(self.wrapper, fn, *args, **kwargs)
+            return self._executor.submit(fn, *args, **kwargs)
+
+        future: Future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as ex:
+            future.set_exception(ex)
+        return future
+
+
+pool = WorkerPool()
+
+
+class Lazy:
+    """
+    A logger argument whose value is only computed if the message is
+    actually logged, such as `Lazy(list, table.neighbours())`.
+    """
+
+    __slots__ = ("fn", "args")
+
+    def __init__(self, fn: Callable[..., Any], *args: Any):
+        self.fn = fn
+        self.args = args
+
+    def __str__(self):
+        return str(self.fn(*self.args))
+
+
+class LogSink:
+    """
+    Writes log messages to a stream from a background thread, so that the
+    router never blocks on output. Messages which are queued together are
+    written with a single call.
+    """
+
+    def __init__(self, stream: TextIO):
+        self.stream = stream
+        self._queue: SimpleQueue = SimpleQueue()
+        self._thread = Thread(target=self._run, name="LogSink", daemon=True)
+        self._thread.start()
+
+    def write(self, line: str) -> None:
+        """Queues a line to be written."""
+        self._queue.put(line)
+
+    def _run(self) -> None:
+        while True:
+            line: Optional[str] = self._queue.get()
+            lines: List[str] = []
+            while line is not None:
+                lines.append(line)
+                if self._queue.empty():
+                    break
+                line = self._queue.get()
+
+            if lines:
+                self.stream.write("".join(lines))
+                self.stream.flush()
+            if line is None:
+                return
+
+    def close(self) -> None:
+        """Writes every queued line, and stops the background thread."""
+        self._queue.put(None)
+        self._thread.join()
+
+
+_sink: Optional[LogSink] = None
+
+
+def configure_logging(
+    level: Optional[int] = None,
+    json_lines: Optional[bool] = None,
+    background: bool = False,
+    stream: Optional[TextIO] = None,
+) -> None:
+    """
+    Configures the logger.
+
+    Keyword arguments:
+
+    level -- The minimum level of the messages which are logged.
+
+    json_lines -- Writes each message as a JSON object on its own line.
+
+    background -- Writes messages from a background thread.
+
+    stream -- The stream the background thread writes to. Defaults to
+    `sys.stdout`.
+    """
+    global LOG_LEVEL, JSON_LINES, _sink
+    if level is not None:
+        LOG_LEVEL = level
+    if json_lines is not None:
+        JSON_LINES = json_lines
+    if background and _sink is None:
+        _sink = LogSink(stream if stream is not None else sys.stdout)
+
+
+def shutdown_logging() -> None:
+    """Writes every queued message, and stops the background thread."""
+    global _sink
+    if _sink is not None:
+        _sink.close()
+        _sink = None
+
+
+def is_enabled(level: int) -> bool:
+    """Checks to see if messages of the given level are logged."""
+    if level == DEBUG:
+        return DEBUG_MODE
+    return level >= LOG_LEVEL
+
+
+def _format(level: int, output: str) -> str:
+    if JSON_LINES:
+        record = {
+            "time": datetime.now().isoformat(),
+            "level": LEVEL_NAMES.get(level, str(level)),
+            "message": output,
+        }
+        return json.dumps(record)
+    if level == DEBUG:
+        return f"{datetime.now()} [DEBUG] {output}"
+    return output
+
+
+def logger(*output_args: Any, is_debug=False, level: Optional[int] = None):
+    """
+    Custom logging solution.
+
+    The arguments are only converted to strings and concatenated if the
+    message is logged, so passing values as separate arguments (or wrapped in
+    `Lazy`) instead of formatting them first costs nothing when the level is
+    disabled.
+
+    Keyword arguments:
+
+    is_debug -- Logs the message at the `DEBUG` level.
+
+    level -- The level of the message. Defaults to `INFO`.
+    """
+    if level is None:
+        level = DEBUG if is_debug else INFO
+    if not is_enabled(level):
+        return
 
-def logger(*output_args: Any, is_debug=False):
-    """Custom logging solution."""
     # `*output_args` collects all the arguments to this function
     # which are not keyword arguments.
-    output = ""
-    for arg in output_args:
-        output += str(arg)
-    if is_debug and DEBUG_MODE:
-        print(f"{datetime.now()} [DEBUG] {output}")
-    elif is_debug is False:
-        print(output)
+    output = "".join([str(arg) for arg in output_args])
+    line = _format(level, output)
+    if _sink is not None:
+        _sink.write(line + "\n")
+    else:
+        print(line)
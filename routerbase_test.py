@@ -0,0 +1,93 @@
+import json
+import sys
+from io import StringIO
+from unittest import TestCase, main
+
+import routerbase
+from routerbase import DEBUG, ERROR, INFO, Lazy, logger
+
+
+class Counted:
+    """Counts how many times it's converted to a string."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __str__(self):
+        self.count += 1
+        return "counted"
+
+
+class TestLogger(TestCase):
+    def setUp(self):
+        self.captured_output = StringIO()
+        sys.stdout = self.captured_output
+
+    def tearDown(self):
+        sys.stdout = sys.__stdout__
+        routerbase.shutdown_logging()
+        routerbase.configure_logging(level=INFO, json_lines=False)
+        routerbase.DEBUG_MODE = False
+
+    def test_disabled_arguments_are_not_formatted(self):
+        routerbase.DEBUG_MODE = False
+        counted = Counted()
+        calls = []
+
+        logger("value ", counted, Lazy(calls.append, 1), is_debug=True)
+
+        self.assertEqual(counted.count, 0)
+        self.assertEqual(calls, [])
+        self.assertEqual(self.captured_output.getvalue(), "")
+
+    def test_enabled_arguments_are_concatenated(self):
+        logger("value ", 1, " ", Lazy(list, {2: None}.keys()))
+        self.assertEqual(self.captured_output.getvalue(), "value 1 [2]\n")
+
+    def test_levels(self):
+        routerbase.configure_logging(level=ERROR)
+
+        logger("info")
+        logger("error", level=ERROR)
+
+        self.assertEqual(self.captured_output.getvalue(), "error\n")
+
+    def test_debug_mode(self):
+        routerbase.DEBUG_MODE = True
+        logger("debugging", is_debug=True)
+        self.assertTrue(
+            self.captured_output.getvalue().endswith(" [DEBUG] debugging\n")
+        )
+
+    def test_json_lines(self):
+        routerbase.DEBUG_MODE = True
+        routerbase.configure_logging(json_lines=True)
+
+        logger("first")
+        logger("second", level=DEBUG)
+
+        records = [
+            json.loads(line)
+            for line in self.captured_output.getvalue().splitlines()
+        ]
+        self.assertEqual(
+            [(r["level"], r["message"]) for r in records],
+            [("INFO", "first"), ("DEBUG", "second")],
+        )
+
+    def test_background_sink(self):
+        stream = StringIO()
+        routerbase.configure_logging(background=True, stream=stream)
+
+        for i in range(100):
+            logger("line ", i)
+        routerbase.shutdown_logging()
+
+        self.assertEqual(
+            stream.getvalue(), "".join(f"line {i}\n" for i in range(100))
+        )
+        self.assertEqual(self.captured_output.getvalue(), "")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+import asyncio
+import os
+from typing import Any, Dict, List, Optional, Tuple, cast
+
+import routerbase
+from asyncrouter import LoopTimers, RouterProtocol
+from poc_parser_v03 import read_config
+from port_closer import port_closer
+from port_opener import port_opener
+from routerbase import logger
+from routingtable import RoutingTable
+from topology import TOPOLOGY_EXTENSION, Config, read_topology
+from validate_data import validate_data
+
+# The extension of the config files loaded from a directory.
+CONFIG_EXTENSION = ".cfg"
+
+
+def config_filenames(path: str) -> List[str]:
+    """
+    Returns the config files given by `path`, which is either a directory, in
+    which case every `.cfg` file inside it is used, or a comma separated list
+    of filenames.
+    """
+    if os.path.isdir(path):
+        return [
+            os.path.join(path, name)
+            for name in sorted(os.listdir(path))
+            if name.endswith(CONFIG_EXTENSION)
+        ]
+    return [filename for filename in path.split(",") if filename]
+
+
+def load_configs(path: str) -> List[Config]:
+    """
+    Reads and validates every config file given by `path`. Invalid config
+    files are skipped. If `path` is a topology file instead, every router
+    inside it is loaded, and a `TopologyError` is raised if it's invalid.
+
+    Returns the `(router_id, input_ports, output_ports, timers)` of each.
+    """
+    if path.endswith(TOPOLOGY_EXTENSION):
+        return read_topology(path)
+
+    configs: List[Config] = []
+    for filename in config_filenames(path):
+        try:
+            config = read_config(filename)
+        except ValueError:
+            config = None
+        if config is not None and validate_data(*config):
+            # None of the fields of a valid config are `None`.
+            configs.append(cast(Config, config))
+        else:
+            logger(f"Skipped invalid {filename}", level=routerbase.WARNING)
+    return configs
+
+
+class LocalTransport:
+    """
+    The output of a router inside a `RouterHost`. Datagrams sent to the input
+    port of another router in the host are delivered to it in memory, on the
+    next iteration of the event loop. Everything else is sent over UDP, if
+    the router has any UDP transports.
+
+    Instance variables:
+
+    delivered -- The number of datagrams delivered in memory.
+
+    forwarded -- The number of datagrams sent over UDP.
+
+    dropped -- The number of datagrams which had nowhere to go.
+    """
+
+    def __init__(self, host: "RouterHost", port: int):
+        self.host = host
+        self.port = port
+        self.udp: Optional[asyncio.DatagramTransport] = None
+        self.delivered = 0
+        self.forwarded = 0
+        self.dropped = 0
+
+    def sendto(self, data: Any, addr: Tuple[str, int]) -> None:
+        protocol = self.host.endpoints.get(addr[1])
+        if protocol is not None:
+            # The packet is copied, as the sender reuses its buffers.
+            source = ("localhost", self.port)
+            self.host.loop.call_soon(
+                protocol.datagram_received, bytes(data), source
+            )
+            self.delivered += 1
+        elif self.udp is not None:
+            self.udp.sendto(data, addr)
+            self.forwarded += 1
+        else:
+            self.dropped += 1
+            logger("No route to port ", addr[1], is_debug=True)
+
+
+class HostedRouter:
+    """
+    A single router running inside a `RouterHost`.
+
+    Instance variables:
+
+    table -- The router's routing table.
+
+    input_ports -- The ports that the router receives packets on.
+
+    timers -- Drives the table's timers on the host's event loop.
+
+    output -- Sends the router's packets.
+
+    sockets -- The UDP sockets bound to the input ports. These are only
+    opened for routers with neighbours outside of the host.
+    """
+
+    timers: LoopTimers
+    output: LocalTransport
+
+    def __init__(self, table: RoutingTable, input_ports: List[int]):
+        self.table = table
+        self.input_ports = input_ports
+        self.sockets: List[Any] = []
+        self.transports: List[asyncio.DatagramTransport] = []
+
+
+class RouterHost:
+    """
+    Runs many routers inside one process, on a single event loop.
+
+    Each router has its own `RoutingTable`, just as if it were running in its
+    own process. Packets between the routers in the host never touch the UDP
+    stack, and only the routers with neighbours outside of the host open UDP
+    sockets.
+
+    Instance variables:
+
+    routers -- The routers inside the host, in the order they were added.
+
+    endpoints -- The `RouterProtocol` which receives each input port's
+    packets, in the form of `{[key: port]: RouterProtocol}`.
+    """
+
+    loop: asyncio.AbstractEventLoop
+
+    def __init__(self):
+        self.routers: List[HostedRouter] = []
+        self.endpoints: Dict[int, RouterProtocol] = {}
+        self._router_ids: Dict[int, HostedRouter] = {}
+        self._ports: Dict[int, HostedRouter] = {}
+
+    def add(self, table: RoutingTable, input_ports: List[int]) -> HostedRouter:
+        """
+        Adds a router to the host. Raises a `ValueError` if its `router_id` or
+        any of its input ports is already used by another router.
+        """
+        if table.router_id in self._router_ids:
+            raise ValueError(f"Router {table.router_id} is already hosted")
+        for port in input_ports:
+            if port in self._ports:
+                raise ValueError(f"Port {port} is already used")
+
+        router = HostedRouter(table, input_ports)
+        self.routers.append(router)
+        self._router_ids[table.router_id] = router
+        for port in input_ports:
+            self._ports[port] = router
+        return router
+
+    def has_external_neighbours(self, router: HostedRouter) -> bool:
+        """Checks to see if any of the router's neighbours aren't hosted."""
+        return any(
+            config.port not in self._ports
+            for config in router.table.config_table.values()
+        )
+
+    async def open(self) -> None:
+        """
+        Creates the endpoints of every router, and opens the UDP sockets of
+        the routers with neighbours outside of the host. Raises an `OSError`
+        if a socket couldn't be opened.
+        """
+        self.loop = asyncio.get_running_loop()
+        for router in self.routers:
+            router.timers = LoopTimers(self.loop, router.table)
+            router.output = LocalTransport(self, router.input_ports[0])
+            router.timers.output = router.output
+            for port in router.input_ports:
+                self.endpoints[port] = RouterProtocol(
+                    router.table, port, router.timers
+                )
+
+        for router in self.routers:
+            if not self.has_external_neighbours(router):
+                continue
+            sockets = port_opener(router.input_ports)
+            if sockets is None:
+                raise OSError("Couldn't open the ports of a hosted router")
+            router.sockets = sockets
+            for sock in sockets:
+                _, port = sock.getsockname()
+                protocol = self.endpoints[port]
+                transport, _ = await self.loop.create_datagram_endpoint(
+                    lambda: protocol, sock=sock
+                )
+                router.transports.append(transport)
+            router.output.udp = router.transports[0]
+
+    async def serve(self) -> None:
+        """
+        Runs every router until cancelled. `open` must be called first, and
+        the routers should have sent their startup packets.
+        """
+        # Background jobs run on the loop's thread, instead of on worker
+        # threads, until the routers stop.
+        inline = routerbase.pool.inline
+        routerbase.pool.inline = True
+        for router in self.routers:
+            router.timers.rearm()
+        try:
+            await self.loop.create_future()
+        finally:
+            self.close()
+            routerbase.pool.inline = inline
+
+    def close(self) -> None:
+        """Stops the timers, and closes the UDP sockets of every router."""
+        for router in self.routers:
+            router.timers.cancel()
+            # Closing a transport closes its socket.
+            for transport in router.transports:
+                transport.close()
+            port_closer(router.sockets[len(router.transports) :])
+            router.transports = []
+            router.sockets = []
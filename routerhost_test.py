@@ -0,0 +1,86 @@
+import asyncio
+from unittest import TestCase, main
+from unittest.mock import patch
+
+import routerbase
+from router import create_table, run_host
+from routerhost import RouterHost, config_filenames, load_configs
+from routingtable import RoutingTable
+
+
+def create_router(router_id: int, neighbours, external=()) -> RoutingTable:
+    output_ports = [
+        (7000 + neighbour, 1, neighbour)
+        for neighbour in list(neighbours) + list(external)
+    ]
+    return create_table(router_id, [], output_ports, [30, 180, 120])
+
+
+@patch("tablerenderer.logger")
+@patch("routerhost.logger")
+class TestRouterHost(TestCase):
+    def setUp(self):
+        self.host = RouterHost()
+        self.host.add(create_router(1, [2]), [7001])
+        self.host.add(create_router(2, [1, 3]), [7002])
+        self.host.add(create_router(3, [2]), [7003])
+
+    def tearDown(self):
+        routerbase.pool.inline = False
+
+    def _run(self, seconds: float):
+        async def run():
+            task = asyncio.ensure_future(run_host(self.host))
+            await asyncio.sleep(seconds)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(run())
+
+    def test_packets_are_delivered_in_memory(self, *loggers):
+        self._run(0.05)
+
+        # Background jobs are run on worker threads again.
+        self.assertFalse(routerbase.pool.inline)
+
+        tables = [router.table for router in self.host.routers]
+        self.assertEqual(list(tables[0]), [2])
+        self.assertEqual(sorted(tables[1]), [1, 3])
+        self.assertEqual(list(tables[2]), [2])
+        for router in self.host.routers:
+            self.assertEqual(router.sockets, [])
+            self.assertGreater(router.output.delivered, 0)
+            self.assertEqual(router.output.dropped, 0)
+
+    def test_external_neighbours(self, *loggers):
+        router = self.host.add(create_router(4, [3], external=[9]), [7004])
+
+        self.assertTrue(self.host.has_external_neighbours(router))
+        self.assertFalse(
+            self.host.has_external_neighbours(self.host.routers[0])
+        )
+
+    def test_clashes_are_rejected(self, *loggers):
+        with self.assertRaises(ValueError):
+            self.host.add(create_router(1, [2]), [7005])
+        with self.assertRaises(ValueError):
+            self.host.add(create_router(5, [2]), [7001])
+
+
+class TestLoadConfigs(TestCase):
+    def test_directory(self):
+        filenames = config_filenames("Config_files")
+
+        self.assertGreater(len(filenames), 0)
+        self.assertTrue(all(name.endswith(".cfg") for name in filenames))
+        self.assertEqual(filenames, sorted(filenames))
+
+    def test_filenames(self):
+        configs = load_configs("Config_files/R1.cfg,Config_files/R2.cfg")
+
+        self.assertEqual([config[0] for config in configs], [1, 2])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+from array import array
+from typing import Iterator, MutableMapping, Optional
+
+from routeentry import Route, RouteEntry
+from validate_data import MAX_ID
+
+# Route stores
+DICT_STORE = "dict"  # A `dict` of `RouteEntry` objects
+ARRAY_STORE = "array"  # A `RouteStore` of `array` columns
+STORES = (DICT_STORE, ARRAY_STORE)
+
+# The bits of each route's `state`
+PRESENT = 1
+FLAGGED = 2
+GC_STARTED = 4
+
+
+class StoredRoute:
+    """
+    A `Route` whose fields are kept in the columns of a `RouteStore`.
+
+    Views are created when a route is looked up, and every read and write goes
+    straight to the store. This means that changes made through a view, such
+    as `update_timeout_time`, change the stored route. A view of a route which
+    has since been removed reads whatever is stored for its `router_id`.
+    """
+
+    __slots__ = ("_store", "_router_id")
+
+    def __init__(self, store: "RouteStore", router_id: int):
+        self._store = store
+        self._router_id = router_id
+
+    def __repr__(self):
+        return f"StoredRoute({self._router_id})"
+
+    @property
+    def port(self) -> int:
+        return self._store.ports[self._router_id]
+
+    @port.setter
+    def port(self, value: int) -> None:
+        self._store.ports[self._router_id] = value
+
+    @property
+    def metric(self) -> int:
+        return self._store.metrics[self._router_id]
+
+    @metric.setter
+    def metric(self, value: int) -> None:
+        self._store.metrics[self._router_id] = value
+
+    @property
+    def next_hop(self) -> int:
+        return self._store.next_hops[self._router_id]
+
+    @next_hop.setter
+    def next_hop(self, value: int) -> None:
+        self._store.next_hops[self._router_id] = value
+
+    @property
+    def flag(self) -> bool:
+        return bool(self._store.states[self._router_id] & FLAGGED)
+
+    @flag.setter
+    def flag(self, value: bool) -> None:
+        self._store.set_state(self._router_id, FLAGGED, value)
+
+    @property
+    def timeout_time(self) -> int:
+        return self._store.timeout_times[self._router_id]
+
+    @timeout_time.setter
+    def timeout_time(self, value: int) -> None:
+        self._store.timeout_times[self._router_id] = value
+
+    @property
+    def gc_time(self) -> Optional[int]:
+        if self._store.states[self._router_id] & GC_STARTED:
+            return self._store.gc_times[self._router_id]
+        return None
+
+    @gc_time.setter
+    def gc_time(self, value: Optional[int]) -> None:
+        self._store.set_state(self._router_id, GC_STARTED, value is not None)
+        if value is not None:
+            self._store.gc_times[self._router_id] = value
+
+    # The methods of `RouteEntry` only use its fields, so they work on the
+    # views too.
+    shallow_copy = RouteEntry.shallow_copy
+    update_timeout_time = RouteEntry.update_timeout_time
+    set_garbage_collection_time = RouteEntry.set_garbage_collection_time
+
+
+class RouteStore(MutableMapping[int, Route]):
+    """
+    A compact routing table store, which can be used in place of the `dict` of
+    a `RoutingTable`.
+
+    Instead of one `RouteEntry` object per route, each field is kept in its
+    own `array` column, which is indexed by `router_id`. The columns only grow
+    as far as the largest `router_id` which has been stored, up to `MAX_ID`.
+    A full table takes 24 bytes per route, rather than the hundreds taken by
+    a `dict` of `RouteEntry` objects.
+
+    Looking up a route returns a `StoredRoute` view of it. Storing a
+    `RouteEntry` copies its fields into the columns, so later changes must be
+    made through the view. Routes are iterated in order of `router_id`.
+
+    Instance variables:
+
+    ports, metrics, next_hops, timeout_times, gc_times -- The columns of each
+    field.
+
+    states -- Whether each `router_id` has a route, whether it's flagged, and
+    whether its garbage collection has started, as `PRESENT`, `FLAGGED` and
+    `GC_STARTED` bits.
+    """
+
+    def __init__(self):
+        self.ports = array("H")
+        self.metrics = array("B")
+        self.next_hops = array("i")
+        self.timeout_times = array("q")
+        self.gc_times = array("q")
+        self.states = array("B")
+        self._len = 0
+
+    def _columns(self):
+        return (
+            self.ports,
+            self.metrics,
+            self.next_hops,
+            self.timeout_times,
+            self.gc_times,
+            self.states,
+        )
+
+    def _grow(self, router_id: int) -> None:
+        if router_id < 0 or router_id > MAX_ID:
+            raise KeyError(router_id)
+        size = len(self.states)
+        if router_id >= size:
+            # Grows geometrically, so that adding ids in order is amortised.
+            extra = min(max(router_id + 1, 2 * size), MAX_ID + 1) - size
+            for column in self._columns():
+                column.frombytes(bytes(extra * column.itemsize))
+
+    def _has(self, router_id: int) -> bool:
+        return (
+            isinstance(router_id, int)
+            and 0 <= router_id < len(self.states)
+            and bool(self.states[router_id] & PRESENT)
+        )
+
+    def set_state(self, router_id: int, bit: int, value: bool) -> None:
+        """Sets or clears one of the `state` bits of the `router_id`."""
+        if value:
+            self.states[router_id] |= bit
+        else:
+            self.states[router_id] &= ~bit
+
+    def __len__(self):
+        return self._len
+
+    def __contains__(self, router_id: object) -> bool:
+        return self._has(router_id)  # type: ignore
+
+    def __iter__(self) -> Iterator[int]:
+        states = self.states
+        return (
+            router_id
+            for router_id in range(len(states))
+            if states[router_id] & PRESENT
+        )
+
+    def __getitem__(self, router_id: int) -> Route:
+        if not self._has(router_id):
+            raise KeyError(router_id)
+        return StoredRoute(self, router_id)
+
+    def __setitem__(self, router_id: int, route: Route) -> None:
+        self._grow(router_id)
+        if not self.states[router_id] & PRESENT:
+            self._len += 1
+        self.ports[router_id] = route.port
+        self.metrics[router_id] = route.metric
+        self.next_hops[router_id] = route.next_hop
+        self.timeout_times[router_id] = route.timeout_time
+        state = PRESENT
+        if route.flag:
+            state |= FLAGGED
+        if route.gc_time is not None:
+            state |= GC_STARTED
+            self.gc_times[router_id] = route.gc_time
+        self.states[router_id] = state
+
+    def __delitem__(self, router_id: int) -> None:
+        if not self._has(router_id):
+            raise KeyError(router_id)
+        self.states[router_id] = 0
+        self._len -= 1
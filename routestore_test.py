@@ -0,0 +1,98 @@
+from unittest import TestCase, main
+from unittest.mock import Mock, patch
+
+from input_processing import adopt_route
+from output_processing import deletion_process
+from routeentry import RouteEntry
+from routestore import RouteStore
+from routingtable import RoutingTable
+from timers import clock, seconds
+from validate_data import INFINITY, MAX_ID
+
+
+class TestRouteStore(TestCase):
+    def setUp(self):
+        self.store = RouteStore()
+        self.entry = RouteEntry(4000, 3, 180, 2)
+        self.store[5] = self.entry
+
+    def test_fields_are_stored(self):
+        route = self.store[5]
+
+        self.assertEqual(route.port, 4000)
+        self.assertEqual(route.metric, 3)
+        self.assertEqual(route.next_hop, 2)
+        self.assertEqual(route.timeout_time, self.entry.timeout_time)
+        self.assertFalse(route.flag)
+        self.assertIsNone(route.gc_time)
+
+    def test_changes_through_view(self):
+        route = self.store[5]
+        route.metric = INFINITY
+        route.flag = True
+        now = route.set_garbage_collection_time(120)
+
+        stored = self.store[5]
+        self.assertEqual(stored.metric, INFINITY)
+        self.assertTrue(stored.flag)
+        self.assertEqual(stored.gc_time, now + seconds(120))
+
+        stored.update_timeout_time(180, now)
+        self.assertIsNone(self.store[5].gc_time)
+
+    def test_shallow_copy_is_detached(self):
+        copy = self.store[5].shallow_copy()
+        copy.metric = INFINITY
+
+        self.assertIsInstance(copy, RouteEntry)
+        self.assertEqual(self.store[5].metric, 3)
+
+    def test_mapping(self):
+        self.store[MAX_ID] = RouteEntry(4001, 1, 180)
+        self.store[1] = RouteEntry(4002, 1, 180)
+
+        self.assertEqual(list(self.store), [1, 5, MAX_ID])
+        self.assertEqual(len(self.store), 3)
+
+        del self.store[5]
+        self.assertNotIn(5, self.store)
+        self.assertEqual(len(self.store), 2)
+        with self.assertRaises(KeyError):
+            self.store[5]
+        with self.assertRaises(KeyError):
+            self.store[MAX_ID + 1] = RouteEntry(4003, 1, 180)
+
+
+@patch("input_processing.logger")
+@patch("output_processing.logger")
+class TestRoutingTableWithStore(TestCase):
+    def setUp(self):
+        clock.tick()
+        self.table = RoutingTable(1, 30, 180, 120, RouteStore())
+
+    def test_adopt_route(self, *loggers):
+        self.table.add_route(4, RouteEntry(0, 5, 0, 2))
+        now = clock.now()
+
+        adopt_route(self.table, self.table[4], 3, 3, Mock(), 4)
+
+        route = self.table[4]
+        self.assertEqual((route.metric, route.next_hop), (3, 3))
+        self.assertGreaterEqual(route.timeout_time, now + seconds(180))
+        self.assertEqual(self.table.take_flagged(), [4])
+
+    def test_deletion_process(self, *loggers):
+        self.table.add_route(2, RouteEntry(0, 1, -1, 2))
+        self.table.add_route(3, RouteEntry(0, 1, 180, 3))
+        self.table.start_garbage_collection(3, clock.now() - seconds(121))
+
+        deletion_process(self.table, Mock())
+
+        self.assertEqual(self.table[2].metric, INFINITY)
+        self.assertIsNotNone(self.table[2].gc_time)
+        self.assertNotIn(3, self.table)
+        self.assertEqual(self.table.take_flagged(), [2])
+
+
+if __name__ == "__main__":
+    main()
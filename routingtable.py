@@ -1,10 +1,35 @@
-from datetime import datetime, timedelta
 from random import randint
-from time import sleep
-from typing import Dict, Iterator, NamedTuple, Optional
+from types import MappingProxyType
+from typing import (
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    MutableMapping,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+)
 
 import routerbase
-from routeentry import RouteEntry
+from metrics import RouterMetrics, registry
+from responsecache import ResponseCache
+from routeentry import Route
+from sendengine import SendEngine
+from tableactor import TableActor
+from tablerenderer import TableRenderer
+from timers import (
+    GARBAGE_COLLECTION,
+    ROUTE_TIMEOUT,
+    SCHEDULED_UPDATE,
+    TimerQueue,
+    clock,
+    seconds,
+    wall_clock,
+)
+from triggeredupdate import TriggeredUpdateScheduler
 
 
 class ConfigData(NamedTuple):
@@ -19,7 +44,9 @@ class RoutingTable:
     Instance variables:
 
     table -- Contains the routing table, in the form of
-    `{[key: router_id]: RouteEntry}`.
+    `{[key: router_id]: RouteEntry}`. It's changed in place, so anything which
+    iterates over the routes must iterate over a `snapshot` instead. This is a
+    `dict`, unless a compact `RouteStore` is given.
 
     config_table - Contains information from the config file.
 
@@ -35,13 +62,48 @@ class RoutingTable:
 
     gc_delta -- The delta for the time after which invalid routes are removed
     from the table.
+
+    timers -- The deadlines of the route timeout, garbage collection,
+    scheduled update and triggered update timers.
+
+    generation -- Incremented whenever a change is made which alters the
+    packets sent to neighbours. That is, when a route is added or removed, or
+    when a route's `metric` or `next_hop` is changed, which must be followed
+    by a call to `mark_changed`.
+
+    response_cache -- The encoded packets for each neighbour, which are valid
+    for the current `generation`.
+
+    flagged -- The `router_id`s of the routes whose route change flag is set.
+    Flags are set with `flag_route`, and cleared with `take_flagged`.
+
+    triggered_updates -- Schedules and coalesces the triggered updates.
+
+    actor -- Queues the changes to the table which are deferred until the
+    daemon's loop next drains it.
+
+    renderer -- Formats the table for printing, and decides when to print it.
+
+    sender -- Sends the packets to the neighbours' ports, whose addresses are
+    resolved when they're added to the `config_table`.
+
+    metrics -- Counts what happens to the table, for the metrics `registry`.
+    Every table registers itself when it's created.
     """
 
-    table: Dict[int, RouteEntry]
+    table: MutableMapping[int, Route]
     config_table: Dict[int, ConfigData]
-
-    sched_update_time: datetime
-    triggered_update_time: Optional[datetime] = None
+    timers: TimerQueue
+    generation: int
+    response_cache: ResponseCache
+    flagged: Set[int]
+    triggered_updates: TriggeredUpdateScheduler
+    actor: TableActor
+    renderer: TableRenderer
+    sender: SendEngine
+    metrics: RouterMetrics
+
+    sched_update_time: int
 
     update_delta: int
     timeout_delta: int
@@ -53,24 +115,56 @@ class RoutingTable:
         update_delta: int,
         timeout_delta: int,
         gc_delta: int,
+        store: Optional[MutableMapping[int, Route]] = None,
     ):
-        self.table = {}
+        self.table = {} if store is None else store
+        self._snapshot: Optional[Mapping[int, Route]] = None
+        self.timers = TimerQueue()
+        self.triggered_updates = TriggeredUpdateScheduler(self.timers)
+        self.generation = 0
+        self.response_cache = ResponseCache()
+        self.flagged = set()
+        self.actor = TableActor(self)
+        self.renderer = TableRenderer()
+        self.sender = SendEngine()
+        self.metrics = RouterMetrics()
         self.router_id = router_id
         self.update_delta = update_delta
         self.update_sched_update_time()
         self.timeout_delta = timeout_delta
         self.gc_delta = gc_delta
         self.config_table = {}
+        registry.register(self)
 
     def __len__(self):
         """Returns the number of items inside the routing table"""
         return len(self.table)
 
     def __iter__(self) -> Iterator[int]:
-        """Iterates over the `RouteEntry` items in the routing table"""
-        return iter(self.table.keys())
+        """
+        Iterates over the `router_id`s in a snapshot of the routing table, so
+        routes can be added and removed while iterating.
+        """
+        return iter(self.snapshot())
 
-    def __getitem__(self, index: int) -> RouteEntry:
+    def snapshot(self) -> Mapping[int, Route]:
+        """
+        Returns an immutable snapshot of the routing table, in the form of
+        `{[key: router_id]: RouteEntry}`.
+
+        The snapshot is only copied after routes have been added, removed or
+        replaced by another `RouteEntry`, so every reader shares the same
+        snapshot until then. The `RouteEntry` items are shared with the table,
+        so routes which are changed in place, such as by `update_route`, don't
+        copy the snapshot.
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            snapshot = MappingProxyType(dict(self.table))
+            self._snapshot = snapshot
+        return snapshot
+
+    def __getitem__(self, index: int) -> Route:
         """
         Returns a specific `RouteEntry` in the routing table, given its
         `router_id`.
@@ -107,57 +201,40 @@ class RoutingTable:
         output += "|\n"
         return output
 
-    def _str_entry(self, router_id: int) -> str:
+    def _str_entry(self, router_id: int, e: Route) -> str:
         """
         Returns the string representation of a `RouteEntry` inside the table.
         """
-        e = self.table[router_id]
-        output = (
-            "| "
-            + str(self.router_id).ljust(7)
-            + " | "
-            + str(router_id).ljust(9)
-            + " | "
-            + str(e.port).ljust(4)
-            + " | "
-            + str(e.next_hop).ljust(8)
-            + " | "
-            + str(e.metric).ljust(6)
-            + " | "
-        )
+        columns = [
+            str(self.router_id).ljust(7),
+            str(router_id).ljust(9),
+            str(e.port).ljust(4),
+            str(e.next_hop).ljust(8),
+            str(e.metric).ljust(6),
+        ]
+        output = "| " + " | ".join(columns) + " | "
 
         if routerbase.DEBUG_MODE:
             output += str(e.flag).ljust(5) + "| "
 
-        try:
-            output += str(e.timeout_time).ljust(26)
-        except AttributeError:
-            output += str(None).ljust(26)
-        output += " | "
-
-        try:
-            output += str(e.gc_time).ljust(26)
-        except AttributeError:
-            output += str(None).ljust(26)
-        output += " |\n"
-
-        return output
+        # The monotonic timestamps are only converted to wall clock times here.
+        timeout_time = getattr(e, "timeout_time", None)
+        if timeout_time is not None:
+            timeout_time = wall_clock(timeout_time)
+        gc_time = getattr(e, "gc_time", None)
+        if gc_time is not None:
+            gc_time = wall_clock(gc_time)
+        return (
+            output
+            + f"{str(timeout_time).ljust(26)} | {str(gc_time).ljust(26)} |\n"
+        )
 
     def __str__(self):
-        """Returns a string representation of the routing table."""
-
-        output = ""
-
-        router_id = None
-        for router_id in self.table:
-            output += self._str_entry(router_id)
-
-        if output and router_id is not None:
-            output = self._str_headers(router_id) + output
-        else:
-            output = "Empty table"
-
-        return output
+        """
+        Returns a string representation of the routing table. Rows are reused
+        from the `renderer` for the routes which haven't changed.
+        """
+        return self.renderer.render(self)
 
     def neighbours(self):
         """
@@ -165,28 +242,186 @@ class RoutingTable:
         """
         return self.table.keys()
 
-    def add_route(self, router_id: int, route: RouteEntry) -> None:
+    def add_route(self, router_id: int, route: Route) -> None:
         """
         Adds the `RouteEntry`  to the table, and associates it with the given
         `router_id`."""
+        if router_id not in self.table:
+            self.metrics.routes_added.inc()
+            self._snapshot = None
+        elif (
+            isinstance(self.table, dict) and self.table[router_id] is not route
+        ):
+            # The snapshot still holds the replaced `RouteEntry`. The routes
+            # of a `RouteStore` are views of its columns, so they're always up
+            # to date.
+            self._snapshot = None
         self.table[router_id] = route
+        self.mark_changed()
+        if route.flag:
+            self.flagged.add(router_id)
+        else:
+            self.flagged.discard(router_id)
+        self.timers.schedule(ROUTE_TIMEOUT, route.timeout_time, router_id)
+        if route.gc_time is None:
+            self.timers.cancel(GARBAGE_COLLECTION, router_id)
+        else:
+            self.timers.schedule(GARBAGE_COLLECTION, route.gc_time, router_id)
+
+    def update_route(
+        self, router_id: int, port: int, metric: int, next_hop: int
+    ) -> bool:
+        """
+        Changes the `RouteEntry` associated with the given `router_id` in
+        place, and restarts its timeout. The entry isn't replaced, so the
+        snapshot is kept, and the `generation` is only incremented if the
+        route's `metric` or `next_hop` has changed, or if the route was being
+        garbage collected. Changed routes are flagged.
+
+        Returns a Boolean indicating whether the route has changed.
+        """
+        entry = self.table[router_id]
+        changed = (
+            entry.metric != metric
+            or entry.next_hop != next_hop
+            or entry.gc_time is not None
+        )
+        entry.port = port
+        entry.update_timeout_time(self.timeout_delta)
+        if not changed:
+            # The timeout timer is moved lazily, when it fires.
+            return False
+
+        entry.metric = metric
+        entry.next_hop = next_hop
+        entry.gc_time = None
+        self.timers.cancel(GARBAGE_COLLECTION, router_id)
+        self.timers.schedule(ROUTE_TIMEOUT, entry.timeout_time, router_id)
+        self.flag_route(router_id)
+        self.mark_changed()
+        return True
+
+    def add_routes(self, routes: Iterable[Tuple[int, Route]]) -> int:
+        """
+        Adds every given `(router_id, RouteEntry)` to the table in a single
+        step, such as when the table is restored. The timeout timers are all
+        scheduled together.
+
+        Returns the number of routes which were added.
+        """
+        deadlines: List[Tuple[int, int]] = []
+        added = 0
+        for router_id, route in routes:
+            if router_id not in self.table:
+                added += 1
+            self.table[router_id] = route
+            if route.flag:
+                self.flagged.add(router_id)
+            else:
+                self.flagged.discard(router_id)
+            deadlines.append((route.timeout_time, router_id))
+            if route.gc_time is None:
+                self.timers.cancel(GARBAGE_COLLECTION, router_id)
+            else:
+                self.timers.schedule(
+                    GARBAGE_COLLECTION, route.gc_time, router_id
+                )
+
+        if deadlines:
+            self.metrics.routes_added.inc(added)
+            self.timers.schedule_many(ROUTE_TIMEOUT, deadlines)
+            self._snapshot = None
+            self.mark_changed()
+        return added
+
+    def mark_changed(self) -> None:
+        """
+        Records that the contents of the table have changed, which invalidates
+        the packets inside the `response_cache`.
+        """
+        self.generation += 1
+
+    def flag_route(self, router_id: int) -> None:
+        """
+        Sets the route change flag of the `RouteEntry` associated with the
+        given `router_id`, so that it's included in the next triggered update.
+        """
+        self.table[router_id].flag = True
+        self.flagged.add(router_id)
+
+    def take_flagged(self) -> List[int]:
+        """
+        Returns the `router_id`s of the flagged routes which are still in the
+        table, and clears their route change flags.
+        """
+        flagged, self.flagged = self.flagged, set()
+        snapshot = self.snapshot()
+        router_ids = []
+        for router_id in sorted(flagged):
+            entry = snapshot.get(router_id)
+            if entry is not None:
+                entry.flag = False
+                router_ids.append(router_id)
+        return router_ids
 
     def add_config_data(self, router_id: int, port: int, cost: int):
         self.config_table[router_id] = ConfigData(port, cost)
+        self.sender.resolve(port)
 
     def remove_route(self, router_id: int) -> None:
         """
         Removes the `router_id` and associated `RouteEntry` from the table.
         """
-        # Creates a shallow copy of the dictionary. This prevents Python
-        # complaining if there's a deletion while something is iterating over
-        # the table.
-        self.table = dict(self.table)
+        # Readers iterate over a snapshot, so the table can be changed in place.
         del self.table[router_id]
+        self._snapshot = None
+        self.mark_changed()
+        self.flagged.discard(router_id)
+        self.timers.cancel(ROUTE_TIMEOUT, router_id)
+        self.timers.cancel(GARBAGE_COLLECTION, router_id)
+
+    def remove_routes(self, router_ids: Iterable[int]) -> int:
+        """
+        Removes every given `router_id` which is inside the table, and its
+        associated `RouteEntry`, in a single step.
+
+        Returns the number of routes which were removed.
+        """
+        removed = 0
+        for router_id in router_ids:
+            if self.table.pop(router_id, None) is None:
+                continue
+            removed += 1
+            self.flagged.discard(router_id)
+            self.timers.cancel(ROUTE_TIMEOUT, router_id)
+            self.timers.cancel(GARBAGE_COLLECTION, router_id)
+
+        if removed:
+            self._snapshot = None
+            self.mark_changed()
+        return removed
+
+    def start_garbage_collection(
+        self, router_id: int, initial_time_arg: Optional[int] = None
+    ) -> int:
+        """
+        Sets the garbage collection time of the `RouteEntry` associated with
+        the given `router_id`, and schedules its garbage collection timer.
+
+        Returns the `initial_time`, which is the what `self.gc_delta` is added
+        to.
+        """
+        entry = self.table[router_id]
+        initial_time = entry.set_garbage_collection_time(
+            self.gc_delta, initial_time_arg
+        )
+        if entry.gc_time is not None:
+            self.timers.schedule(GARBAGE_COLLECTION, entry.gc_time, router_id)
+        return initial_time
 
     def update_sched_update_time(
-        self, initial_time_arg: Optional[datetime] = None
-    ) -> datetime:
+        self, initial_time_arg: Optional[int] = None
+    ) -> int:
         """
         Updates the scheduled time at which an update will be sent out for this
         `RouteEntry`. Returns the `initial_time`, which is the what
@@ -195,44 +430,42 @@ class RoutingTable:
         Keyword arguments:
 
         initial_time -- The initial time, as specified. Defaults to
-        `datetime.now()`
+        `clock.now()`
         """
         initial_time = (
-            initial_time_arg if initial_time_arg is not None else datetime.now()
+            initial_time_arg if initial_time_arg is not None else clock.now()
         )
-        self.sched_update_time = initial_time + timedelta(
-            seconds=self.update_delta + randint(-5, 5)
+        self.sched_update_time = initial_time + seconds(
+            self.update_delta + randint(-5, 5)
         )
+        self.timers.schedule(SCHEDULED_UPDATE, self.sched_update_time)
         return initial_time
 
+    @property
+    def triggered_update_time(self) -> Optional[int]:
+        """The time at which the pending triggered update will be sent."""
+        return self.triggered_updates.deadline
+
     def set_triggered_update_time(
-        self, initial_time_arg: Optional[datetime] = None
-    ) -> int:
+        self, initial_time_arg: Optional[int] = None
+    ) -> bool:
         """
-        Updates the triggered time at which an update will be sent out for
-        this `RouteEntry`.
+        Requests a triggered update. If a triggered update is already pending,
+        this request is coalesced into it. Otherwise, one is scheduled 1 to 5
+        seconds from now, or at the end of the hold time after the previous
+        triggered update, whichever is later.
 
-        Returns a Boolean indicating whether another triggered update has been
-        requested. This detects if this method has been called after
-        `self.triggered_update_time` has been set. If it has been set again,
-        then it will return `False`. Otherwise, it will return `True`.
-
-        Returns `False` if the `triggered_update_time` is after the next
-        scheduled `sched_update_time`.
+        Returns `False` if the triggered update is suppressed, because the next
+        scheduled update will be sent first. Otherwise, it returns `True`.
 
         Keyword arguments:
 
         initial_time -- The initial time, as specified. Defaults to
-        `datetime.now()`.
+        `clock.now()`.
         """
         initial_time = (
-            initial_time_arg if initial_time_arg is not None else datetime.now()
+            initial_time_arg if initial_time_arg is not None else clock.now()
+        )
+        return self.triggered_updates.request(
+            initial_time, self.sched_update_time
         )
-        diff = randint(1, 5)
-        diff_delta = timedelta(seconds=diff)
-        self.triggered_update_time = initial_time + diff_delta
-        if self.triggered_update_time >= self.sched_update_time:
-            return False
-
-        sleep(diff)
-        return initial_time + diff_delta == self.triggered_update_time
@@ -0,0 +1,119 @@
+from unittest import TestCase, main
+
+from routeentry import RouteEntry
+from routestore import RouteStore
+from routingtable import RoutingTable
+from timers import GARBAGE_COLLECTION, ROUTE_TIMEOUT
+
+
+class TestSnapshots(TestCase):
+    def setUp(self):
+        self.table = RoutingTable(1, 30, 180, 120)
+        for router_id in range(2, 7):
+            self.table.add_route(router_id, RouteEntry(0, 1, 180, 2))
+
+    def test_snapshot_is_shared_until_changed(self):
+        snapshot = self.table.snapshot()
+        self.assertIs(self.table.snapshot(), snapshot)
+
+        self.table.add_route(7, RouteEntry(0, 1, 180, 2))
+        self.assertIsNot(self.table.snapshot(), snapshot)
+        self.assertNotIn(7, snapshot)
+
+    def test_snapshot_is_immutable(self):
+        with self.assertRaises(TypeError):
+            self.table.snapshot()[8] = RouteEntry(0, 1, 180, 2)  # type: ignore
+
+    def test_snapshot_is_kept_when_route_is_updated(self):
+        snapshot = self.table.snapshot()
+        route = self.table[3]
+
+        self.table.add_route(3, route)
+        self.assertIs(self.table.snapshot(), snapshot)
+
+        self.table.add_route(3, RouteEntry(0, 2, 180, 2))
+        self.assertIsNot(self.table.snapshot(), snapshot)
+        self.assertEqual(self.table.snapshot()[3].metric, 2)
+
+    def test_snapshot_is_kept_when_route_is_updated_in_place(self):
+        snapshot = self.table.snapshot()
+
+        self.table.update_route(2, 0, 1, 2)
+        self.assertIs(self.table.snapshot(), snapshot)
+
+        self.table.update_route(2, 0, 4, 3)
+        self.assertIs(self.table.snapshot(), snapshot)
+        self.assertEqual((snapshot[2].metric, snapshot[2].next_hop), (4, 3))
+
+    def test_store_snapshot_is_kept_when_route_is_replaced(self):
+        table = RoutingTable(1, 30, 180, 120, RouteStore())
+        table.add_route(2, RouteEntry(0, 1, 180, 2))
+        snapshot = table.snapshot()
+
+        table.add_route(2, RouteEntry(0, 5, 180, 2))
+
+        self.assertIs(table.snapshot(), snapshot)
+        self.assertEqual(snapshot[2].metric, 5)
+
+    def test_remove_while_iterating(self):
+        for router_id in self.table:
+            del self.table[router_id]
+
+        self.assertEqual(len(self.table), 0)
+
+    def test_remove_routes(self):
+        generation = self.table.generation
+
+        removed = self.table.remove_routes([2, 4, 6, 8])
+
+        self.assertEqual(removed, 3)
+        self.assertEqual(list(self.table), [3, 5])
+        self.assertEqual(self.table.generation, generation + 1)
+        self.assertNotIn((ROUTE_TIMEOUT, 4), self.table.timers)
+
+    def test_add_routes(self):
+        generation = self.table.generation
+        route = RouteEntry(0, 1, 180, 2)
+
+        added = self.table.add_routes([(6, route), (7, route), (8, route)])
+
+        self.assertEqual(added, 2)
+        self.assertEqual(list(self.table), [2, 3, 4, 5, 6, 7, 8])
+        self.assertEqual(self.table.generation, generation + 1)
+        self.assertIn((ROUTE_TIMEOUT, 8), self.table.timers)
+
+
+class TestUpdateRoute(TestCase):
+    def setUp(self):
+        self.table = RoutingTable(1, 30, 180, 120)
+        self.table.add_route(2, RouteEntry(5002, 1, 180, 2))
+        self.table.take_flagged()
+
+    def test_refresh(self):
+        generation = self.table.generation
+        route = self.table[2]
+
+        changed = self.table.update_route(2, 5002, 1, 2)
+
+        self.assertFalse(changed)
+        self.assertIs(self.table[2], route)
+        self.assertEqual(self.table.generation, generation)
+        self.assertEqual(self.table.take_flagged(), [])
+
+    def test_change(self):
+        generation = self.table.generation
+        self.table.start_garbage_collection(2)
+
+        changed = self.table.update_route(2, 5002, 3, 2)
+
+        self.assertTrue(changed)
+        route = self.table[2]
+        self.assertEqual((route.metric, route.gc_time), (3, None))
+        self.assertEqual(self.table.generation, generation + 1)
+        self.assertEqual(self.table.take_flagged(), [2])
+        self.assertNotIn((GARBAGE_COLLECTION, 2), self.table.timers)
+        self.assertIn((ROUTE_TIMEOUT, 2), self.table.timers)
+
+
+if __name__ == "__main__":
+    main()
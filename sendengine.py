@@ -0,0 +1,323 @@
+import ctypes
+import ctypes.util
+import errno
+import sys
+from select import select
+from socket import AF_INET, SOCK_DGRAM, getaddrinfo, inet_aton, socket
+from struct import Struct, pack
+from threading import Lock
+from time import perf_counter
+from typing import Any, Dict, List, Optional, Protocol, Sequence, Tuple
+
+from routerbase import logger
+
+# The host that every neighbour is reached through.
+NEIGHBOUR_HOST = "localhost"
+
+# Errors which mean the socket's buffer is full, and the send can be retried.
+RETRY_ERRNOS = (errno.EAGAIN, errno.EWOULDBLOCK, errno.ENOBUFS)
+MAX_RETRIES = 3
+RETRY_WAIT = 0.01  # seconds
+
+Address = Tuple[str, int]
+SOCKADDR_IN_LEN = 16
+
+
+class Output(Protocol):
+    """
+    Anything which packets can be sent with, such as a socket or an asyncio
+    transport.
+    """
+
+    def sendto(self, data: Any, address: Address, /) -> Any:
+        ...
+
+
+class NullOutput:
+    """An `Output` which drops everything sent with it."""
+
+    def sendto(self, data: Any, address: Address, /) -> None:
+        pass
+
+
+class _IoVec(ctypes.Structure):
+    _fields_ = [("iov_base", ctypes.c_void_p), ("iov_len", ctypes.c_size_t)]
+
+
+class _MsgHdr(ctypes.Structure):
+    _fields_ = [
+        ("msg_name", ctypes.c_void_p),
+        ("msg_namelen", ctypes.c_uint32),
+        ("msg_iov", ctypes.POINTER(_IoVec)),
+        ("msg_iovlen", ctypes.c_size_t),
+        ("msg_control", ctypes.c_void_p),
+        ("msg_controllen", ctypes.c_size_t),
+        ("msg_flags", ctypes.c_int),
+    ]
+
+
+class _MMsgHdr(ctypes.Structure):
+    _fields_ = [("msg_hdr", _MsgHdr), ("msg_len", ctypes.c_uint)]
+
+
+# The layouts of `struct mmsghdr` and `struct iovec`, which are packed
+# directly into buffers, as that's much faster than filling in ctypes
+# structures. They're checked against the ctypes definitions before use.
+_MMSGHDR_STRUCT = Struct("@PIPNPNi4xI4x")
+_IOVEC_STRUCT = Struct("@PN")
+
+
+def _load_sendmmsg() -> Optional[Any]:
+    """Returns libc's `sendmmsg`, or `None` if the platform doesn't have it."""
+    if not sys.platform.startswith("linux"):
+        return None
+    if (
+        _MMSGHDR_STRUCT.size != ctypes.sizeof(_MMsgHdr)
+        or _IOVEC_STRUCT.size != ctypes.sizeof(_IoVec)
+    ):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        sendmmsg = libc.sendmmsg
+    except (OSError, AttributeError):
+        return None
+    sendmmsg.argtypes = [
+        ctypes.c_int,
+        ctypes.c_void_p,
+        ctypes.c_uint,
+        ctypes.c_int,
+    ]
+    sendmmsg.restype = ctypes.c_int
+    return sendmmsg
+
+
+_sendmmsg = _load_sendmmsg()
+_sockaddrs: Dict[Address, Tuple[Any, int]] = {}
+
+
+def _sockaddr_in(address: Address) -> Tuple[Any, int]:
+    """
+    Returns a cached C buffer holding the `struct sockaddr_in` of an IPv4
+    address, and the buffer's address.
+    """
+    cached = _sockaddrs.get(address)
+    if cached is None:
+        host, port = address
+        sockaddr = (
+            pack("=H", AF_INET) + pack("!H", port) + inet_aton(host) + bytes(8)
+        )
+        buffer = ctypes.create_string_buffer(sockaddr, len(sockaddr))
+        cached = (buffer, ctypes.addressof(buffer))
+        _sockaddrs[address] = cached
+    return cached
+
+
+def _address_of(buffer: bytearray) -> Tuple[Any, int]:
+    """
+    Returns a ctypes object which keeps the `bytearray` pinned, and the address
+    of its contents.
+    """
+    pinned = ctypes.c_char.from_buffer(buffer)
+    return pinned, ctypes.addressof(pinned)
+
+
+def sendmmsg(
+    sock: socket, batch: Sequence[Tuple[Address, bytearray]], start: int = 0
+) -> int:
+    """
+    Sends the datagrams in `batch[start:]` with a single `sendmmsg` call.
+
+    Returns the number of datagrams sent, which may be fewer than were given.
+    Raises `OSError` if none could be sent.
+    """
+    if _sendmmsg is None:
+        raise OSError(errno.ENOSYS, "sendmmsg is not available")
+
+    count = len(batch) - start
+    messages = bytearray(count * _MMSGHDR_STRUCT.size)
+    iovecs = bytearray(count * _IOVEC_STRUCT.size)
+    # The buffers are kept pinned until the call returns.
+    pinned: List[Any] = []
+    pinned_iovecs, iovecs_address = _address_of(iovecs)
+
+    pack_message = _MMSGHDR_STRUCT.pack_into
+    pack_iovec = _IOVEC_STRUCT.pack_into
+    for i in range(count):
+        address, packet = batch[start + i]
+        if not isinstance(packet, bytearray):
+            packet = bytearray(packet)
+        pinned_packet, packet_address = _address_of(packet)
+        _, sockaddr_address = _sockaddr_in(address)
+        pinned.append(pinned_packet)
+
+        iovec_address = iovecs_address + i * _IOVEC_STRUCT.size
+        pack_iovec(iovecs, i * _IOVEC_STRUCT.size, packet_address, len(packet))
+        pack_message(
+            messages,
+            i * _MMSGHDR_STRUCT.size,
+            sockaddr_address,
+            SOCKADDR_IN_LEN,
+            iovec_address,
+            1,
+            0,
+            0,
+            0,
+            0,
+        )
+
+    pinned_messages, messages_address = _address_of(messages)
+    sent = _sendmmsg(sock.fileno(), messages_address, count, 0)
+    del pinned_messages, pinned_iovecs, pinned
+    if sent < 0:
+        error = ctypes.get_errno()
+        raise OSError(error, errno.errorcode.get(error, "sendmmsg failed"))
+    return sent
+
+
+class SendEngine:
+    """
+    Sends the packets of each update cycle to the neighbouring routers.
+
+    The address of each neighbour's port is resolved once, when it's added
+    from the config file. Each cycle's packets are then sent together, in a
+    tight loop of `sendto` calls, or with a single `sendmmsg` call if
+    `use_sendmmsg` is set. Over loopback the loop is faster, as `sendmmsg` has
+    to be called through ctypes. Sends which fail because the socket's buffer
+    is full are retried.
+
+    Instance variables:
+
+    addresses -- The resolved address of each port, in the form of
+    `{[key: port]: (host, port)}`.
+
+    cycles -- The number of cycles which have been sent.
+
+    packets -- The number of packets which have been sent.
+
+    retries -- The number of sends which were retried, due to `EAGAIN` or
+    `ENOBUFS`.
+
+    dropped -- The number of packets which couldn't be sent.
+
+    last_latency -- The time taken to send the last cycle, in seconds.
+
+    max_latency -- The longest time taken to send a cycle, in seconds.
+    """
+
+    addresses: Dict[int, Address]
+
+    def __init__(self, use_sendmmsg: bool = False):
+        self._use_sendmmsg = False
+        self.use_sendmmsg = use_sendmmsg
+        self.addresses = {}
+        self.cycles = 0
+        self.packets = 0
+        self.retries = 0
+        self.dropped = 0
+        self.last_latency = 0.0
+        self.max_latency = 0.0
+        self._lock = Lock()
+
+    @property
+    def use_sendmmsg(self) -> bool:
+        """
+        Whether packets are sent with `sendmmsg`. This is always `False` where
+        the platform doesn't support it.
+        """
+        return self._use_sendmmsg
+
+    @use_sendmmsg.setter
+    def use_sendmmsg(self, value: bool) -> None:
+        self._use_sendmmsg = value and _sendmmsg is not None
+
+    def __str__(self):
+        return (
+            f"{self.cycles} cycles, {self.packets} packets, "
+            f"{self.retries} retries, {self.dropped} dropped, "
+            f"last {self.last_latency * 1000:.3f} ms, "
+            f"max {self.max_latency * 1000:.3f} ms"
+        )
+
+    def resolve(self, port: int) -> Address:
+        """Returns the address of the given port, resolving it only once."""
+        address = self.addresses.get(port)
+        if address is None:
+            info = getaddrinfo(NEIGHBOUR_HOST, port, AF_INET, SOCK_DGRAM)
+            # An `AF_INET` address is a `(host, port)` tuple.
+            address = (str(info[0][4][0]), port)
+            self.addresses[port] = address
+        return address
+
+    def _wait_writable(self, sock: Any) -> None:
+        if isinstance(sock, socket):
+            select([], [sock], [], RETRY_WAIT)
+
+    def _send_loop(
+        self, sock: Any, batch: List[Tuple[Address, bytearray]]
+    ) -> Tuple[int, int, int]:
+        sent = retries = dropped = 0
+        for address, packet in batch:
+            for attempt in range(MAX_RETRIES + 1):
+                try:
+                    sock.sendto(packet, address)
+                    sent += 1
+                    break
+                except OSError as ex:
+                    if ex.errno not in RETRY_ERRNOS or attempt == MAX_RETRIES:
+                        dropped += 1
+                        break
+                    retries += 1
+                    self._wait_writable(sock)
+        return sent, retries, dropped
+
+    def _send_mmsg(
+        self, sock: socket, batch: List[Tuple[Address, bytearray]]
+    ) -> Tuple[int, int, int]:
+        sent = retries = dropped = 0
+        attempts = 0
+        while sent + dropped < len(batch):
+            try:
+                sent += sendmmsg(sock, batch, sent + dropped)
+                attempts = 0
+            except OSError as ex:
+                if ex.errno in RETRY_ERRNOS and attempts < MAX_RETRIES:
+                    attempts += 1
+                    retries += 1
+                    self._wait_writable(sock)
+                else:
+                    # Skips the packet which couldn't be sent.
+                    attempts = 0
+                    dropped += 1
+        return sent, retries, dropped
+
+    def send(
+        self, sock: Output, packets: Sequence[Tuple[int, bytearray]]
+    ) -> int:
+        """
+        Sends one cycle of packets, where `packets` is a sequence of
+        `(port, packet)` tuples. `sock` can be a socket, or any other
+        `Output`, such as an asyncio transport.
+
+        Returns the number of packets which were sent.
+        """
+        if len(packets) == 0:
+            return 0
+
+        batch = [(self.resolve(port), packet) for port, packet in packets]
+        start = perf_counter()
+        if self.use_sendmmsg and isinstance(sock, socket):
+            sent, retries, dropped = self._send_mmsg(sock, batch)
+        else:
+            sent, retries, dropped = self._send_loop(sock, batch)
+        latency = perf_counter() - start
+
+        with self._lock:
+            self.cycles += 1
+            self.packets += sent
+            self.retries += retries
+            self.dropped += dropped
+            self.last_latency = latency
+            self.max_latency = max(self.max_latency, latency)
+
+        logger("Send engine: ", self, is_debug=True)
+        return sent
@@ -0,0 +1,79 @@
+import errno
+from socket import AF_INET, SOCK_DGRAM, socket
+from unittest import TestCase, main, skipIf
+from unittest.mock import Mock
+
+import sendengine
+from sendengine import SendEngine
+
+
+class TestSendEngine(TestCase):
+    def setUp(self):
+        self.inputs = []
+        for _ in range(2):
+            sock = socket(AF_INET, SOCK_DGRAM)
+            sock.bind(("localhost", 0))
+            sock.settimeout(1)
+            self.inputs.append(sock)
+        self.ports = [sock.getsockname()[1] for sock in self.inputs]
+        self.output = socket(AF_INET, SOCK_DGRAM)
+
+    def tearDown(self):
+        for sock in self.inputs + [self.output]:
+            sock.close()
+
+    def _check_received(self):
+        self.assertEqual(self.inputs[0].recv(1024), b"first")
+        self.assertEqual(self.inputs[1].recv(1024), b"second")
+        self.assertEqual(self.inputs[0].recv(1024), b"third")
+
+    def _packets(self):
+        return [
+            (self.ports[0], bytearray(b"first")),
+            (self.ports[1], bytearray(b"second")),
+            (self.ports[0], bytearray(b"third")),
+        ]
+
+    def test_addresses_are_resolved_once(self):
+        engine = SendEngine()
+        address = engine.resolve(self.ports[0])
+
+        self.assertEqual(address, ("127.0.0.1", self.ports[0]))
+        self.assertIs(engine.resolve(self.ports[0]), address)
+
+    @skipIf(sendengine._sendmmsg is None, "sendmmsg is not available")
+    def test_sendmmsg(self):
+        engine = SendEngine(use_sendmmsg=True)
+        self.assertTrue(engine.use_sendmmsg)
+
+        self.assertEqual(engine.send(self.output, self._packets()), 3)
+
+        self._check_received()
+        self.assertEqual((engine.cycles, engine.packets), (1, 3))
+
+    def test_send_loop(self):
+        engine = SendEngine()
+
+        self.assertEqual(engine.send(self.output, self._packets()), 3)
+
+        self._check_received()
+        self.assertEqual((engine.cycles, engine.packets), (1, 3))
+
+    def test_retries(self):
+        engine = SendEngine()
+        transport = Mock()
+        transport.sendto.side_effect = [
+            OSError(errno.ENOBUFS, "No buffer space available"),
+            None,
+            OSError(errno.EINVAL, "Invalid argument"),
+        ]
+
+        sent = engine.send(transport, self._packets()[:2])
+
+        self.assertEqual(sent, 1)
+        self.assertEqual(engine.retries, 1)
+        self.assertEqual(engine.dropped, 1)
+
+
+if __name__ == "__main__":
+    main()
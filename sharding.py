@@ -0,0 +1,531 @@
+#########################################################
+#
+# Spreads a router's route processing across worker
+# processes, so that a router with a very large routing
+# table can use more than one core.
+#
+# The destination router ids are partitioned into shards,
+# and each shard is owned by a worker process, with its
+# own `RoutingTable`. A worker processes the entries for
+# the destinations it owns, and runs their timeouts and
+# garbage collection. The coordinator, which is the
+# router's own process, receives the packets, splits
+# their entries by shard, and sends each worker its
+# entries. Each worker encodes the entries of the routes
+# it owns, and the coordinator merges these fragments
+# into whole packets, which it sends to the neighbours.
+#
+# Every worker also keeps the routes to the neighbours
+# themselves, as an entry's metric is the sum of its own
+# metric and the cost of the route to its sender. The
+# entries for a neighbour's id are sent to every worker,
+# so that each one finds the same route to the neighbour,
+# even when it's cheaper to reach the neighbour through
+# another router. Only the shard which owns a neighbour's
+# id sends its route.
+#
+#########################################################
+
+import multiprocessing
+import selectors
+from multiprocessing.connection import Connection
+from socket import socket
+from struct import error as StructError
+from typing import Any, Container, Dict, Iterable, List, Optional, Tuple
+
+from input_processing import MAX_BATCH, RECV_BUFFER_SIZE, process_packet
+from output_processing import deletion_process
+from packet import (
+    ENTRY_LEN,
+    ENTRY_STRUCT,
+    HEADER_LEN,
+    HEADER_STRUCT,
+    MAX_ENTRIES,
+    ResponseEntry,
+    ResponsePacket,
+    construct_fragment,
+    merge_fragments,
+)
+from routerbase import logger
+from routingtable import RoutingTable
+from sendengine import NullOutput
+from timers import SCHEDULED_UPDATE, TRIGGERED_UPDATE, UPDATE_TIMERS, clock
+from topology import Config
+
+# Messages between the coordinator and the workers
+PACKETS = "packets"  # To a worker: the entries of received packets
+UPDATE = "update"  # Both ways: the fragments of a regular update
+TRIGGERED = "triggered"  # From a worker: the fragments of a triggered update
+ROUTES = "routes"  # Both ways: the routes which a worker owns
+STOP = "stop"  # To a worker: exits
+
+# The number of seconds the coordinator waits for the workers to stop.
+STOP_TIMEOUT = 5.0
+
+# The number of seconds between checks that a worker which hasn't replied yet
+# is still running.
+REPLY_POLL_INTERVAL = 1.0
+
+# A received packet, as it's sent to a worker:
+# `(command, version, sender_router_id, port, [(afi, router_id, metric)])`.
+ShardPacket = Tuple[int, int, int, int, List[Tuple[int, int, int]]]
+
+# The encoded entries for each neighbour, keyed by the neighbour's router id.
+Fragments = Dict[int, bytes]
+
+
+class ShardError(RuntimeError):
+    """
+    Raised when a worker process has stopped.
+    """
+
+
+def shard_of(router_id: int, count: int) -> int:
+    """
+    Returns the shard which owns the `router_id`. Router ids are dealt out in
+    turn, so the shards stay balanced however the ids in use are clustered.
+    """
+    return router_id % count
+
+
+def split_packet(
+    data: memoryview, port: int, count: int, neighbours: Container[int]
+) -> Optional[List[ShardPacket]]:
+    """
+    Decodes a received packet, and splits its entries by the shard which owns
+    each entry's destination. Every shard gets the packet's header, even if
+    none of its entries are for that shard, as each shard keeps the route to
+    the sender. For the same reason, every shard gets the entries for the
+    `neighbours`.
+
+    Returns a packet for each shard, or `None` if the packet is truncated.
+    """
+    try:
+        command, version, sender = HEADER_STRUCT.unpack_from(data)
+    except StructError:
+        return None
+
+    entries: List[List[Tuple[int, int, int]]] = [[] for _ in range(count)]
+    count_entries = min((len(data) - HEADER_LEN) // ENTRY_LEN, MAX_ENTRIES)
+    end = HEADER_LEN + max(count_entries, 0) * ENTRY_LEN
+    for entry in ENTRY_STRUCT.iter_unpack(data[HEADER_LEN:end]):
+        if entry[1] in neighbours:
+            for shard_entries in entries:
+                shard_entries.append(entry)
+        else:
+            entries[shard_of(entry[1], count)].append(entry)
+    return [
+        (command, version, sender, port, shard_entries)
+        for shard_entries in entries
+    ]
+
+
+class Shard:
+    """
+    The slice of the routing table owned by a single worker.
+
+    The worker's table doesn't schedule its own regular updates, as they're
+    sent by the coordinator for every shard at once. It does keep the time of
+    the next one, so that triggered updates are still suppressed when the
+    regular update will be sent first.
+
+    Instance variables:
+
+    index -- The shard's position among the shards.
+
+    count -- The number of shards.
+
+    table -- The shard's routes, and the routes to the neighbours.
+    """
+
+    def __init__(
+        self,
+        index: int,
+        count: int,
+        table: RoutingTable,
+        sched_update_time: int,
+    ):
+        self.index = index
+        self.count = count
+        self.table = table
+        # Updates are only sent by the coordinator, so anything a worker's
+        # table sends is dropped.
+        self._output = NullOutput()
+        table.timers.cancel(SCHEDULED_UPDATE)
+        table.sched_update_time = sched_update_time
+
+    def owns(self, router_id: int) -> bool:
+        return shard_of(router_id, self.count) == self.index
+
+    def receive(self, packets: Iterable[ShardPacket]) -> None:
+        """Processes the entries of received packets."""
+        for command, version, sender, port, entries in packets:
+            packet = ResponsePacket(
+                command,
+                version,
+                sender,
+                [ResponseEntry(*entry) for entry in entries],
+            )
+            process_packet(self.table, packet, port, self._output)
+        self.table.actor.drain()
+
+    def fragments(
+        self, router_ids: Optional[Iterable[int]] = None
+    ) -> Fragments:
+        """
+        Encodes the owned routes for each neighbour, with split horizon and
+        poisoned reverse.
+
+        Keyword arguments:
+
+        router_ids -- Only these routes are encoded, such as the changed
+        routes for a triggered update. Defaults to the entire table.
+        """
+        table = self.table
+        candidates = table.snapshot() if router_ids is None else router_ids
+        owned = [router_id for router_id in candidates if self.owns(router_id)]
+        return {
+            neighbour: construct_fragment(table, neighbour, owned)
+            for neighbour in table.config_table
+            if neighbour in table
+        }
+
+    def process_timers(self) -> Optional[Fragments]:
+        """
+        Processes the timers which are due.
+
+        Returns the fragments of a triggered update, if one is due.
+        """
+        table = self.table
+        table.actor.drain()
+        deletion_process(table, self._output)
+        fragments = None
+        for kind, _ in table.timers.pop_due(clock.now(), UPDATE_TIMERS):
+            if kind == TRIGGERED_UPDATE:
+                table.triggered_updates.mark_sent(clock.now())
+                changed = table.take_flagged()
+                if changed:
+                    fragments = self.fragments(changed)
+        return fragments
+
+    def update(self, sched_update_time: int) -> Fragments:
+        """
+        Encodes every owned route for the regular update, which makes any
+        pending triggered update redundant.
+
+        Keyword arguments:
+
+        sched_update_time -- The time of the following regular update.
+        """
+        table = self.table
+        table.triggered_updates.suppress()
+        table.take_flagged()
+        table.sched_update_time = sched_update_time
+        return self.fragments()
+
+    def routes(self) -> Dict[int, Tuple[int, int]]:
+        """Returns the `(metric, next_hop)` of every owned route."""
+        return {
+            router_id: (entry.metric, entry.next_hop)
+            for router_id, entry in self.table.snapshot().items()
+            if self.owns(router_id)
+        }
+
+
+def run_shard(
+    conn: Connection,
+    index: int,
+    count: int,
+    config: Config,
+    sched_update_time: int,
+    store: str,
+):
+    """
+    Main body of a worker process. It blocks waiting for messages from the
+    coordinator until the next timer is due, in the same way as the router's
+    daemon waits for packets.
+    """
+    # Imported here, as the router imports this module to run sharded.
+    from router import create_table
+
+    router_id, _, output_ports, timers = config
+    table = create_table(router_id, [], output_ports, timers, store)
+    shard = Shard(index, count, table, sched_update_time)
+    clock.tick()
+    while True:
+        ready = conn.poll(table.timers.wait_time(clock.now()))
+        clock.tick()
+        if ready:
+            kind, value = conn.recv()
+            if kind == STOP:
+                break
+            elif kind == PACKETS:
+                shard.receive(value)
+            elif kind == UPDATE:
+                conn.send((UPDATE, shard.update(value)))
+            elif kind == ROUTES:
+                conn.send((ROUTES, shard.routes()))
+        fragments = shard.process_timers()
+        if fragments is not None:
+            conn.send((TRIGGERED, fragments))
+    conn.close()
+
+
+class ShardedRouter:
+    """
+    The coordinator of a router whose routes are spread across worker
+    processes.
+
+    The coordinator's own table holds the config, the regular update timer
+    and the `sender`, but no routes.
+
+    Instance variables:
+
+    table -- The coordinator's table.
+
+    sockets -- The input sockets. The first is also the output socket.
+
+    count -- The number of shards, each with its own worker process.
+
+    store -- How each worker stores its routes.
+    """
+
+    def __init__(
+        self,
+        table: RoutingTable,
+        sockets: List[socket],
+        count: int,
+        config: Config,
+        store: str,
+    ):
+        if count < 1:
+            raise ValueError("There must be at least one shard")
+        self.table = table
+        self.sockets = sockets
+        self.count = count
+        self.config = config
+        self.store = store
+        self._buffer = bytearray(RECV_BUFFER_SIZE)
+        self._conns: List[Connection] = []
+        self._processes: List[Any] = []
+        self._selector: Optional[selectors.BaseSelector] = None
+
+    def start(self) -> None:
+        """Starts a worker process for each shard."""
+        # Workers are spawned, rather than forked, so they don't inherit the
+        # coordinator's threads or sockets.
+        context = multiprocessing.get_context("spawn")
+        for index in range(self.count):
+            conn, child = context.Pipe()
+            process = context.Process(
+                target=run_shard,
+                args=(
+                    child,
+                    index,
+                    self.count,
+                    self.config,
+                    self.table.sched_update_time,
+                    self.store,
+                ),
+                name=f"shard-{index}",
+                daemon=True,
+            )
+            process.start()
+            child.close()
+            self._conns.append(conn)
+            self._processes.append(process)
+
+        self._selector = selectors.DefaultSelector()
+        for sock in self.sockets:
+            _, port = sock.getsockname()
+            self._selector.register(sock, selectors.EVENT_READ, port)
+        for conn in self._conns:
+            self._selector.register(conn, selectors.EVENT_READ, None)
+        logger("Started ", self.count, " shards.")
+
+    def stop(self) -> None:
+        """Stops the worker processes."""
+        for conn in self._conns:
+            try:
+                conn.send((STOP, None))
+            except OSError:
+                pass
+        for process in self._processes:
+            process.join(STOP_TIMEOUT)
+            if process.is_alive():
+                process.terminate()
+        for conn in self._conns:
+            conn.close()
+        if self._selector is not None:
+            self._selector.close()
+            self._selector = None
+        self._conns = []
+        self._processes = []
+
+    def send(self, fragments: Iterable[Fragments], empty: bool) -> None:
+        """
+        Merges the fragments of every shard into packets for each neighbour,
+        and sends them.
+
+        Keyword arguments:
+
+        empty -- Sends an empty packet to a neighbour with no entries, as is
+        done for an empty routing table.
+        """
+        merged: Dict[int, List[bytes]] = {}
+        for shard_fragments in fragments:
+            for neighbour, fragment in shard_fragments.items():
+                merged.setdefault(neighbour, []).append(fragment)
+
+        packets: List[Tuple[int, bytearray]] = []
+        for neighbour, parts in merged.items():
+            config = self.table.config_table.get(neighbour)
+            if config is None:
+                continue
+            for packet in merge_fragments(self.table.router_id, parts, empty):
+                packets.append((config.port, packet))
+        if packets:
+            self.table.sender.send(self.sockets[0], packets)
+
+    def startup(self) -> None:
+        """Sends an empty packet to every neighbour, to announce the router."""
+        logger("Starting up...")
+        self.send(
+            [{neighbour: b"" for neighbour in self.table.config_table}], True
+        )
+
+    def _receive(self, sock: socket, port: int) -> List[List[ShardPacket]]:
+        """Receives the waiting packets from a socket, split by shard."""
+        batches: List[List[ShardPacket]] = [[] for _ in range(self.count)]
+        # A blocking socket can only be read once without blocking.
+        limit = MAX_BATCH if sock.gettimeout() == 0.0 else 1
+        view = memoryview(self._buffer)
+        for _ in range(limit):
+            try:
+                nbytes, _ = sock.recvfrom_into(self._buffer)
+            except BlockingIOError:
+                break
+            packets = split_packet(
+                view[:nbytes], port, self.count, self.table.config_table
+            )
+            if packets is None:
+                logger(
+                    "Ignored a truncated packet on port ", port, is_debug=True
+                )
+                continue
+            self.table.metrics.packets_received.inc()
+            for batch, packet in zip(batches, packets):
+                batch.append(packet)
+        return batches
+
+    def _handle(self, message: Tuple[str, Any]) -> None:
+        """Handles a message which a worker sent of its own accord."""
+        kind, value = message
+        if kind == TRIGGERED:
+            self.send([value], False)
+
+    def _recv(self, index: int) -> Tuple[str, Any]:
+        """
+        Receives the next message from a worker, waiting for as long as the
+        worker is running.
+
+        Raises a `ShardError` if the worker has stopped.
+        """
+        conn = self._conns[index]
+        process = self._processes[index]
+        while not conn.poll(REPLY_POLL_INTERVAL):
+            if not process.is_alive():
+                raise ShardError(f"Shard {index} has stopped")
+        try:
+            return conn.recv()
+        except EOFError:
+            # The worker closed its end of the pipe as it exited.
+            raise ShardError(f"Shard {index} has stopped")
+
+    def _request(self, kind: str, value: Any = None) -> List[Any]:
+        """
+        Sends a message to every worker, and waits for each of their replies.
+        Triggered updates which arrive in the meantime are sent as usual.
+
+        Raises a `ShardError` if a worker stops before it replies.
+        """
+        for index, conn in enumerate(self._conns):
+            try:
+                conn.send((kind, value))
+            except OSError:
+                raise ShardError(f"Shard {index} has stopped")
+        replies = []
+        for index in range(len(self._conns)):
+            while True:
+                message = self._recv(index)
+                if message[0] == kind:
+                    replies.append(message[1])
+                    break
+                self._handle(message)
+        return replies
+
+    def update(self) -> None:
+        """Sends the regular update, with the routes of every shard."""
+        now = clock.now()
+        self.table.update_sched_update_time(now)
+        self.send(self._request(UPDATE, self.table.sched_update_time), True)
+
+    def routes(self) -> Dict[int, Tuple[int, int]]:
+        """Returns the `(metric, next_hop)` of every route, from every shard."""
+        routes: Dict[int, Tuple[int, int]] = {}
+        for shard_routes in self._request(ROUTES):
+            routes.update(shard_routes)
+        return routes
+
+    def poll(self, timeout: float) -> None:
+        """
+        Waits for packets or messages from the workers, for up to `timeout`
+        seconds. The entries of every packet received are sent to the workers
+        with a single message each, and then any regular update which is due
+        is sent.
+        """
+        assert self._selector is not None
+        batches: List[List[ShardPacket]] = [[] for _ in range(self.count)]
+        events = self._selector.select(timeout)
+        clock.tick()
+        for key, _ in events:
+            if key.data is None:
+                index = self._conns.index(key.fileobj)  # type: ignore
+                self._handle(self._recv(index))
+                continue
+            received = self._receive(key.fileobj, key.data)  # type: ignore
+            for batch, packets in zip(batches, received):
+                batch.extend(packets)
+
+        for conn, batch in zip(self._conns, batches):
+            if batch:
+                conn.send((PACKETS, batch))
+
+        for kind, _ in self.table.timers.pop_due(clock.now(), UPDATE_TIMERS):
+            if kind == SCHEDULED_UPDATE:
+                self.update()
+
+    def serve(self) -> None:
+        """Main body of the router, when its routes are sharded."""
+        clock.tick()
+        while True:
+            self.poll(self.table.timers.wait_time(clock.now()))
+            self.table.metrics.loop_latency.observe(clock.elapsed())
+
+
+def run_sharded(
+    table: RoutingTable,
+    sockets: List[socket],
+    count: int,
+    config: Config,
+    store: str,
+) -> None:
+    """Runs the router with its routes spread across `count` processes."""
+    router = ShardedRouter(table, sockets, count, config, store)
+    router.start()
+    try:
+        router.startup()
+        router.serve()
+    finally:
+        logger("Stopping the shards.")
+        router.stop()
@@ -0,0 +1,259 @@
+from socket import AF_INET, SOCK_DGRAM, socket
+from typing import List
+from unittest import TestCase, main
+from unittest.mock import Mock, patch
+
+from input_processing import process_packet
+from packet import (
+    ENTRY_STRUCT,
+    HEADER_STRUCT,
+    merge_fragments,
+    read_packet,
+)
+from router import create_table
+from sharding import (
+    Shard,
+    ShardedRouter,
+    ShardError,
+    ShardPacket,
+    shard_of,
+    split_packet,
+)
+from timers import clock
+from validate_data import INFINITY
+
+TIMERS = [5, 30, 20]
+CONFIG = (1, [5021], [(5012, 1, 2), (5013, 3, 3)], TIMERS)
+NEIGHBOURS = (2, 3)
+
+
+def encode(sender: int, entries):
+    """Encodes a packet with the `(router_id, metric)` entries."""
+    packet = bytearray(HEADER_STRUCT.pack(2, 2, sender))
+    for router_id, metric in entries:
+        packet += ENTRY_STRUCT.pack(AF_INET, router_id, metric)
+    return packet
+
+
+def split(data, count: int) -> List[ShardPacket]:
+    """Splits a packet received by router 1, which mustn't be truncated."""
+    packets = split_packet(memoryview(data), 5012, count, NEIGHBOURS)
+    if packets is None:
+        raise AssertionError("The packet is truncated")
+    return packets
+
+
+def create_shards(count: int):
+    """
+    Creates the shards of router 1, which have each received the startup
+    packets of its neighbours.
+    """
+    shards = []
+    for index in range(count):
+        table = create_table(1, [], CONFIG[2], TIMERS)
+        shard = Shard(index, count, table, clock.now() + 10 ** 10)
+        shard.receive([(2, 2, 2, 5012, []), (2, 2, 3, 5013, [])])
+        shards.append(shard)
+    return shards
+
+
+class TestSplitPacket(TestCase):
+    def test_shard_of(self):
+        counts = [0] * 4
+        for router_id in range(1, 64001):
+            counts[shard_of(router_id, 4)] += 1
+        self.assertEqual(counts, [16000] * 4)
+
+    def test_entries_are_split(self):
+        packets = split(encode(2, [(4, 1), (5, 2), (6, 3)]), 2)
+
+        self.assertEqual(
+            packets,
+            [
+                (2, 2, 2, 5012, [(AF_INET, 4, 1), (AF_INET, 6, 3)]),
+                (2, 2, 2, 5012, [(AF_INET, 5, 2)]),
+            ],
+        )
+
+    def test_header_reaches_every_shard(self):
+        packets = split(encode(2, [(4, 1)]), 3)
+        self.assertEqual([packet[2] for packet in packets], [2, 2, 2])
+        self.assertEqual([len(packet[4]) for packet in packets], [0, 1, 0])
+
+    def test_neighbours_reach_every_shard(self):
+        packets = split(encode(2, [(3, 1), (4, 1)]), 2)
+
+        self.assertEqual(
+            [packet[4] for packet in packets],
+            [[(AF_INET, 3, 1), (AF_INET, 4, 1)], [(AF_INET, 3, 1)]],
+        )
+
+    def test_truncated(self):
+        self.assertIsNone(
+            split_packet(memoryview(b"\x02\x02"), 5012, 2, NEIGHBOURS)
+        )
+
+
+@patch("input_processing.logger")
+class TestShard(TestCase):
+    def setUp(self):
+        clock.tick()
+
+    def receive(self, shards, sender, entries):
+        packets = split(encode(sender, entries), len(shards))
+        for shard, packet in zip(shards, packets):
+            shard.receive([packet])
+
+    def test_routes_are_owned(self, logger):
+        shards = create_shards(2)
+        self.receive(shards, 2, [(4, 1), (5, 2), (6, 3)])
+
+        self.assertEqual(
+            shards[0].routes(), {2: (1, 2), 4: (2, 2), 6: (4, 2)}
+        )
+        self.assertEqual(shards[1].routes(), {3: (3, 3), 5: (3, 2)})
+        # Every shard keeps the route to the neighbour.
+        self.assertIn(2, shards[1].table)
+
+    def test_matches_unsharded(self, logger):
+        # Router 3 is cheaper to reach through router 2, at a cost of 2, than
+        # directly, at a cost of 3.
+        packets = [(2, [(3, 1)]), (3, [(4, 1)])]
+        table = create_table(1, [], CONFIG[2], TIMERS)
+        for sender, entries in [(2, []), (3, [])] + packets:
+            packet = read_packet(encode(sender, entries))
+            process_packet(table, packet, 5012, Mock())
+        table.actor.drain()
+
+        for count in (2, 3):
+            with self.subTest(count=count):
+                shards = create_shards(count)
+                for sender, entries in packets:
+                    self.receive(shards, sender, entries)
+
+                routes = {}
+                for shard in shards:
+                    routes.update(shard.routes())
+                self.assertEqual(
+                    routes,
+                    {
+                        router_id: (entry.metric, entry.next_hop)
+                        for router_id, entry in table.snapshot().items()
+                    },
+                )
+                self.assertEqual(routes[4], (3, 3))
+
+    def test_merged_update(self, logger):
+        shards = create_shards(2)
+        self.receive(shards, 2, [(router_id, 1) for router_id in range(4, 29)])
+        self.receive(shards, 2, [(router_id, 1) for router_id in range(29, 40)])
+        self.receive(shards, 3, [(40, 1)])
+
+        fragments = [shard.update(clock.now()) for shard in shards]
+        packets = merge_fragments(
+            1, [shard_fragments[3] for shard_fragments in fragments]
+        )
+
+        entries = [
+            entry
+            for packet in packets
+            for entry in read_packet(packet).entries
+        ]
+        self.assertEqual(len(packets), 2)
+        self.assertEqual(
+            sorted(entry.router_id for entry in entries), list(range(2, 41))
+        )
+        # The route to 40 was learned from 3, so it's poisoned.
+        metrics = {entry.router_id: entry.metric for entry in entries}
+        self.assertEqual(metrics[40], INFINITY)
+        self.assertEqual(metrics[5], 2)
+
+    @patch("output_processing.logger")
+    def test_triggered_update(self, *loggers):
+        shards = create_shards(2)
+        self.receive(shards, 2, [(4, 1), (5, 1)])
+        for shard in shards:
+            shard.update(clock.now() + 10 ** 12)
+
+        self.receive(shards, 2, [(5, INFINITY)])
+        for shard in shards:
+            self.assertIsNone(shard.process_timers())
+        clock.set(clock.now() + 10 ** 10)
+
+        self.assertIsNone(shards[0].process_timers())
+        fragments = shards[1].process_timers()
+        packets = merge_fragments(1, [fragments[3]], empty=False)
+        self.assertEqual(
+            read_packet(packets[0]).entries, [(AF_INET, 5, INFINITY)]
+        )
+
+
+@patch("sharding.logger")
+class TestShardedRouter(TestCase):
+    def setUp(self):
+        clock.tick()
+        self.input = socket(AF_INET, SOCK_DGRAM)
+        self.input.bind(("127.0.0.1", 0))
+        self.neighbour = socket(AF_INET, SOCK_DGRAM)
+        self.neighbour.bind(("127.0.0.1", 0))
+        self.neighbour.settimeout(5)
+        neighbour_port = self.neighbour.getsockname()[1]
+        output_ports = [(neighbour_port, 1, 2), (5013, 3, 3)]
+        self.config = (1, [self.input.getsockname()[1]], output_ports, TIMERS)
+        self.table = create_table(1, [], output_ports, TIMERS)
+        self.router = ShardedRouter(
+            self.table, [self.input], 2, self.config, "dict"
+        )
+        self.router.start()
+
+    def tearDown(self):
+        self.router.stop()
+        self.input.close()
+        self.neighbour.close()
+
+    def test_routes_are_shared_out(self, logger):
+        self.router.startup()
+        startup = read_packet(self.neighbour.recv(1024))
+        self.assertEqual(startup.entries, [])
+
+        # The entries of the first packet from a neighbour are ignored, as
+        # the neighbour isn't known yet.
+        for packet in (encode(2, []), encode(2, [(4, 1), (5, 2), (6, 3)])):
+            self.neighbour.sendto(packet, self.input.getsockname())
+            self.router.poll(5)
+
+        self.assertEqual(
+            self.router.routes(), {2: (1, 2), 4: (2, 2), 5: (3, 2), 6: (4, 2)}
+        )
+
+        self.router.update()
+        update = read_packet(self.neighbour.recv(1024))
+        self.assertEqual(
+            sorted(update.entries),
+            # Every route is through the neighbour, so they're all poisoned.
+            [(AF_INET, router_id, INFINITY) for router_id in (2, 4, 5, 6)],
+        )
+
+    def test_stopped_worker(self, logger):
+        process = self.router._processes[1]
+        process.kill()
+        process.join()
+
+        with self.assertRaises(ShardError):
+            self.router.routes()
+
+    def test_worker_which_stops_without_closing(self, logger):
+        router = ShardedRouter(self.table, [self.input], 1, self.config, "dict")
+        router._conns = [Mock(**{"poll.return_value": False})]
+        router._processes = [Mock(**{"is_alive.return_value": False})]
+
+        with self.assertRaises(ShardError):
+            router.routes()
+
+    def test_at_least_one_shard(self, logger):
+        with self.assertRaises(ValueError):
+            ShardedRouter(self.table, [self.input], 0, self.config, "dict")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+#########################################################
+#
+# Saves the routing table to a file, so that a restarted
+# router can restore its routes instead of starting with
+# an empty table.
+#
+# The file starts with a header:
+#
+#     magic (4 bytes), version (2), entry length (2), router_id (4), count (4),
+#     saved at (8)
+#
+# which is followed by `count` fixed size entries:
+#
+#     router_id (4), next_hop (4), port (2), metric (1), padding (1),
+#     remaining timeout (8)
+#
+# Every field is big-endian. The time the file was saved
+# at is a wall clock `time.time_ns()` timestamp, as
+# monotonic timestamps aren't comparable across restarts.
+# Each route's timeout is saved as the number of
+# nanoseconds it had left, and the time the router was
+# down for is taken off it when it's restored. Only
+# reachable routes are saved.
+#
+# The file is written and read through `mmap`, and the
+# entries are decoded together with `Struct.iter_unpack`.
+#
+#########################################################
+
+import mmap
+import os
+from struct import Struct
+from time import time_ns
+from typing import List, Optional, Tuple
+
+import routerbase
+from routeentry import RouteEntry
+from routerbase import logger
+from routingtable import RoutingTable
+from timers import clock, seconds
+from validate_data import INFINITY
+
+MAGIC = b"RIPS"
+
+# The version of the file format, which is increased whenever the layout
+# changes. Files of other versions aren't restored.
+SNAPSHOT_VERSION = 1
+
+HEADER_STRUCT = Struct("!4sHHIIq")
+ENTRY_STRUCT = Struct("!IiHBxq")
+
+# The default number of seconds between periodic snapshots.
+SNAPSHOT_INTERVAL = 30.0
+
+
+def save_snapshot(table: RoutingTable, path: str) -> int:
+    """
+    Writes the reachable routes to the file. The file is replaced in one
+    step, so a router which crashes while it's being written leaves the
+    previous snapshot behind.
+
+    Returns the number of routes which were saved.
+    """
+    now = clock.now()
+    routes = [
+        (router_id, entry)
+        for router_id, entry in table.snapshot().items()
+        if entry.gc_time is None and entry.metric < INFINITY
+    ]
+    size = HEADER_STRUCT.size + len(routes) * ENTRY_STRUCT.size
+
+    temporary = path + ".tmp"
+    with open(temporary, "wb+") as f:
+        f.truncate(size)
+        with mmap.mmap(f.fileno(), size) as view:
+            HEADER_STRUCT.pack_into(
+                view,
+                0,
+                MAGIC,
+                SNAPSHOT_VERSION,
+                ENTRY_STRUCT.size,
+                table.router_id,
+                len(routes),
+                time_ns(),
+            )
+            offset = HEADER_STRUCT.size
+            for router_id, entry in routes:
+                ENTRY_STRUCT.pack_into(
+                    view,
+                    offset,
+                    router_id,
+                    entry.next_hop,
+                    entry.port,
+                    entry.metric,
+                    max(entry.timeout_time - now, 0),
+                )
+                offset += ENTRY_STRUCT.size
+            view.flush()
+    os.replace(temporary, path)
+    return len(routes)
+
+
+def restore_snapshot(table: RoutingTable, path: str) -> int:
+    """
+    Adds the routes from the file to the table, if their timeouts haven't
+    expired while the router was down. Routes through a neighbour which is no
+    longer in the config are skipped, and the port of each route is taken
+    from the current config. Restored routes aren't flagged, so they don't
+    cause a triggered update. A route to a neighbour which was learned from
+    the neighbour itself gets its cost from the current config.
+
+    Raises a `ValueError` if the file isn't a snapshot of this router in the
+    current format.
+
+    Returns the number of routes which were restored.
+    """
+    with open(path, "rb") as f, mmap.mmap(
+        f.fileno(), 0, access=mmap.ACCESS_READ
+    ) as view:
+        if len(view) < HEADER_STRUCT.size:
+            raise ValueError("The snapshot is truncated")
+        (
+            magic,
+            version,
+            entry_len,
+            router_id,
+            count,
+            saved_at,
+        ) = HEADER_STRUCT.unpack_from(view)
+        if magic != MAGIC:
+            raise ValueError("The file isn't a routing table snapshot")
+        if version != SNAPSHOT_VERSION or entry_len != ENTRY_STRUCT.size:
+            raise ValueError(f"Unsupported snapshot version {version}")
+        if router_id != table.router_id:
+            raise ValueError(f"The snapshot is of router {router_id}")
+        end = HEADER_STRUCT.size + count * ENTRY_STRUCT.size
+        if len(view) != end:
+            raise ValueError("The snapshot is truncated")
+
+        downtime = max(time_ns() - saved_at, 0)
+        now = clock.now()
+        routes: List[Tuple[int, RouteEntry]] = []
+        with memoryview(view) as entries:
+            for (
+                router_id,
+                next_hop,
+                _,
+                metric,
+                remaining,
+            ) in ENTRY_STRUCT.iter_unpack(entries[HEADER_STRUCT.size : end]):
+                remaining -= downtime
+                config = table.config_table.get(next_hop)
+                if (
+                    remaining <= 0
+                    or config is None
+                    or router_id == table.router_id
+                    or metric >= INFINITY
+                ):
+                    continue
+                if router_id == next_hop:
+                    # The cost of the link may have changed while the router
+                    # was down. Packets from the neighbour only ever lower the
+                    # metric of the route to it, so a stale metric would stay.
+                    metric = config.cost
+                entry = RouteEntry(config.port, metric, 0, next_hop, now)
+                entry.timeout_time = now + remaining
+                routes.append((router_id, entry))
+    table.add_routes(routes)
+    return len(routes)
+
+
+class SnapshotWriter:
+    """
+    Saves the routing table every `interval` seconds. It's driven by the
+    daemon's loop, which is the only thread that changes the table, so a
+    snapshot never contains a route which is half changed.
+
+    Instance variables:
+
+    path -- The file the snapshots are written to.
+
+    next_time -- The time at which the next snapshot is due.
+    """
+
+    def __init__(self, path: str, interval: float = SNAPSHOT_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self.next_time: Optional[int] = None
+
+    def process(self, table: RoutingTable) -> bool:
+        """
+        Saves the table if a snapshot is due.
+
+        Returns `True` if the table was saved.
+        """
+        now = clock.now()
+        if self.next_time is None:
+            self.next_time = now + seconds(self.interval)
+            return False
+        if now < self.next_time:
+            return False
+        self.next_time = now + seconds(self.interval)
+        self.save(table)
+        return True
+
+    def restore(self, table: RoutingTable) -> int:
+        """
+        Restores the table from the last snapshot, if there is one. A snapshot
+        which can't be restored is logged, and the router starts with an
+        empty table instead.
+
+        Returns the number of routes which were restored.
+        """
+        if not os.path.exists(self.path):
+            return 0
+        try:
+            count = restore_snapshot(table, self.path)
+        except (OSError, ValueError) as ex:
+            logger(
+                f"Couldn't restore the snapshot {self.path}: {ex}",
+                level=routerbase.WARNING,
+            )
+            return 0
+        logger("Restored ", count, " routes from ", self.path)
+        return count
+
+    def save(self, table: RoutingTable) -> None:
+        """Saves the table, and logs rather than raises any error."""
+        try:
+            count = save_snapshot(table, self.path)
+        except OSError as ex:
+            logger(
+                f"Couldn't write the snapshot to {self.path}: {ex}",
+                level=routerbase.WARNING,
+            )
+            return
+        logger("Saved ", count, " routes to ", self.path, is_debug=True)
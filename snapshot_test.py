@@ -0,0 +1,184 @@
+import os
+from tempfile import TemporaryDirectory
+from unittest import TestCase, main
+from unittest.mock import patch
+
+from routeentry import RouteEntry
+from router import create_snapshot_writer, create_table, get_params
+from snapshot import (
+    HEADER_STRUCT,
+    SnapshotWriter,
+    restore_snapshot,
+    save_snapshot,
+)
+from timers import clock, seconds
+from validate_data import INFINITY
+
+TIMERS = [5, 30, 20]
+OUTPUT_PORTS = [(5012, 1, 2), (5013, 3, 3)]
+
+
+def create_router():
+    table = create_table(1, [], OUTPUT_PORTS, TIMERS)
+    table.add_route(2, RouteEntry(5012, 1, 30, 2))
+    table.add_route(3, RouteEntry(5013, 3, 10, 3))
+    table.add_route(4, RouteEntry(5012, 2, 30, 2))
+    table.add_route(5, RouteEntry(5013, 5, 30, 3))
+    return table
+
+
+class TestSnapshot(TestCase):
+    def setUp(self):
+        clock.tick()
+        self.directory = TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "router.snapshot")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def restore(self, downtime: float = 0.0, output_ports=OUTPUT_PORTS):
+        table = create_table(1, [], output_ports, TIMERS)
+        with open(self.path, "rb") as f:
+            saved_at = HEADER_STRUCT.unpack_from(f.read())[-1]
+        now = saved_at + seconds(downtime)
+        with patch("snapshot.time_ns", return_value=now):
+            count = restore_snapshot(table, self.path)
+        return table, count
+
+    def test_round_trip(self):
+        table = create_router()
+        self.assertEqual(save_snapshot(table, self.path), 4)
+
+        restored, count = self.restore()
+
+        self.assertEqual(count, 4)
+        for router_id, entry in table.snapshot().items():
+            copy = restored[router_id]
+            self.assertEqual(
+                (copy.port, copy.metric, copy.next_hop, copy.timeout_time),
+                (entry.port, entry.metric, entry.next_hop, entry.timeout_time),
+            )
+            self.assertFalse(copy.flag)
+        self.assertEqual(restored.take_flagged(), [])
+
+    def test_downtime_is_taken_off(self):
+        save_snapshot(create_router(), self.path)
+
+        restored, count = self.restore(downtime=20)
+
+        # The route to 3 only had 10 seconds left.
+        self.assertEqual(count, 3)
+        self.assertNotIn(3, restored)
+        self.assertEqual(restored[2].timeout_time, clock.now() + seconds(10))
+
+    def test_unreachable_routes_are_not_saved(self):
+        table = create_router()
+        table[4].metric = INFINITY
+        table.start_garbage_collection(5)
+
+        self.assertEqual(save_snapshot(table, self.path), 2)
+
+    def test_removed_neighbour(self):
+        save_snapshot(create_router(), self.path)
+
+        restored, count = self.restore(output_ports=[(5014, 1, 2)])
+
+        self.assertEqual(count, 2)
+        self.assertEqual(set(restored.snapshot()), {2, 4})
+        # The port comes from the current config.
+        self.assertEqual(restored[4].port, 5014)
+
+    def test_direct_route_cost_is_from_config(self):
+        save_snapshot(create_router(), self.path)
+
+        # The link to router 2 now costs 4, rather than 1.
+        restored, _ = self.restore(output_ports=[(5012, 4, 2), (5013, 3, 3)])
+
+        self.assertEqual(restored[2].metric, 4)
+        self.assertEqual(restored[3].metric, 3)
+        # Routes through the neighbour are corrected by its next packet.
+        self.assertEqual(restored[4].metric, 2)
+
+    def test_rejected(self):
+        save_snapshot(create_router(), self.path)
+        with open(self.path, "rb") as f:
+            data = f.read()
+
+        cases = {
+            "magic": b"XXXX" + data[4:],
+            "version": data[:4] + b"\x00\x09" + data[6:],
+            "router": data[:8] + (7).to_bytes(4, "big") + data[12:],
+            "truncated": data[:-1],
+            "header": data[:10],
+        }
+        for name, contents in cases.items():
+            with self.subTest(name):
+                with open(self.path, "wb") as f:
+                    f.write(contents)
+                table = create_table(1, [], OUTPUT_PORTS, TIMERS)
+                with self.assertRaises(ValueError):
+                    restore_snapshot(table, self.path)
+                self.assertEqual(len(table), 0)
+
+
+@patch("snapshot.logger")
+class TestSnapshotWriter(TestCase):
+    def setUp(self):
+        clock.tick()
+        self.directory = TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "router.snapshot")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_periodic(self, logger):
+        writer = SnapshotWriter(self.path, 30)
+        table = create_router()
+
+        self.assertFalse(writer.process(table))
+        clock.set(clock.now() + seconds(29))
+        self.assertFalse(writer.process(table))
+        clock.set(clock.now() + seconds(1))
+        self.assertTrue(writer.process(table))
+        self.assertTrue(os.path.exists(self.path))
+
+    def test_restore(self, logger):
+        writer = SnapshotWriter(self.path)
+        table = create_table(1, [], OUTPUT_PORTS, TIMERS)
+        self.assertEqual(writer.restore(table), 0)
+
+        writer.save(create_router())
+        self.assertEqual(writer.restore(table), 4)
+
+    def test_invalid_snapshot_is_logged(self, logger):
+        with open(self.path, "wb") as f:
+            f.write(b"not a snapshot")
+        writer = SnapshotWriter(self.path)
+
+        self.assertEqual(writer.restore(create_router()), 0)
+        self.assertIn("Couldn't restore", logger.call_args[0][0])
+
+
+class TestSnapshotOptions(TestCase):
+    def test_mixed_case_path(self):
+        argv = ["router.py", "config.txt", "Snapshot=/tmp/MySnap.bin"]
+        with patch("sys.argv", argv):
+            _, options = get_params()
+
+        writer = create_snapshot_writer(options)
+
+        self.assertEqual(getattr(writer, "path", None), "/tmp/MySnap.bin")
+
+    @patch("routerbase.logger")
+    def test_ignored_with_host_or_shards(self, logger):
+        for options in (
+            {"snapshot=router.snapshot", "shards=2"},
+            {"snapshot=router.snapshot", "host"},
+        ):
+            with self.subTest(options=options):
+                self.assertIsNone(create_snapshot_writer(options))
+                self.assertIn("ignored", logger.call_args[0][0])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+from queue import Empty, SimpleQueue
+from typing import Any, Callable, Tuple
+
+
+class TableActor:
+    """
+    Queues commands against a `RoutingTable`, which are applied later by the
+    thread which runs the daemon's loop, whenever it calls `drain`.
+
+    This defers changes which mustn't be made part way through processing a
+    packet, such as starting the deletion process of a route whose metric has
+    just become infinite. The commands are applied in the order they were
+    submitted. `submit` is safe to call from any thread.
+
+    Instance variables:
+
+    table -- The routing table that the commands are applied to.
+
+    applied -- The number of commands which have been applied.
+    """
+
+    def __init__(self, table: Any):
+        self.table = table
+        self.applied = 0
+        self._queue: SimpleQueue = SimpleQueue()
+
+    def __len__(self):
+        """Returns the number of commands waiting to be applied."""
+        return self._queue.qsize()
+
+    def submit(self, command: Callable[..., Any], *args: Any) -> None:
+        """Queues `command(table, *args)`, to be applied by the next `drain`."""
+        self._queue.put((command, args))
+
+    def drain(self) -> int:
+        """
+        Applies the commands which are queued, in the order they were
+        submitted. Commands submitted while draining are left for the next
+        call. This must only be called by the thread which runs the daemon's
+        loop.
+
+        Returns the number of commands which were applied.
+        """
+        applied = 0
+        for _ in range(self._queue.qsize()):
+            try:
+                command: Tuple[Callable[..., Any], Tuple[Any, ...]]
+                command = self._queue.get_nowait()
+            except Empty:
+                break
+            fn, args = command
+            fn(self.table, *args)
+            applied += 1
+
+        self.applied += applied
+        return applied
@@ -0,0 +1,51 @@
+from threading import Thread
+from unittest import TestCase, main
+
+from routeentry import RouteEntry
+from routingtable import RoutingTable
+
+
+def add(table: RoutingTable, router_id: int, metric: int):
+    table.add_route(router_id, RouteEntry(0, metric, 180, router_id))
+
+
+class TestTableActor(TestCase):
+    def setUp(self):
+        self.table = RoutingTable(1, 30, 180, 120)
+
+    def test_commands_are_applied_on_drain(self):
+        self.table.actor.submit(add, 2, 1)
+        self.table.actor.submit(add, 2, 5)
+
+        self.assertNotIn(2, self.table)
+        self.assertEqual(self.table.actor.drain(), 2)
+        self.assertEqual(self.table[2].metric, 5)
+        self.assertEqual(len(self.table.actor), 0)
+
+    def test_submit_from_other_threads(self):
+        threads = [
+            Thread(target=self.table.actor.submit, args=(add, i, 1))
+            for i in range(2, 12)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.table.actor.drain()
+        self.assertEqual(sorted(self.table), list(range(2, 12)))
+
+    def test_commands_submitted_while_draining_wait(self):
+        def resubmit(table: RoutingTable):
+            table.actor.submit(add, 3, 1)
+
+        self.table.actor.submit(resubmit)
+
+        self.assertEqual(self.table.actor.drain(), 1)
+        self.assertNotIn(3, self.table)
+        self.assertEqual(self.table.actor.drain(), 1)
+        self.assertIn(3, self.table)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+from time import monotonic
+from typing import Any, Dict, List, Optional, Tuple
+
+import routerbase
+from routerbase import logger
+
+# Rendering modes
+ALWAYS = "always"  # Prints the entire table every time
+ON_CHANGE = "change"  # Prints the entire table, only if a route has changed
+DIFF = "diff"  # Prints only the added, changed and removed rows
+MODES = (ALWAYS, ON_CHANGE, DIFF)
+
+
+def _row_key(entry: Any) -> Tuple[Any, ...]:
+    """Returns everything which is displayed in the row of a `RouteEntry`."""
+    return (
+        entry.port,
+        entry.next_hop,
+        entry.metric,
+        entry.flag,
+        getattr(entry, "timeout_time", None),
+        getattr(entry, "gc_time", None),
+        routerbase.DEBUG_MODE,
+    )
+
+
+def _content_key(row_key: Tuple[Any, ...]) -> Tuple[Any, ...]:
+    """
+    Returns the parts of a row's key which count as a change to the route.
+    Refreshing a route's timeout isn't a change.
+    """
+    port, next_hop, metric, flag, _, gc_time, _ = row_key
+    return (port, next_hop, metric, flag, gc_time is None)
+
+
+class TableRenderer:
+    """
+    Renders the routing table for printing.
+
+    The formatted row of each route is cached, and a row is only formatted
+    again once its `RouteEntry` has changed. How often the table is printed
+    is controlled by the `mode` and `interval`.
+
+    Instance variables:
+
+    mode -- One of `ALWAYS`, `ON_CHANGE` or `DIFF`.
+
+    interval -- The minimum number of seconds between prints. Tables which
+    would have been printed sooner are skipped.
+
+    formatted -- The number of rows which have been formatted.
+    """
+
+    def __init__(self, mode: str = ALWAYS, interval: float = 0.0):
+        if mode not in MODES:
+            raise ValueError(f"Unknown rendering mode {mode}")
+        self.mode = mode
+        self.interval = interval
+        self.formatted = 0
+        self._rows: Dict[int, Tuple[Tuple[Any, ...], str]] = {}
+        self._printed: Dict[int, Tuple[Tuple[Any, ...], str]] = {}
+        self._last_print: Optional[float] = None
+
+    def rows(self, table: Any) -> Dict[int, Tuple[Tuple[Any, ...], str]]:
+        """
+        Returns the key and formatted row of every route in the table, in the
+        form of `{[key: router_id]: (key, row)}`. Only the rows of routes which
+        have changed since the last call are formatted.
+        """
+        rows: Dict[int, Tuple[Tuple[Any, ...], str]] = {}
+        for router_id, entry in table.snapshot().items():
+            key = _row_key(entry)
+            cached = self._rows.get(router_id)
+            if cached is None or cached[0] != key:
+                cached = (key, table._str_entry(router_id, entry))
+                self.formatted += 1
+            rows[router_id] = cached
+
+        self._rows = rows
+        return rows
+
+    def _with_headers(self, table: Any, lines: List[str]) -> str:
+        if not lines:
+            return "Empty table"
+        return table._str_headers(table.router_id) + "".join(lines)
+
+    def render(self, table: Any) -> str:
+        """Returns the string representation of the entire table."""
+        rows = self.rows(table)
+        return self._with_headers(table, [row for _, row in rows.values()])
+
+    def render_diff(self, table: Any) -> Optional[str]:
+        """
+        Returns the rows of the routes which have been added, changed or
+        removed since the table was last printed, prefixed with `+`, `~` and `-`
+        respectively. Returns `None` if nothing has changed.
+        """
+        rows = self.rows(table)
+        lines: List[str] = []
+        for router_id, (key, row) in rows.items():
+            printed = self._printed.get(router_id)
+            if printed is None:
+                lines.append("+ " + row)
+            elif _content_key(printed[0]) != _content_key(key):
+                lines.append("~ " + row)
+
+        for router_id, (_, row) in self._printed.items():
+            if router_id not in rows:
+                lines.append("- " + row)
+
+        if not lines:
+            return None
+        return table._str_headers(table.router_id) + "".join(lines)
+
+    def _has_changed(self, rows: Dict[int, Tuple[Tuple[Any, ...], str]]):
+        if rows.keys() != self._printed.keys():
+            return True
+        for router_id, (key, _) in rows.items():
+            if _content_key(self._printed[router_id][0]) != _content_key(key):
+                return True
+        return False
+
+    def log(self, table: Any, now: Optional[float] = None) -> bool:
+        """
+        Prints the table, if the `mode` and `interval` allow it.
+
+        Returns a Boolean indicating whether anything was printed.
+
+        Keyword arguments:
+
+        now -- The current `time.monotonic()`. Defaults to calling it.
+        """
+        now = monotonic() if now is None else now
+        if (
+            self._last_print is not None
+            and now - self._last_print < self.interval
+        ):
+            return False
+
+        if self.mode == DIFF:
+            output = self.render_diff(table)
+        elif self.mode == ON_CHANGE:
+            rows = self.rows(table)
+            output = None
+            if self._has_changed(rows):
+                output = self._with_headers(
+                    table, [row for _, row in rows.values()]
+                )
+        else:
+            output = self.render(table)
+
+        if output is None:
+            return False
+
+        self._printed = self._rows
+        self._last_print = now
+        logger(output)
+        return True
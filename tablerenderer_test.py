@@ -0,0 +1,77 @@
+from unittest import TestCase, main
+from unittest.mock import patch
+
+from routeentry import RouteEntry
+from routingtable import RoutingTable
+from tablerenderer import DIFF, ON_CHANGE, TableRenderer
+
+
+def printed(logger) -> str:
+    return logger.call_args[0][0]
+
+
+@patch("tablerenderer.logger")
+class TestTableRenderer(TestCase):
+    def setUp(self):
+        self.table = RoutingTable(1, 30, 180, 120)
+        for router_id in range(2, 5):
+            self.table.add_route(router_id, RouteEntry(0, 1, 180, 2))
+
+    def test_only_changed_rows_are_formatted(self, logger):
+        renderer = self.table.renderer
+        str(self.table)
+        self.assertEqual(renderer.formatted, 3)
+
+        str(self.table)
+        self.assertEqual(renderer.formatted, 3)
+
+        self.table[3].metric = 4
+        output = str(self.table)
+        self.assertEqual(renderer.formatted, 4)
+        self.assertIn("| 1       | 3         | 0    | 2        | 4 ", output)
+
+    def test_interval(self, logger):
+        renderer = TableRenderer(interval=5)
+
+        self.assertTrue(renderer.log(self.table, now=100))
+        self.assertFalse(renderer.log(self.table, now=104))
+        self.assertTrue(renderer.log(self.table, now=105))
+        self.assertEqual(logger.call_count, 2)
+
+    def test_on_change(self, logger):
+        renderer = TableRenderer(ON_CHANGE)
+
+        self.assertTrue(renderer.log(self.table))
+        self.assertFalse(renderer.log(self.table))
+
+        # Refreshing the timeout isn't a change.
+        self.table[2].update_timeout_time(self.table.timeout_delta)
+        self.assertFalse(renderer.log(self.table))
+
+        self.table[2].metric = 16
+        self.assertTrue(renderer.log(self.table))
+
+    def test_diff(self, logger):
+        renderer = TableRenderer(DIFF)
+        renderer.log(self.table)
+        self.assertEqual(printed(logger).count("\n+ "), 3)
+
+        self.table[2].metric = 16
+        del self.table[3]
+        self.table.add_route(5, RouteEntry(0, 1, 180, 2))
+        self.assertTrue(renderer.log(self.table))
+
+        lines = printed(logger).splitlines()[2:]
+        self.assertEqual([line[:2] for line in lines], ["~ ", "+ ", "- "])
+        self.assertIn("| 2 ", lines[0])
+        self.assertIn("| 5 ", lines[1])
+        self.assertIn("| 3 ", lines[2])
+
+        self.assertFalse(renderer.log(self.table))
+
+    def test_empty_table(self, logger):
+        self.assertEqual(str(RoutingTable(1, 30, 180, 120)), "Empty table")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+from datetime import datetime
+from heapq import heapify, heappop, heappush
+from time import monotonic_ns, time_ns
+from typing import Dict, Hashable, Iterable, List, NamedTuple, Optional, Tuple
+
+# Kinds of timers which are tracked by the `TimerQueue`.
+ROUTE_TIMEOUT = "timeout"
+GARBAGE_COLLECTION = "gc"
+SCHEDULED_UPDATE = "update"
+TRIGGERED_UPDATE = "triggered"
+
+ROUTE_TIMERS = (ROUTE_TIMEOUT, GARBAGE_COLLECTION)
+UPDATE_TIMERS = (SCHEDULED_UPDATE, TRIGGERED_UPDATE)
+
+# The longest that the router will block waiting for packets, in seconds.
+MAX_WAIT_TIME = 1.0
+
+NANOSECONDS = 1_000_000_000
+
+
+def seconds(delta: float) -> int:
+    """Converts a number of seconds into nanoseconds."""
+    return int(delta * NANOSECONDS)
+
+
+def to_seconds(delta: int) -> float:
+    """Converts a number of nanoseconds into seconds."""
+    return delta / NANOSECONDS
+
+
+def wall_clock(timestamp: int) -> datetime:
+    """
+    Returns the wall clock time of a `time.monotonic_ns()` timestamp. This is
+    only for display, as the wall clock can jump.
+    """
+    offset = time_ns() - monotonic_ns()
+    return datetime.fromtimestamp((timestamp + offset) / NANOSECONDS)
+
+
+class Clock:
+    """
+    The clock that every protocol timer is measured against.
+
+    Times are `time.monotonic_ns()` integers, which are cheap to create and
+    compare, and don't jump when the wall clock is changed. The daemons call
+    `tick` once per iteration of their loop, and everything processed in that
+    iteration shares the same `now`.
+    """
+
+    def __init__(self):
+        self._now: Optional[int] = None
+
+    def tick(self) -> int:
+        """Reads the clock, and caches the result as `now`."""
+        self._now = monotonic_ns()
+        return self._now
+
+    def set(self, now: int) -> None:
+        """Sets `now` without reading the clock, such as in a simulation."""
+        self._now = now
+
+    def now(self) -> int:
+        """
+        Returns the time cached by the last `tick`, or reads the clock if it
+        hasn't ticked yet.
+        """
+        if self._now is None:
+            return monotonic_ns()
+        return self._now
+
+    def elapsed(self) -> float:
+        """Returns the number of seconds since the last `tick`."""
+        return to_seconds(monotonic_ns() - self.now())
+
+
+clock = Clock()
+
+
+class Timer(NamedTuple):
+    deadline: int
+    seq: int
+    kind: str
+    key: Hashable
+
+
+class TimerQueue:
+    """
+    Deadline-ordered queue of the route timeout, garbage collection, scheduled
+    update and triggered update timers.
+
+    Each `(kind, key)` pair has at most one pending deadline. Rescheduling a
+    pair replaces its deadline, and cancelling it removes it. Replaced and
+    cancelled timers are left inside the heap, and are discarded when they
+    reach the top of it.
+
+    Instance variables:
+
+    pending -- The current deadline for each `(kind, key)` pair, in the form of
+    `{[key: (kind, key)]: deadline}`, where each deadline is a
+    `time.monotonic_ns()` timestamp.
+    """
+
+    pending: Dict[Tuple[str, Hashable], int]
+
+    def __init__(self):
+        self._heap: List[Timer] = []
+        self._seq = 0
+        self.pending = {}
+
+    def __len__(self):
+        """Returns the number of pending timers."""
+        return len(self.pending)
+
+    def __contains__(self, kind_key: Tuple[str, Hashable]) -> bool:
+        """Checks to see if the given `(kind, key)` pair is pending."""
+        return kind_key in self.pending
+
+    def schedule(
+        self, kind: str, deadline: int, key: Hashable = None
+    ) -> None:
+        """
+        Schedules the timer identified by `kind` and `key` to fire at
+        `deadline`, replacing any deadline that it already had.
+        """
+        if self.pending.get((kind, key)) == deadline:
+            return
+        self.pending[(kind, key)] = deadline
+        self._seq += 1
+        heappush(self._heap, Timer(deadline, self._seq, kind, key))
+
+    def schedule_many(
+        self, kind: str, deadlines: Iterable[Tuple[int, Hashable]]
+    ) -> None:
+        """
+        Schedules many timers of the same `kind` at once, given as
+        `(deadline, key)` pairs. The heap is rebuilt once, rather than pushed
+        to for each timer.
+        """
+        pending = self.pending
+        for deadline, key in deadlines:
+            if pending.get((kind, key)) == deadline:
+                continue
+            pending[(kind, key)] = deadline
+            self._seq += 1
+            self._heap.append(Timer(deadline, self._seq, kind, key))
+        heapify(self._heap)
+
+    def cancel(self, kind: str, key: Hashable = None) -> None:
+        """Cancels the timer identified by `kind` and `key`, if it exists."""
+        self.pending.pop((kind, key), None)
+
+    def _is_live(self, timer: Timer) -> bool:
+        return self.pending.get((timer.kind, timer.key)) == timer.deadline
+
+    def _discard_stale(self) -> None:
+        while self._heap and not self._is_live(self._heap[0]):
+            heappop(self._heap)
+
+    def next_deadline(self) -> Optional[int]:
+        """Returns the earliest pending deadline, or `None`."""
+        self._discard_stale()
+        if self._heap:
+            return self._heap[0].deadline
+        return None
+
+    def wait_time(self, now: int, maximum: float = MAX_WAIT_TIME) -> float:
+        """
+        Returns the number of seconds until the next timer is due, capped at
+        `maximum`. This is how long the router can block waiting for packets.
+        """
+        deadline = self.next_deadline()
+        if deadline is None:
+            return maximum
+        remaining = to_seconds(deadline - now)
+        return min(max(remaining, 0.0), maximum)
+
+    def pop_due(
+        self, now: int, kinds: Optional[Iterable[str]] = None
+    ) -> List[Tuple[str, Hashable]]:
+        """
+        Removes and returns the `(kind, key)` pairs of the timers which are due
+        at `now`, in deadline order.
+
+        Keyword arguments:
+
+        kinds -- Only timers of these kinds are returned. Due timers of other
+        kinds are left pending. Defaults to every kind.
+        """
+        wanted = None if kinds is None else set(kinds)
+        due: List[Tuple[str, Hashable]] = []
+        skipped: List[Timer] = []
+
+        while self._heap and self._heap[0].deadline <= now:
+            timer = heappop(self._heap)
+            if not self._is_live(timer):
+                continue
+            if wanted is not None and timer.kind not in wanted:
+                skipped.append(timer)
+                continue
+            del self.pending[(timer.kind, timer.key)]
+            due.append((timer.kind, timer.key))
+
+        for timer in skipped:
+            heappush(self._heap, timer)
+
+        return due
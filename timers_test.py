@@ -0,0 +1,101 @@
+from datetime import datetime, timedelta
+from time import monotonic_ns
+from unittest import TestCase, main
+
+from timers import (
+    GARBAGE_COLLECTION,
+    ROUTE_TIMEOUT,
+    SCHEDULED_UPDATE,
+    Clock,
+    TimerQueue,
+    seconds,
+    wall_clock,
+)
+
+
+class TestTimerQueue(TestCase):
+    def setUp(self):
+        self.now = monotonic_ns()
+        self.timers = TimerQueue()
+
+    def test_pop_due_in_deadline_order(self):
+        self.timers.schedule(ROUTE_TIMEOUT, self.now, 2)
+        self.timers.schedule(ROUTE_TIMEOUT, self.now - seconds(1), 1)
+        self.timers.schedule(ROUTE_TIMEOUT, self.now + seconds(1), 3)
+
+        due = self.timers.pop_due(self.now)
+
+        self.assertEqual(due, [(ROUTE_TIMEOUT, 1), (ROUTE_TIMEOUT, 2)])
+        self.assertEqual(len(self.timers), 1)
+
+    def test_reschedule_replaces_deadline(self):
+        self.timers.schedule(ROUTE_TIMEOUT, self.now, 1)
+        self.timers.schedule(ROUTE_TIMEOUT, self.now + seconds(5), 1)
+
+        self.assertEqual(self.timers.pop_due(self.now), [])
+        self.assertEqual(
+            self.timers.next_deadline(), self.now + seconds(5)
+        )
+
+    def test_schedule_many(self):
+        self.timers.schedule(ROUTE_TIMEOUT, self.now, 1)
+        self.timers.schedule_many(
+            ROUTE_TIMEOUT,
+            [(self.now - seconds(1), 2), (self.now + seconds(1), 3)],
+        )
+
+        due = self.timers.pop_due(self.now)
+
+        self.assertEqual(due, [(ROUTE_TIMEOUT, 2), (ROUTE_TIMEOUT, 1)])
+        self.assertEqual(self.timers.next_deadline(), self.now + seconds(1))
+
+    def test_cancel(self):
+        self.timers.schedule(GARBAGE_COLLECTION, self.now, 1)
+        self.timers.cancel(GARBAGE_COLLECTION, 1)
+
+        self.assertEqual(self.timers.pop_due(self.now), [])
+        self.assertIsNone(self.timers.next_deadline())
+
+    def test_pop_due_kinds(self):
+        self.timers.schedule(SCHEDULED_UPDATE, self.now)
+        self.timers.schedule(ROUTE_TIMEOUT, self.now, 1)
+
+        self.assertEqual(
+            self.timers.pop_due(self.now, [ROUTE_TIMEOUT]),
+            [(ROUTE_TIMEOUT, 1)],
+        )
+        self.assertEqual(
+            self.timers.pop_due(self.now), [(SCHEDULED_UPDATE, None)]
+        )
+
+    def test_wait_time(self):
+        self.assertEqual(self.timers.wait_time(self.now, 1.0), 1.0)
+
+        self.timers.schedule(ROUTE_TIMEOUT, self.now + seconds(0.25))
+        self.assertAlmostEqual(self.timers.wait_time(self.now, 1.0), 0.25)
+
+        self.timers.schedule(ROUTE_TIMEOUT, self.now - seconds(3))
+        self.assertEqual(self.timers.wait_time(self.now, 1.0), 0.0)
+
+
+class TestClock(TestCase):
+    def test_now_is_cached_until_tick(self):
+        clock = Clock()
+        now = clock.tick()
+
+        self.assertEqual(clock.now(), now)
+        self.assertIsInstance(now, int)
+        self.assertGreaterEqual(clock.tick(), now)
+
+    def test_wall_clock(self):
+        later = wall_clock(monotonic_ns() + seconds(60))
+
+        self.assertAlmostEqual(
+            later - datetime.now(),
+            timedelta(seconds=60),
+            delta=timedelta(seconds=1),
+        )
+
+
+if __name__ == "__main__":
+    main()
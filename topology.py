@@ -0,0 +1,339 @@
+#########################################################
+#
+# Reads and writes topology files, which describe every
+# router of a network in a single file, instead of in a
+# config file per router.
+#
+# Each router is described on its own line, with the same
+# fields as a config file:
+#
+#     router 1 input 1030 output 3001-8-3 timers 11, 66, 44
+#
+# `input` is the router's input ports, and `output` is
+# its outputs, as `port-cost-router_id`. `timers` may be
+# left out, in which case the timers of the last `timers`
+# line before the router are used:
+#
+#     timers 5, 30, 20
+#     router 3 input 3001 output 1030-8-1
+#
+# Blank lines, and everything after a `#`, are ignored.
+#
+# The file is read and validated in a single pass. Each
+# router is checked as it's read, with the same rules as
+# `validate_data`, and then the routers are checked
+# against each other. Input ports used by more than one
+# router, and outputs to a port which belongs to a
+# different router than the one named, are errors. Links
+# whose costs differ in each direction, and outputs with
+# no matching output back, are warnings.
+#
+#########################################################
+
+import sys
+from typing import Dict, Iterable, List, Optional, TextIO, Tuple
+
+import routerbase
+from routerbase import logger
+from validate_data import config_error
+
+# The extension of topology files.
+TOPOLOGY_EXTENSION = ".topo"
+
+# The fields of a router's line.
+ROUTER = "router"
+INPUT = "input"
+OUTPUT = "output"
+TIMERS = "timers"
+FIELDS = (ROUTER, INPUT, OUTPUT, TIMERS)
+
+Config = Tuple[int, List[int], List[Tuple[int, int, int]], List[int]]
+
+
+class TopologyError(ValueError):
+    """
+    Raised when a topology file is invalid.
+
+    Instance variables:
+
+    errors -- Every error which was found, each with the line it was found
+    on.
+    """
+
+    def __init__(self, source: str, errors: List[str]):
+        super().__init__(
+            f"{source} has {len(errors)} error(s):\n" + "\n".join(errors)
+        )
+        self.errors = errors
+
+
+def _split_fields(line: str) -> Dict[str, str]:
+    """
+    Splits a line into its fields. Raises a `ValueError` if a field is given
+    twice, or the line doesn't start with a field.
+    """
+    fields: Dict[str, str] = {}
+    name: Optional[str] = None
+    values: List[str] = []
+    for token in line.split():
+        if token in FIELDS:
+            if name is not None:
+                fields[name] = " ".join(values)
+            if token in fields:
+                raise ValueError(f"{token} is given more than once")
+            name, values = token, []
+        elif name is None:
+            raise ValueError(f"unknown field {token}")
+        else:
+            values.append(token)
+    if name is not None:
+        fields[name] = " ".join(values)
+    return fields
+
+
+def _ints(value: str) -> List[int]:
+    return [int(item) for item in value.split(",") if item.strip()]
+
+
+def _parse_outputs(value: str) -> List[Tuple[int, int, int]]:
+    outputs = []
+    for item in value.split(","):
+        if not item.strip():
+            continue
+        port, cost, router_id = item.strip().split("-")
+        outputs.append((int(port), int(cost), int(router_id)))
+    return outputs
+
+
+def check_router(config: Config) -> Optional[str]:
+    """
+    Checks a single router with the same rules as `validate_data`.
+
+    Returns the reason the router is invalid, or `None` if it's valid.
+    """
+    error = config_error(*config)
+    return error[1] if error is not None else None
+
+
+def check_links(
+    configs: List[Config], lines: Optional[Dict[int, int]] = None
+) -> Tuple[List[str], List[str]]:
+    """
+    Checks the routers against each other.
+
+    Returns the errors and the warnings. Input ports which are used by more
+    than one router are errors, as are outputs to a port which belongs to a
+    different router than the one named. Links with a different cost in each
+    direction, and outputs which aren't matched by an output back, are
+    warnings.
+
+    Keyword arguments:
+
+    lines -- The line of each router, by `router_id`, for the messages.
+    """
+    lines = lines if lines is not None else {}
+    errors: List[str] = []
+    warnings: List[str] = []
+
+    def where(router_id: int) -> str:
+        line = lines.get(router_id)
+        prefix = f"line {line}: " if line is not None else ""
+        return f"{prefix}router {router_id}"
+
+    owners: Dict[int, int] = {}
+    for router_id, input_ports, _, _ in configs:
+        for port in input_ports:
+            owner = owners.setdefault(port, router_id)
+            if owner != router_id:
+                errors.append(
+                    f"{where(router_id)}: input port {port} is already used "
+                    f"by router {owner}"
+                )
+
+    costs: Dict[Tuple[int, int], int] = {}
+    for router_id, _, output_ports, _ in configs:
+        for port, cost, neighbour in output_ports:
+            owner = owners.get(port)
+            if owner is not None and owner != neighbour:
+                errors.append(
+                    f"{where(router_id)}: output port {port} belongs to "
+                    f"router {owner}, not router {neighbour}"
+                )
+            costs[(router_id, neighbour)] = cost
+
+    for (router_id, neighbour), cost in costs.items():
+        back = costs.get((neighbour, router_id))
+        if back is None:
+            warnings.append(
+                f"{where(router_id)}: router {neighbour} has no output back"
+            )
+        elif back != cost and router_id < neighbour:
+            warnings.append(
+                f"{where(router_id)}: the link to router {neighbour} costs "
+                f"{cost} one way and {back} the other"
+            )
+    return errors, warnings
+
+
+def parse_topology(
+    lines: Iterable[str], source: str = "<topology>"
+) -> List[Config]:
+    """
+    Parses and validates a topology, one line at a time.
+
+    Returns the `(router_id, input_ports, output_ports, timers)` of each
+    router, in the order they were given. Raises a `TopologyError` listing
+    every error, if there are any. Warnings are logged.
+    """
+    configs: List[Config] = []
+    router_lines: Dict[int, int] = {}
+    errors: List[str] = []
+    default_timers: Optional[List[int]] = None
+
+    for number, line in enumerate(lines, 1):
+        line = line.split("#", 1)[0]
+        if not line.strip():
+            continue
+        try:
+            fields = _split_fields(line)
+            if ROUTER not in fields:
+                if set(fields) != {TIMERS}:
+                    raise ValueError("expected a router or timers line")
+                default_timers = _ints(fields[TIMERS])
+                continue
+
+            router_id = int(fields[ROUTER])
+            timers = (
+                _ints(fields[TIMERS]) if TIMERS in fields else default_timers
+            )
+            if timers is None:
+                raise ValueError("no timers were given")
+            config = (
+                router_id,
+                _ints(fields.get(INPUT, "")),
+                _parse_outputs(fields.get(OUTPUT, "")),
+                list(timers),
+            )
+        except ValueError as ex:
+            errors.append(f"line {number}: {ex}")
+            continue
+
+        if router_id in router_lines:
+            errors.append(
+                f"line {number}: router {router_id} was already given on "
+                f"line {router_lines[router_id]}"
+            )
+            continue
+        reason = check_router(config)
+        if reason is not None:
+            errors.append(f"line {number}: router {router_id}: {reason}")
+            continue
+        router_lines[router_id] = number
+        configs.append(config)
+
+    link_errors, warnings = check_links(configs, router_lines)
+    errors.extend(link_errors)
+    if errors:
+        raise TopologyError(source, errors)
+    for warning in warnings:
+        logger(f"{source}: {warning}", level=routerbase.WARNING)
+    return configs
+
+
+def read_topology(filename: str) -> List[Config]:
+    """Reads and validates a topology file. See `parse_topology`."""
+    with open(filename) as f:
+        return parse_topology(f, filename)
+
+
+def find_router(configs: List[Config], router_id: int) -> Config:
+    """Returns the router with the `router_id`, or raises a `ValueError`."""
+    for config in configs:
+        if config[0] == router_id:
+            return config
+    raise ValueError(f"Router {router_id} isn't in the topology")
+
+
+def single_socket(config: Config) -> Config:
+    """
+    Returns the config of a router which only binds its first input port, and
+    receives the packets of every neighbour on it. The neighbours are told
+    apart by the router id in each packet's header.
+    """
+    router_id, input_ports, output_ports, timers = config
+    return (router_id, input_ports[:1], output_ports, timers)
+
+
+def to_single_socket(configs: Iterable[Config]) -> List[Config]:
+    """
+    Rewrites a topology so that each router has a single input port, and
+    every neighbour sends to that port.
+    """
+    configs = list(configs)
+    ports = {config[0]: config[1][0] for config in configs if config[1]}
+    return [
+        (
+            router_id,
+            input_ports[:1],
+            [
+                (ports.get(neighbour, port), cost, neighbour)
+                for port, cost, neighbour in output_ports
+            ],
+            timers,
+        )
+        for router_id, input_ports, output_ports, timers in configs
+    ]
+
+
+def format_router(config: Config) -> str:
+    """Returns the line which describes a router."""
+    router_id, input_ports, output_ports, timers = config
+    inputs = ", ".join(str(port) for port in input_ports)
+    outputs = ", ".join(
+        f"{port}-{cost}-{neighbour}" for port, cost, neighbour in output_ports
+    )
+    return (
+        f"{ROUTER} {router_id} {INPUT} {inputs} {OUTPUT} {outputs} "
+        f"{TIMERS} {', '.join(str(timer) for timer in timers)}"
+    )
+
+
+def write_topology(configs: Iterable[Config], f: TextIO) -> None:
+    """Writes a topology, with a line for each router."""
+    for config in configs:
+        f.write(format_router(config) + "\n")
+
+
+def main():
+    """
+    Converts a directory or a comma separated list of config files into a
+    topology file, which is written to stdout unless a filename is given.
+    With `single-socket`, each router is given a single input port, which
+    every one of its neighbours sends to.
+
+    Usage: python topology.py <config files> [filename] [single-socket]
+    """
+    if len(sys.argv) < 2:
+        logger(
+            "Please give the config files. Correct usage: python topology.py "
+            "<config files> [filename] [single-socket]",
+            level=routerbase.ERROR,
+        )
+        return
+    # Imported here, as the host imports this module to load topologies.
+    from routerhost import load_configs
+
+    configs = load_configs(sys.argv[1])
+    args = sys.argv[2:]
+    if "single-socket" in args:
+        args.remove("single-socket")
+        configs = to_single_socket(configs)
+    if args:
+        with open(args[0], "w") as f:
+            write_topology(configs, f)
+    else:
+        write_topology(configs, sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
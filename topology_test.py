@@ -0,0 +1,176 @@
+import io
+import os
+import tempfile
+from unittest import TestCase, main
+from unittest.mock import patch
+
+from routerhost import load_configs
+from topology import (
+    TopologyError,
+    check_router,
+    find_router,
+    main as topology_main,
+    parse_topology,
+    to_single_socket,
+    write_topology,
+)
+from validate_data import validate_data
+
+TIMERS = [5, 30, 20]
+
+TOPOLOGY = """
+# Test case 2
+timers 5, 30, 20
+router 1 input 5012 output 2021-1-2
+router 2 input 2021, 2023 output 5012-1-1, 3032-2-3  # two neighbours
+router 3 input 3032 output 2023-2-2 timers 10, 60, 40
+"""
+
+
+@patch("topology.logger")
+class TestParseTopology(TestCase):
+    def test_parse(self, logger):
+        configs = parse_topology(TOPOLOGY.splitlines())
+
+        self.assertEqual(
+            configs,
+            [
+                (1, [5012], [(2021, 1, 2)], [5, 30, 20]),
+                (2, [2021, 2023], [(5012, 1, 1), (3032, 2, 3)], [5, 30, 20]),
+                (3, [3032], [(2023, 2, 2)], [10, 60, 40]),
+            ],
+        )
+        logger.assert_not_called()
+
+    def test_round_trip(self, logger):
+        configs = parse_topology(TOPOLOGY.splitlines())
+        f = io.StringIO()
+
+        write_topology(configs, f)
+
+        self.assertEqual(parse_topology(f.getvalue().splitlines()), configs)
+
+    def test_errors_are_collected(self, logger):
+        lines = [
+            "timers 5, 30, 20",
+            "router 1 input 5012 output 2021-1-2",
+            "router 2 input 5012 output 5013-1-1",
+            "router 1 input 5014 output 2021-1-2",
+            "router 4 input 5015 output 5016-20-1",
+            "router 5 input 5017 output 5018-1",
+            "route 6",
+        ]
+
+        with self.assertRaises(TopologyError) as context:
+            parse_topology(lines, "test.topo")
+
+        errors = context.exception.errors
+        self.assertEqual(len(errors), 5)
+        self.assertTrue(errors[0].startswith("line 4: router 1 was already"))
+        self.assertTrue(errors[1].startswith("line 5: router 4: the cost"))
+        self.assertTrue(errors[2].startswith("line 6: "))
+        self.assertTrue(errors[3].startswith("line 7: unknown field"))
+        self.assertIn("input port 5012 is already used by router 1", errors[4])
+        self.assertIn("test.topo", str(context.exception))
+
+    def test_output_to_wrong_router(self, logger):
+        lines = [
+            "timers 5, 30, 20",
+            "router 1 input 5012 output 2021-1-3",
+            "router 2 input 2021 output 5012-1-1",
+        ]
+
+        with self.assertRaises(TopologyError) as context:
+            parse_topology(lines)
+
+        self.assertIn(
+            "output port 2021 belongs to router 2, not router 3",
+            context.exception.errors[0],
+        )
+
+    def test_asymmetric_costs_are_warned(self, logger):
+        lines = [
+            "timers 5, 30, 20",
+            "router 1 input 5012 output 2021-1-2, 3031-1-3",
+            "router 2 input 2021 output 5012-3-1",
+        ]
+
+        parse_topology(lines)
+
+        warnings = [call.args[0] for call in logger.call_args_list]
+        self.assertEqual(len(warnings), 2)
+        self.assertIn("costs 1 one way and 3 the other", warnings[0])
+        self.assertIn("router 3 has no output back", warnings[1])
+
+    def test_no_timers(self, logger):
+        with self.assertRaises(TopologyError):
+            parse_topology(["router 1 input 5012 output 2021-1-2"])
+
+    def test_usage(self, logger):
+        with patch("sys.argv", ["topology.py"]):
+            topology_main()
+
+        self.assertIn("Correct usage", logger.call_args[0][0])
+
+    def test_single_socket(self, logger):
+        configs = to_single_socket(parse_topology(TOPOLOGY.splitlines()))
+
+        self.assertEqual(
+            configs,
+            [
+                (1, [5012], [(2021, 1, 2)], [5, 30, 20]),
+                (2, [2021], [(5012, 1, 1), (3032, 2, 3)], [5, 30, 20]),
+                (3, [3032], [(2021, 2, 2)], [10, 60, 40]),
+            ],
+        )
+        f = io.StringIO()
+        write_topology(configs, f)
+        self.assertEqual(parse_topology(f.getvalue().splitlines()), configs)
+
+
+class TestCheckRouter(TestCase):
+    @patch("validate_data.logger")
+    def test_reasons(self, logger):
+        cases = [
+            (
+                (0, [5012], [(2021, 1, 2)], TIMERS),
+                "router id 0 is out of range",
+            ),
+            ((1, [], [(2021, 1, 2)], TIMERS), "there are no input ports"),
+            (
+                (1, [5012], [(2021, 17, 2)], TIMERS),
+                "the cost 17 to router 2 is out of range",
+            ),
+            ((1, [5012], [(5012, 1, 2)], TIMERS), "port 5012 is reused"),
+            (
+                (1, [5012], [(2021, 1, 2)], [5, 30, 30]),
+                "the timers must be in the ratio 1:6:4",
+            ),
+        ]
+        for config, reason in cases:
+            with self.subTest(reason):
+                self.assertEqual(check_router(config), reason)
+                # `validate_data` uses the same rules.
+                self.assertFalse(validate_data(*config))
+
+        self.assertIsNone(check_router((1, [5012], [(2021, 1, 2)], TIMERS)))
+
+
+@patch("topology.logger")
+class TestLoadTopology(TestCase):
+    def test_load_configs(self, logger):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "lab.topo")
+            with open(path, "w") as f:
+                f.write(TOPOLOGY)
+
+            configs = load_configs(path)
+
+        self.assertEqual([config[0] for config in configs], [1, 2, 3])
+        self.assertEqual(find_router(configs, 3)[1], [3032])
+        with self.assertRaises(ValueError):
+            find_router(configs, 4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+from random import randint
+from typing import Optional
+
+from timers import TRIGGERED_UPDATE, TimerQueue, seconds
+
+# The range of the random delay before a triggered update, in seconds.
+MIN_TRIGGERED_DELAY = 1
+MAX_TRIGGERED_DELAY = 5
+
+
+class TriggeredUpdateScheduler:
+    """
+    Schedules the triggered updates for a router, as per RFC 2453 section
+    3.10.1. There is at most one pending triggered update, which is a timer
+    inside the routing table's `TimerQueue`, so no thread has to wait for it.
+
+    A triggered update is sent 1 to 5 seconds after it's first requested, and
+    every change requested before then is coalesced into that single update.
+    After a triggered update is sent, the next one is held for a further 1 to
+    5 seconds.
+
+    Instance variables:
+
+    deadline -- The `time.monotonic_ns()` timestamp at which the pending
+    triggered update will be sent, or `None` if there isn't one.
+
+    hold_until -- The earliest time at which the next triggered update can be
+    sent.
+
+    requested -- The number of triggered updates which have been requested.
+
+    sent -- The number of triggered updates which have been sent.
+
+    coalesced -- The number of requests which joined an already pending
+    triggered update.
+
+    suppressed -- The number of requests and pending updates which were
+    dropped, because a regular update is sent first.
+    """
+
+    deadline: Optional[int] = None
+    hold_until: Optional[int] = None
+
+    def __init__(self, timers: TimerQueue):
+        self.timers = timers
+        self.requested = 0
+        self.sent = 0
+        self.coalesced = 0
+        self.suppressed = 0
+
+    def __str__(self):
+        return (
+            f"{self.requested} requested, {self.sent} sent, "
+            f"{self.coalesced} coalesced, {self.suppressed} suppressed"
+        )
+
+    def _delay(self) -> int:
+        return seconds(randint(MIN_TRIGGERED_DELAY, MAX_TRIGGERED_DELAY))
+
+    def request(self, now: int, sched_update_time: int) -> bool:
+        """
+        Requests a triggered update.
+
+        Returns `False` if the triggered update is suppressed, because it
+        would be sent after the next regular update at `sched_update_time`.
+        Otherwise, returns `True`.
+        """
+        self.requested += 1
+        if self.deadline is not None:
+            self.coalesced += 1
+            return True
+
+        deadline = now + self._delay()
+        if self.hold_until is not None and self.hold_until > deadline:
+            deadline = self.hold_until
+
+        if deadline >= sched_update_time:
+            self.suppressed += 1
+            return False
+
+        self.deadline = deadline
+        self.timers.schedule(TRIGGERED_UPDATE, deadline)
+        return True
+
+    def mark_sent(self, now: int) -> None:
+        """
+        Records that the pending triggered update has been sent, and starts
+        the hold time before the next one.
+        """
+        self.deadline = None
+        self.sent += 1
+        self.hold_until = now + self._delay()
+
+    def suppress(self) -> bool:
+        """
+        Cancels the pending triggered update, because a regular update is
+        being sent instead.
+
+        Returns a Boolean indicating whether there was a pending update.
+        """
+        if self.deadline is None:
+            return False
+
+        self.timers.cancel(TRIGGERED_UPDATE)
+        self.deadline = None
+        self.suppressed += 1
+        return True
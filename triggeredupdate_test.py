@@ -0,0 +1,65 @@
+from time import monotonic_ns
+from unittest import TestCase, main
+
+from timers import TRIGGERED_UPDATE, TimerQueue, seconds
+from triggeredupdate import MAX_TRIGGERED_DELAY, TriggeredUpdateScheduler
+
+
+class TestTriggeredUpdateScheduler(TestCase):
+    def setUp(self):
+        self.now = monotonic_ns()
+        self.sched_update_time = self.now + seconds(30)
+        self.timers = TimerQueue()
+        self.scheduler = TriggeredUpdateScheduler(self.timers)
+
+    def test_requests_are_coalesced(self):
+        request = self.scheduler.request
+        self.assertTrue(request(self.now, self.sched_update_time))
+        deadline = self.scheduler.deadline
+        self.assertTrue(request(self.now, self.sched_update_time))
+
+        self.assertEqual(self.scheduler.deadline, deadline)
+        self.assertEqual(len(self.timers), 1)
+        self.assertEqual(self.scheduler.requested, 2)
+        self.assertEqual(self.scheduler.coalesced, 1)
+
+    def test_delay(self):
+        self.scheduler.request(self.now, self.sched_update_time)
+
+        deadline = self.timers.pending[(TRIGGERED_UPDATE, None)]
+        self.assertGreater(deadline, self.now)
+        self.assertLessEqual(
+            deadline, self.now + seconds(MAX_TRIGGERED_DELAY)
+        )
+
+    def test_hold_after_send(self):
+        self.scheduler.request(self.now, self.sched_update_time)
+        sent_time = self.now + seconds(5)
+        self.scheduler.mark_sent(sent_time)
+        self.scheduler.hold_until = sent_time + seconds(20)
+
+        self.scheduler.request(sent_time, self.sched_update_time)
+
+        self.assertEqual(self.scheduler.deadline, self.scheduler.hold_until)
+        self.assertEqual(self.scheduler.sent, 1)
+
+    def test_suppressed_by_scheduled_update(self):
+        self.assertFalse(
+            self.scheduler.request(self.now, self.now + seconds(1))
+        )
+        self.assertIsNone(self.scheduler.deadline)
+        self.assertEqual(self.scheduler.suppressed, 1)
+
+    def test_suppress_pending(self):
+        self.assertFalse(self.scheduler.suppress())
+
+        self.scheduler.request(self.now, self.sched_update_time)
+        self.assertTrue(self.scheduler.suppress())
+
+        self.assertIsNone(self.scheduler.deadline)
+        self.assertEqual(len(self.timers), 0)
+        self.assertEqual(self.scheduler.suppressed, 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -46,8 +46,13 @@
 #
 # Version 08: 20 April 2019:
 #   Moved doctests to their own unit test module
+#
+# Version 09:
+#   The rules are checked by `config_error`, which also
+#   gives the reason the data is invalid
 #########################################################
 
+from typing import List, Optional, Set, Tuple
 
 from routerbase import logger
 
@@ -69,110 +74,93 @@ PERIODIC_DEAD_RATIO = 6
 PERIODIC_GARBAGE_RATIO = 4
 
 
-def validate_data(router_id, input_ports, output_ports, timers):
-    id_error = False
-    input_port_error = False
-    output_port_error = False
-    metric_error = False
-    timers_error = False
-
+def config_error(
+    router_id: Optional[int],
+    input_ports: Optional[List[int]],
+    output_ports: Optional[List[Tuple[int, int, int]]],
+    timers: Optional[List[int]],
+) -> Optional[Tuple[str, str]]:
+    """
+    Checks the data from a config file. The rules are checked in order, and
+    only the first one which is broken is reported.
+
+    Returns `None` if the data is valid. Otherwise, returns the configuration
+    error which `validate_data` logs, along with the reason the data is
+    invalid.
+    """
     # Check Router ID
     if router_id is None:
-        id_error = True
-    else:
-        if (router_id < MIN_ID) or (router_id > MAX_ID):
-            id_error = True
-
-    if id_error:
-        logger("Router ID Configuration Error")
-        return False
+        return "Router ID Configuration Error", "there is no router id"
+    if (router_id < MIN_ID) or (router_id > MAX_ID):
+        return (
+            "Router ID Configuration Error",
+            f"router id {router_id} is out of range",
+        )
 
     # Check input ports
-    temp_input_set = set()
-    if input_ports is None:
-        input_port_error = True
-    else:
-        for a_port in input_ports:
-            if (a_port < MIN_PORT) or (a_port > MAX_PORT):
-                input_port_error = True
-                break
-            temp_input_set.add(a_port)  # add port to a temporary list
-
-    # set error error if the length of temporary list
-    #   is not the same as length of original port list
-    if input_ports is None or len(temp_input_set) != len(input_ports):
-        input_port_error = True
-
-    if input_port_error:
-        logger("Input Ports Configuration Error")
-        return False
+    input_error = "Input Ports Configuration Error"
+    if not input_ports:
+        return input_error, "there are no input ports"
+    for a_port in input_ports:
+        if (a_port < MIN_PORT) or (a_port > MAX_PORT):
+            return input_error, f"input port {a_port} is out of range"
+    temp_input_set = set(input_ports)
+    if len(temp_input_set) != len(input_ports):
+        return input_error, "an input port is repeated"
 
     # Check output ports
-    temp_output_port_set = set()
-    temp_id_set = set()
-    # temp_metric_set = set()
-
-    if output_ports is None:
-        logger("Output Ports Configuration Error: No output ports were given")
-        return False
-    else:
-        for an_item in output_ports:
-            # check port range
-            if (an_item[0] < MIN_PORT) or (an_item[0] > MAX_PORT):
-                logger("Output Ports Configuration Error: Port out of range")
-                return False
-                break
-            temp_output_port_set.add(an_item[0])
-
-            # check metric
-            if (an_item[1] < MIN_METRIC) or (an_item[1] > MAX_METRIC):
-                metric_error = True
-                break
-            # temp_metric_set.add(an_item[1])
-
-            # check id
-            if (an_item[2] < MIN_ID) or (an_item[2] > MAX_ID):
-                id_error = True
-                break
-            temp_id_set.add(an_item[2])
-
-    # if length of set of ports not same as the length of output-ports, hv error
-    if len(temp_output_port_set) != len(output_ports):
-        output_port_error = True
-
-    # check the set of output ports with set of input ports, if they
-    # are not disjoint (i.e. element(s) in common) we have error
-    if (temp_output_port_set.isdisjoint(temp_input_set)) is False:
-        output_port_error = True
-
-    if metric_error:
-        logger("Output Ports Configuration Error: Cost / Metric")
-        return False
+    if not output_ports:
+        return (
+            "Output Ports Configuration Error: No output ports were given",
+            "there are no output ports",
+        )
+    for port, cost, neighbour in output_ports:
+        if (port < MIN_PORT) or (port > MAX_PORT):
+            return (
+                "Output Ports Configuration Error: Port out of range",
+                f"output port {port} is out of range",
+            )
+        if (cost < MIN_METRIC) or (cost > MAX_METRIC):
+            return (
+                "Output Ports Configuration Error: Cost / Metric",
+                f"the cost {cost} to router {neighbour} is out of range",
+            )
+        if (neighbour < MIN_ID) or (neighbour > MAX_ID):
+            return (
+                "Output Ports Configuration Error: ID",
+                f"neighbour id {neighbour} is out of range",
+            )
+
+    # Ports can't be reused, either by another output port or an input port.
+    temp_output_port_set: Set[int] = set()
+    for port, _, _ in output_ports:
+        if port in temp_output_port_set or port in temp_input_set:
+            return (
+                "Output Ports Configuration Error: Port number re-use",
+                f"port {port} is reused",
+            )
+        temp_output_port_set.add(port)
 
-    # we might need this i.e. check if a cost / metric is missing?
-    # if len(temp_metric_set) != len(output_ports(2)):
-    # id_error = True
+    # Check Timers
+    if (
+        timers is None
+        or len(timers) != 3
+        or timers[0] <= 0
+        or (timers[1] / timers[0]) != PERIODIC_DEAD_RATIO
+        or (timers[2] / timers[0]) != PERIODIC_GARBAGE_RATIO
+    ):
+        return (
+            "Timers Configuration Error",
+            "the timers must be in the ratio 1:6:4",
+        )
 
-    # do we need a check for missing ID?
-    if id_error:
-        logger("Output Ports Configuration Error: ID")
-        return False
+    return None
 
-    if output_port_error:
-        logger("Output Ports Configuration Error: Port number re-use")
-        return False
 
-    # Check Timers
-    if len(timers) != 3:
-        timers_error = True
-    else:
-        if (timers[1] / timers[0]) != PERIODIC_DEAD_RATIO:
-            timers_error = True
-        if (timers[2] / timers[0]) != PERIODIC_GARBAGE_RATIO:
-            timers_error = True
-
-    if timers_error:
-        logger("Timers Configuration Error")
+def validate_data(router_id, input_ports, output_ports, timers):
+    error = config_error(router_id, input_ports, output_ports, timers)
+    if error is not None:
+        logger(error[0])
         return False
 
     # All good, yay! return a zero
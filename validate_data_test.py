@@ -297,6 +297,25 @@ class ValidateDataTest(TestCase):
         )
         self.assertOutputEqual("Timers Configuration Error")
 
+    def test_no_input_ports(self):
+        """Error: no input ports"""
+        self.assertEqual(
+            validate_data(1, [], [(5003, 3, 5)], [10, 60, 40]), False
+        )
+        self.assertOutputEqual("Input Ports Configuration Error")
+
+    def test_no_output_ports(self):
+        """Error: no output ports"""
+        self.assertEqual(validate_data(1, [3001], [], [10, 60, 40]), False)
+        self.assertOutputEqual(
+            "Output Ports Configuration Error: No output ports were given"
+        )
+
+    def test_no_timers(self):
+        """Error: no timers"""
+        self.assertEqual(validate_data(1, [3001], [(5003, 3, 5)], None), False)
+        self.assertOutputEqual("Timers Configuration Error")
+
 
 if __name__ == "__main__":
     main()